@@ -9,9 +9,11 @@ import sys
 # Note: A importação do 'EnergyModel' foi removida daqui para corrigir o erro
 sys.path.insert(0, './src')
 
-from src.data_loader import load_data
+from src.data_loader import load_data, load_metadata, load_rollup
+from src.dataset import CityDataset
 from src.analytics import (
-    calculate_kpis,
+    calculate_kpis_batch,
+    calculate_kpis_from_rollup,
     plot_consumption_trend,
     plot_temperature_consumption_scatter,
     detect_anomalies,
@@ -24,21 +26,86 @@ from src.analytics import (
 st.set_page_config(layout="wide", page_title="Análise de Energia Cidades Globais", page_icon="💡")
 
 # --- Função para Carregar Dados com Cache ---
+# Os filtros de cidade e período são aplicados no SQLite (ver load_data),
+# então cada combinação de filtros lê apenas as linhas necessárias.
+# O DataFrame usa o modo compacto e fica em cache_resource: uma única cópia é
+# compartilhada entre as sessões (tratada como somente leitura pelo restante do app).
+# O CityDataset indexa as faixas de linhas de cada cidade uma única vez.
+# Todas as visões do dashboard são mensais, então os dados vêm do rollup Cidade x mês (energia_mensal) e os
+# KPIs do rollup mês do ano, ambos no SQLite. O dashboard não lê o armazenamento Parquet: ele atende os
+# leitores de linhas brutas (granularity=None), como scripts/benchmark_load.py e análises ad hoc.
+@st.cache_resource(ttl=3600)
+def get_data(cities, start=None, end=None):
+    return CityDataset(load_data(cities=list(cities), start=start, end=end, compact=True, granularity="mensal"))
+
 @st.cache_data(ttl=3600)
-def get_data():
-    return load_data()
+def get_kpi_rollup(cities):
+    return load_rollup("mes_do_ano", cities=list(cities))
 
-# --- Função para Treinar Modelo com Cache ---
-# Esta é a seção que foi modificada para corrigir o erro de inicialização
+@st.cache_data(ttl=3600)
+def get_metadata():
+    return load_metadata()
+
+# --- Função para Obter o Modelo do Registro ---
+# Os modelos ficam no registro persistente (src/model_registry.py), preenchido por
+# scripts/05_populate_model_registry.py após a ingestão, para o histórico completo e cada ano de cada cidade
+# (os recortes do slider de ano). A chave é (cidade, versão dos dados): o cache só compara duas strings,
+# e o dashboard nunca treina; uma chave ausente indica que o job ainda não rodou para os dados atuais.
 @st.cache_resource
-def get_model(df, city_name):
-    # A importação agora está aqui dentro da função
+def get_model(city_name, version):
+    from src.model_registry import load_model
+
+    model = load_model(city_name, version)
+    if model is None:
+        return None, ("modelo ainda não registrado para os dados atuais. "
+                      "Execute `python scripts/05_populate_model_registry.py` (ou `./run.sh`).")
+    return model, None
+
+def get_city_model(df_city, city_name):
+    from src.model_registry import dataset_version
+    from src.models import training_error
+
+    # Dados que não permitem treino nunca entram no registro: informa o motivo sem consultá-lo
+    error = training_error(df_city)
+    if error:
+        return None, error
+    return get_model(city_name, dataset_version(df_city))
+
+# Curva de previsão pré-calculada na grade do slider: cada movimento do slider é só uma interpolação
+@st.cache_data
+def get_prediction_curve(coef, intercept, t_min, t_max):
     from src.models import EnergyModel
 
-    model = EnergyModel()
-    df_city = df[df['Cidade'] == city_name]
-    error = model.train(df_city)
-    return model, error
+    return EnergyModel.from_coefficients(coef, intercept).prediction_curve(t_min, t_max)
+
+# --- Decomposição da Série Temporal ---
+# A decomposição usa sempre o histórico mensal completo da cidade (um ano isolado não tem os 24 meses
+# necessários), lido do rollup exatamente como scripts/08_precompute_decompositions.py o lê: a versão da
+# série coincide com a gravada na tabela decomposicoes e o app apenas renderiza os componentes.
+# A chave do cache é (cidade, versão do conteúdo da série): mover controles que não mudam a série
+# (ex.: o slider de ano ou de temperatura) não refaz a decomposição. Uma série que o job ainda não
+# pré-calculou é decomposta uma única vez e fica no cache.
+@st.cache_data(ttl=3600)
+def get_city_history(city_name):
+    return load_data(cities=[city_name], columns=['Cidade', 'Data', 'Consumo_MWh'], compact=True, granularity="mensal")
+
+@st.cache_data(ttl=3600)
+def get_decomposition(city_name, version, _series):
+    from src.decomposition import seasonal_decompose_series
+    from src.decomposition_store import load_decomposition
+
+    stored = load_decomposition(city_name, version)
+    if stored is not None:
+        return stored
+    return seasonal_decompose_series(_series, period=12, extrapolate_trend='period')
+
+def get_city_decomposition(df_history, city_name):
+    from src.decomposition import MIN_MONTHS, monthly_series, series_version
+
+    if len(df_history) < MIN_MONTHS:
+        return None # plot_time_series_decomposition informa que os dados são insuficientes
+    series = monthly_series(df_history)
+    return get_decomposition(city_name, series_version(series), series)
 
 # --- Título e Resumo Executivo ---
 st.title("💡 Análise de Padrões de Consumo de Energia em Cidades Globais")
@@ -50,15 +117,15 @@ st.markdown("""
 """)
 st.markdown("---")
 
-# Carregar dados
-df_energia = get_data()
+# Carregar metadados (cidades e anos disponíveis) sem ler a tabela inteira
+metadata = get_metadata()
 
-if df_energia.empty:
+if not metadata["cidades"]:
     st.error("Não foi possível carregar os dados. Certifique-se de que o pipeline de dados foi executado (`./run.sh`) e que o arquivo do banco de dados (`data/processed/energia_cidades.db`) existe.")
     st.stop()
 
 # Obter lista de cidades
-all_cities = df_energia['Cidade'].unique().tolist()
+all_cities = metadata["cidades"]
 selected_cities_default = all_cities
 
 # --- Sidebar para Seleções ---
@@ -92,8 +159,9 @@ else:
     )
 
 # Filtro de Ano
-min_year = int(df_energia['Ano'].min()) if not df_energia.empty else 2023
-max_year = int(df_energia['Ano'].max()) if not df_energia.empty else 2023
+min_year = int(metadata["ano_min"]) if metadata["ano_min"] is not None else 2023
+max_year = int(metadata["ano_max"]) if metadata["ano_max"] is not None else 2023
+year_start, year_end = None, None
 if min_year == max_year:
     st.sidebar.write(f"Dados disponíveis para o ano: **{min_year}**")
 else:
@@ -103,7 +171,16 @@ else:
         max_value=max_year,
         value=max_year
     )
-    df_energia = df_energia[df_energia['Ano'] == selected_year]
+    year_start, year_end = f"{selected_year}-01-01", f"{selected_year}-12-31"
+
+# Carrega somente as cidades (comparação + análise detalhada) e o ano selecionados
+cities_to_load = tuple(sorted(set(selected_cities) | {city_for_detailed_analysis}))
+dataset = get_data(cities_to_load, year_start, year_end)
+df_energia = dataset.df
+
+if df_energia.empty:
+    st.error("Não há dados para as cidades e o período selecionados.")
+    st.stop()
 
 # Filtro de Temperatura (slider)
 temp_min = df_energia['Temperatura_C'].min() if not df_energia.empty else 0
@@ -119,8 +196,15 @@ temp_range_selected = st.sidebar.slider(
 st.header("📊 Indicadores Chave de Performance (KPIs)")
 if selected_cities:
     kpi_cols = st.columns(len(selected_cities))
+    # Todos os KPIs em uma única agregação; cada coluna apenas consulta a sua linha.
+    # Sem filtro de ano, os KPIs do histórico completo saem direto do rollup Cidade x mês do ano.
+    df_kpi_rollup = get_kpi_rollup(tuple(selected_cities)) if year_start is None else pd.DataFrame()
+    if not df_kpi_rollup.empty:
+        kpi_table = calculate_kpis_from_rollup(df_kpi_rollup, selected_cities).set_index('Cidade')
+    else:
+        kpi_table = calculate_kpis_batch(dataset, selected_cities).set_index('Cidade')
     for i, city in enumerate(selected_cities):
-        kpis = calculate_kpis(df_energia, city)
+        kpis = kpi_table.loc[city]
         with kpi_cols[i]:
             st.metric(label=f"Consumo Total Anual ({city})", value=f"{kpis['Consumo_Total_Anual']:.2f} MWh")
             st.metric(label=f"Consumo Per Capita ({city})", value=f"{kpis['Consumo_Per_Capita_Anual']:.2f} kWh/pessoa")
@@ -136,7 +220,7 @@ st.markdown("---")
 st.header("📈 Tendência de Consumo Mensal")
 st.markdown("Este gráfico mostra o consumo de energia ao longo do ano para as cidades selecionadas, permitindo uma comparação direta das tendências.")
 if selected_cities:
-    fig_trend = plot_consumption_trend(df_energia, selected_cities)
+    fig_trend = plot_consumption_trend(dataset, selected_cities)
     st.plotly_chart(fig_trend, use_container_width=True)
 else:
     st.info("Selecione cidades na barra lateral para ver a tendência de consumo.")
@@ -146,7 +230,7 @@ st.markdown("---")
 # --- Seção de Análise de Correlação (Consumo vs. Temperatura) ---
 st.header(f"🌡️ Consumo vs. Temperatura em {city_for_detailed_analysis}")
 st.markdown(f"Explore como a temperatura afeta o consumo de energia em **{city_for_detailed_analysis}**. Os pontos são coloridos por mês para identificar padrões sazonais na correlação.")
-fig_scatter = plot_temperature_consumption_scatter(df_energia, city_for_detailed_analysis, temp_range=temp_range_selected)
+fig_scatter = plot_temperature_consumption_scatter(dataset, city_for_detailed_analysis, temp_range=temp_range_selected)
 st.plotly_chart(fig_scatter, use_container_width=True)
 
 st.markdown("---")
@@ -154,14 +238,16 @@ st.markdown("---")
 # --- Seção de Análise de Sazonalidade Avançada ---
 st.header(f"🗓️ Análise Sazonal Avançada em {city_for_detailed_analysis}")
 st.markdown("Com dados de múltiplos anos, esta seção mostraria a evolução do padrão sazonal e a decomposição da série temporal para identificar tendência, sazonalidade e resíduos.")
-fig_seasonal_year, msg_seasonal_year = plot_seasonal_comparison_by_year(df_energia, city_for_detailed_analysis)
+fig_seasonal_year, msg_seasonal_year = plot_seasonal_comparison_by_year(dataset, city_for_detailed_analysis)
 if fig_seasonal_year:
     st.markdown("### Comparação Sazonal Mensal por Ano")
     st.plotly_chart(fig_seasonal_year, use_container_width=True)
 else:
     st.info(f"Não foi possível gerar 'Comparação Sazonal Mensal por Ano' para {city_for_detailed_analysis}: {msg_seasonal_year}")
 
-fig_decompose, msg_decompose = plot_time_series_decomposition(df_energia, city_for_detailed_analysis)
+df_history = get_city_history(city_for_detailed_analysis)
+decomposition = get_city_decomposition(df_history, city_for_detailed_analysis)
+fig_decompose, msg_decompose = plot_time_series_decomposition(df_history, city_for_detailed_analysis, decomposition=decomposition)
 if fig_decompose:
     st.markdown("### Decomposição da Série Temporal (Tendência, Sazonalidade, Resíduos)")
     st.plotly_chart(fig_decompose, use_container_width=True)
@@ -174,7 +260,7 @@ st.markdown("---")
 st.header(f"🚨 Detecção de Anomalias em {city_for_detailed_analysis}")
 st.markdown(f"Identificação de meses com consumo de energia atipicamente alto ou baixo em **{city_for_detailed_analysis}** (baseado em Z-score de 1.5 desvios padrão).")
 
-df_with_anomalies, anomalies_df = detect_anomalies(df_energia, city_for_detailed_analysis)
+df_with_anomalies, anomalies_df = detect_anomalies(dataset, city_for_detailed_analysis)
 
 if not df_with_anomalies.empty:
     fig_anomalies = plot_consumption_with_anomalies(df_with_anomalies, city_for_detailed_analysis, anomalies_df)
@@ -195,10 +281,10 @@ st.markdown("---")
 st.header(f"🧠 Modelo Preditivo de Consumo para {city_for_detailed_analysis}")
 st.markdown(f"Um modelo de regressão linear para estimar o consumo de energia em **{city_for_detailed_analysis}** com base na temperatura.")
 
-model, train_error = get_model(df_energia, city_for_detailed_analysis)
+model, train_error = get_city_model(dataset.city(city_for_detailed_analysis), city_for_detailed_analysis)
 
 if train_error:
-    st.error(f"Erro ao treinar o modelo para {city_for_detailed_analysis}: {train_error}")
+    st.error(f"Modelo indisponível para {city_for_detailed_analysis}: {train_error}")
 else:
     model_summary = model.get_summary()
 
@@ -222,14 +308,27 @@ else:
             "Selecione uma Temperatura para Prever o Consumo (°C):",
             min_value=float(temp_min),
             max_value=float(temp_max),
-            value=float(df_energia[df_energia['Cidade'] == city_for_detailed_analysis]['Temperatura_C'].mean()),
+            value=float(dataset.city(city_for_detailed_analysis)['Temperatura_C'].mean()),
             step=0.1
         )
     
     with col2:
         if model.is_trained:
-            predicted_consumption = model.predict(temp_to_predict)
+            from src.models import interpolate_curve
+
+            curve = get_prediction_curve(model.coef, model.intercept, float(temp_min), float(temp_max))
+            predicted_consumption = interpolate_curve(curve, temp_to_predict)
             st.metric(label=f"Consumo Previsto para {temp_to_predict:.1f}°C", value=f"{predicted_consumption:.2f} MWh")
+
+            # Cenários "e se": variações em torno da temperatura selecionada, respondidas pela mesma curva
+            deltas = [-3.0, -2.0, -1.0, 0.0, 1.0, 2.0, 3.0]
+            scenario_temps = [temp_to_predict + d for d in deltas]
+            st.markdown("**Cenários de Temperatura**")
+            st.dataframe(pd.DataFrame({
+                "Variação (°C)": deltas,
+                "Temperatura (°C)": scenario_temps,
+                "Consumo Previsto (MWh)": interpolate_curve(curve, scenario_temps),
+            }).round(2), hide_index=True, use_container_width=True)
         else:
             st.warning("Modelo não treinado para realizar previsões.")
 
@@ -3,9 +3,11 @@
 echo "Iniciando o Projeto de Análise de Consumo de Energia..."
 echo "-----------------------------------------------------"
 
-# Remove arquivos de saída anteriores para um re-run limpo
+# Remove arquivos de saída anteriores para um re-run limpo.
+# O banco SQLite não é apagado: a carga do Passo 2 é incremental (upsert) e transacional,
+# então o dashboard nunca fica sem a tabela durante a atualização.
 echo "Removendo arquivos de saída anteriores..."
-rm -rf data/processed/*.csv data/processed/*.db data/raw/*.json data/raw/*.csv plots/
+rm -rf data/processed/*.csv data/raw/*.json data/raw/*.jsonl data/raw/*.csv plots/
 echo "-----------------------------------------------------"
 
 # 1. Coleta de Dados (agora com API real para temperatura e dados ANEEL)
@@ -20,6 +22,27 @@ python3 scripts/02_clean_transform_all.py
 if [ $? -ne 0 ]; then echo "Erro no Passo 2. Abortando."; exit 1; fi
 echo "-----------------------------------------------------"
 
+# 3. Registro de modelos: o dashboard apenas consulta os modelos pré-calculados, sem treinar na inicialização.
+# Relatórios de modelos (interpretação por cidade, recortes com --since) ficam em scripts/04_model_all.py, que grava no mesmo registro.
+echo "Passo 3: Treinando os modelos de todas as cidades e populando o registro de modelos..."
+python3 scripts/05_populate_model_registry.py
+if [ $? -ne 0 ]; then echo "Erro no Passo 3. Abortando."; exit 1; fi
+echo "-----------------------------------------------------"
+
+# 4. Decomposição sazonal pré-calculada: o dashboard apenas renderiza os componentes gravados
+echo "Passo 4: Pré-calculando a decomposição das séries de consumo de todas as cidades..."
+python3 scripts/08_precompute_decompositions.py
+if [ $? -ne 0 ]; then echo "Erro no Passo 4. Abortando."; exit 1; fi
+echo "-----------------------------------------------------"
+
+# 5. Cópia colunar (Parquet particionado por Cidade/Ano) para as leituras de linhas brutas (ex.: scripts/benchmark_load.py);
+# o dashboard lê os rollups mensais do SQLite. Fica por último e guarda a versão dos dados de energia_cidades,
+# então as escritas dos passos anteriores em outras tabelas não a invalidam; sem dados novos, não é refeita.
+echo "Passo 5: Exportando os dados para o armazenamento Parquet..."
+python3 scripts/02_export_parquet.py
+if [ $? -ne 0 ]; then echo "Erro no Passo 5. Abortando."; exit 1; fi
+echo "-----------------------------------------------------"
+
 echo "Preparação de dados concluída. O banco de dados está pronto para ser usado pelo dashboard."
 echo "Para executar o dashboard interativo, utilize:"
 echo "streamlit run app.py"
@@ -1,92 +1,310 @@
+import argparse
 import os
+import sys
 import csv
 import json
+import random
+import threading
 import requests
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 import io
 import time
 
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.catalog import CATALOG_PATH, FONTE_ANEEL, FONTE_SIMULADA, load_city_catalog
+from src.data_loader import DB_PATH
+from src.database import FONTE_CONSUMO_PROVISORIA, FONTE_TEMPERATURA, load_watermarks
+from src.http_cache import CACHE_DIR, DEFAULT_MAX_BYTES, HttpCache
+
 # --- Configurações da API ---
-# Adicionando uma cidade brasileira para usar dados da ANEEL
+# Cidades acompanhadas (coordenadas, população, fonte do consumo e perfil simulado) vêm de config/cidades.csv
+CITY_CATALOG = load_city_catalog(CATALOG_PATH)
 CITIES_COORDS = {
-    "Berlim": {"latitude": 52.52, "longitude": 13.41},
-    "Nova York": {"latitude": 40.71, "longitude": -74.01},
-    "Sao Paulo": {"latitude": -23.55, "longitude": -46.63}
+    city: {"latitude": info["latitude"], "longitude": info["longitude"]}
+    for city, info in CITY_CATALOG.items()
+}
+
+# Arquivo bruto gerado: JSON delimitado por linha (NDJSON), lido em streaming por 02_clean_transform_all.py
+RAW_OUTPUT_FILE = "data/raw/dados_cidades_energia.jsonl"
+
+OPEN_METEO_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Busca concorrente: número de threads e limite global de requisições por segundo (todas as threads)
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_LIMIT = 5.0
+# Respostas que valem nova tentativa (limite de taxa e falhas temporárias do servidor)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# A API aceita várias coordenadas separadas por vírgula na mesma requisição (mesmo período para todas)
+OPEN_METEO_BATCH_SIZE = 50
+
+# O arquivo histórico da Open-Meteo ainda corrige dados recentes (ERA5T -> ERA5) por alguns meses;
+# períodos que terminam antes desta janela não mudam mais e são servidos do cache sem acessar a rede.
+ARCHIVE_IMMUTABLE_AFTER_DAYS = 90
+
+# CSV anual de consumo da ANEEL por ano de referência. Cada ano é um recurso diferente no portal de dados abertos
+# (o identificador na URL muda), então os anos publicados são cadastrados aqui. fetch_aneel_data baixa os anos
+# do período pedido; meses de anos sem URL (ou ainda não publicados) entram como provisórios e são buscados de novo.
+ANEEL_CSV_URLS = {
+    2023: "https://dadosabertos.aneel.gov.br/dataset/c2759976-b63e-4623-a50d-6e06b9973801/resource/903e0921-26c3-4d69-8d15-05e80811e72d/download/consumo-de-energia-eletrica-por-classe-2023.csv",
 }
+# Cidades do catálogo com consumo real da ANEEL -> nome do município no CSV nacional
+ANEEL_MUNICIPIOS = {
+    city: info["municipio_aneel"] for city, info in CITY_CATALOG.items()
+    if info["fonte_consumo"] == FONTE_ANEEL and info["municipio_aneel"]
+}
+# Colunas do CSV da ANEEL usadas na agregação e tamanho dos blocos de leitura
+ANEEL_COLUMNS = ['Municipio', 'MÊS_REFERENCIA', 'CONSUMO_MMWH']
+ANEEL_CHUNK_ROWS = 200_000
 
-# Período de dados (exemplo para 2023)
+# Período de dados (exemplo para 2023). START_DATE é o início do histórico na primeira coleta de uma cidade;
+# nas seguintes, a coleta começa no mês após a marca d'água gravada pela carga (tabela coleta_watermarks).
 START_DATE = "2023-01-01"
 END_DATE = "2023-12-31"
 
 def get_population_data(city_name):
     """
-    Função para simular dados de população.
+    População (em milhões) da cidade, segundo o catálogo.
     """
-    if city_name == "Berlim":
-        return 3.75 # Milhões
-    elif city_name == "Nova York":
-        return 8.4 # Milhões
-    elif city_name == "Sao Paulo":
-        return 12.33 # Milhões (dado de 2023, IBGE)
-    return None
+    return CITY_CATALOG.get(city_name, {}).get("populacao_milhoes")
 
-def fetch_open_meteo_temperature(city_name, start_date, end_date, retries=3, delay=5):
+class RateLimiter:
     """
-    Busca dados de temperatura média diária da API Open-Meteo com re-tentativas.
+    Limite global de requisições por segundo, compartilhado entre as threads.
+    Cada chamada a wait() reserva o próximo horário livre e dorme até ele.
     """
-    coords = CITIES_COORDS.get(city_name)
-    if not coords:
-        print(f"Coordenadas não encontradas para {city_name}")
-        return None
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second and rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def create_session(pool_size=DEFAULT_WORKERS):
+    """Cria uma única Session com pool de conexões dimensionado para o número de threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-    api_url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": coords["latitude"],
-        "longitude": coords["longitude"],
+def _backoff_delay(attempt, base_delay, max_delay, retry_after=None):
+    """Espera antes da próxima tentativa: exponencial com jitter, respeitando Retry-After quando informado."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    exp = min(max_delay, base_delay * (2 ** attempt))
+    return exp / 2 + random.uniform(0, exp / 2)
+
+def is_closed_period(end_date, settle_days=ARCHIVE_IMMUTABLE_AFTER_DAYS):
+    """Indica se um período histórico terminou há tempo suficiente para não sofrer mais revisões."""
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return (datetime.now() - end).days > settle_days
+
+def _request_open_meteo(params, label, end_date, retries=3, delay=1, max_delay=30,
+                        session=None, rate_limiter=None, cache=None):
+    """
+    Faz uma requisição ao arquivo histórico da Open-Meteo com re-tentativas e retorna o JSON (ou None).
+    Respostas 429/5xx e erros de conexão são re-tentados com backoff exponencial e jitter;
+    session e rate_limiter permitem compartilhar o pool de conexões e o limite de taxa entre threads.
+    Com um HttpCache, períodos fechados são lidos do disco e os demais são revalidados.
+    """
+    s = session or requests.Session()
+    for i in range(retries):
+        retry_after = None
+        try:
+            if cache is not None:
+                # O limite de taxa só é aplicado quando o cache precisa acessar a rede
+                path = cache.get(s, OPEN_METEO_ARCHIVE_URL, params=params, immutable=is_closed_period(end_date),
+                                 timeout=10, before_request=rate_limiter.wait if rate_limiter else None)
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            if rate_limiter:
+                rate_limiter.wait()
+            response = s.get(OPEN_METEO_ARCHIVE_URL, params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code not in RETRY_STATUS:
+                print(f"Erro na requisição para Open-Meteo ({label}): {e}. Sem nova tentativa.")
+                return None
+            if e.response is not None:
+                retry_after = e.response.headers.get("Retry-After")
+            print(f"Tentativa {i+1}/{retries}: Erro na requisição para Open-Meteo ({label}): {e}. Re-tentando...")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Tentativa {i+1}/{retries}: Erro na requisição para Open-Meteo ({label}): {e}. Re-tentando...")
+        if i < retries - 1:
+            time.sleep(_backoff_delay(i, delay, max_delay, retry_after))
+    print(f"Falha ao buscar dados de temperatura para {label} após {retries} tentativas.")
+    return None
+
+def _open_meteo_params(city_names, start_date, end_date):
+    """Parâmetros da Open-Meteo para uma ou mais cidades (coordenadas separadas por vírgula)."""
+    return {
+        "latitude": ",".join(str(CITIES_COORDS[c]["latitude"]) for c in city_names),
+        "longitude": ",".join(str(CITIES_COORDS[c]["longitude"]) for c in city_names),
         "start_date": start_date,
         "end_date": end_date,
         "daily": "temperature_2m_mean",
         "timezone": "auto"
     }
-    s = requests.Session()
-    for i in range(retries):
-        try:
-            response = s.get(api_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("daily")
-        except requests.exceptions.RequestException as e:
-            print(f"Tentativa {i+1}/{retries}: Erro na requisição para Open-Meteo: {e}. Re-tentando...")
-            time.sleep(delay)
-    print(f"Falha ao buscar dados de temperatura para {city_name} após {retries} tentativas.")
-    return None
 
-def fetch_aneel_data():
+def fetch_open_meteo_temperature(city_name, start_date, end_date, retries=3, delay=1, max_delay=30,
+                                 session=None, rate_limiter=None, cache=None):
     """
-    Baixa e processa dados de consumo de energia da ANEEL para o ano de 2023.
+    Busca dados de temperatura média diária da API Open-Meteo com re-tentativas.
     """
-    print("Buscando dados de consumo de energia da ANEEL...")
-    # URL para o CSV de 2023. Essa URL pode mudar a cada ano, então seria necessário
-    # verificar no site da ANEEL se a URL está atualizada.
-    url_aneel_2023 = "https://dadosabertos.aneel.gov.br/dataset/c2759976-b63e-4623-a50d-6e06b9973801/resource/903e0921-26c3-4d69-8d15-05e80811e72d/download/consumo-de-energia-eletrica-por-classe-2023.csv"
-    
+    if city_name not in CITIES_COORDS:
+        print(f"Coordenadas não encontradas para {city_name}")
+        return None
+
+    data = _request_open_meteo(_open_meteo_params([city_name], start_date, end_date), city_name, end_date,
+                               retries=retries, delay=delay, max_delay=max_delay,
+                               session=session, rate_limiter=rate_limiter, cache=cache)
+    return data.get("daily") if isinstance(data, dict) else None
+
+def fetch_open_meteo_batch(city_names, start_date, end_date, retries=3, delay=1, max_delay=30,
+                           session=None, rate_limiter=None, cache=None):
+    """
+    Busca as temperaturas de várias cidades (mesmo período) em uma única requisição.
+    A API responde uma lista com um objeto por coordenada, na ordem enviada.
+    Retorna {cidade: dados_diários}, ou None se a requisição falhar ou a resposta não corresponder ao pedido.
+    """
+    label = f"{len(city_names)} cidades"
+    data = _request_open_meteo(_open_meteo_params(city_names, start_date, end_date), label, end_date,
+                               retries=retries, delay=delay, max_delay=max_delay,
+                               session=session, rate_limiter=rate_limiter, cache=cache)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or len(data) != len(city_names):
+        return None
+    return {city: (item.get("daily") if isinstance(item, dict) else None) for city, item in zip(city_names, data)}
+
+def _fetch_group(city_names, start_date, end_date, session, rate_limiter, cache):
+    """Busca um lote de cidades; se a requisição em lote falhar, busca cada cidade separadamente."""
+    if len(city_names) > 1:
+        results = fetch_open_meteo_batch(city_names, start_date, end_date,
+                                         session=session, rate_limiter=rate_limiter, cache=cache)
+        if results is not None:
+            return list(results.items())
+        print(f"Requisição em lote falhou para {len(city_names)} cidades; buscando uma a uma.")
+    return [
+        (city, fetch_open_meteo_temperature(city, start_date, end_date,
+                                            session=session, rate_limiter=rate_limiter, cache=cache))
+        for city in city_names
+    ]
+
+def plan_batches(city_ranges, batch_size=OPEN_METEO_BATCH_SIZE):
+    """Agrupa as cidades com o mesmo período em lotes de até batch_size: [(cidades, data_inicio, data_fim)]."""
+    by_range = {}
+    for city, city_range in city_ranges.items():
+        if city not in CITIES_COORDS:
+            print(f"Coordenadas não encontradas para {city}")
+            continue
+        by_range.setdefault(city_range, []).append(city)
+    batch_size = max(1, batch_size)
+    return [
+        (cities[k:k + batch_size], start_date, end_date)
+        for (start_date, end_date), cities in by_range.items()
+        for k in range(0, len(cities), batch_size)
+    ]
+
+def fetch_all_temperatures(city_ranges, max_workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, cache=None,
+                           batch_size=OPEN_METEO_BATCH_SIZE):
+    """
+    Busca as temperaturas de várias cidades em paralelo (pool de threads limitado),
+    com uma única Session e um limite global de requisições por segundo.
+    city_ranges mapeia cada cidade para o seu período (data_inicio, data_fim); cidades com o mesmo período
+    são buscadas em lotes de até batch_size coordenadas por requisição.
+    Gera pares (cidade, dados_diários) à medida que cada lote termina.
+    """
+    session = create_session(max_workers)
+    limiter = RateLimiter(rate_limit)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_fetch_group, cities, start_date, end_date, session, limiter, cache)
+                for cities, start_date, end_date in plan_batches(city_ranges, batch_size)
+            ]
+            for future in as_completed(futures):
+                yield from future.result()
+    finally:
+        session.close()
+
+def read_aneel_monthly(source, municipios, chunksize=ANEEL_CHUNK_ROWS):
+    """
+    Lê o CSV da ANEEL em blocos de chunksize linhas, apenas com as colunas usadas,
+    mantendo só os municípios pedidos e somando o consumo mensal à medida que os blocos chegam.
+    O pico de memória depende do tamanho do bloco, não do arquivo nacional inteiro.
+    Retorna uma Series de CONSUMO_MMWH indexada por (Municipio, período mensal), ou None se nada foi encontrado.
+    """
+    municipios = set(municipios)
+    totals = None
+    reader = pd.read_csv(source, sep=';', encoding='latin1', usecols=ANEEL_COLUMNS,
+                         dtype={'Municipio': str, 'MÊS_REFERENCIA': str}, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            chunk = chunk[chunk['Municipio'].isin(municipios)]
+            if chunk.empty:
+                continue
+            meses = pd.to_datetime(chunk['MÊS_REFERENCIA'], format='%Y-%m-%d').dt.to_period('M')
+            partial = chunk.groupby([chunk['Municipio'], meses])['CONSUMO_MMWH'].sum()
+            totals = partial if totals is None else totals.add(partial, fill_value=0)
+    return totals.sort_index() if totals is not None else None
+
+def fetch_aneel_data(cache=None, session=None, municipios=ANEEL_MUNICIPIOS, years=None):
+    """
+    Baixa e processa dados de consumo de energia da ANEEL para os anos pedidos (padrão: todos os de ANEEL_CSV_URLS).
+    Com um HttpCache, os CSVs ficam em disco: anos já encerrados não são baixados de novo
+    e o ano corrente é revalidado (ETag/Last-Modified).
+    municipios mapeia o nome da cidade no projeto para o nome do município na ANEEL.
+    Um ano sem URL cadastrada ou cuja leitura falhe fica de fora (seus meses usam o perfil simulado, como provisórios).
+    Retorna um dicionário {cidade: DataFrame com ['Ano', 'Mes', 'CONSUMO_MMWH']}.
+    """
+    years = sorted(ANEEL_CSV_URLS) if years is None else sorted(years)
+    print(f"Buscando dados de consumo de energia da ANEEL ({', '.join(map(str, years))})...")
+    monthly_consumption = None
+    for year in years:
+        url = ANEEL_CSV_URLS.get(year)
+        if url is None:
+            # A URL muda a cada ano: é preciso verificar no site da ANEEL e cadastrá-la em ANEEL_CSV_URLS
+            print(f"URL do CSV da ANEEL de {year} não cadastrada em ANEEL_CSV_URLS; meses de {year} ficam provisórios.")
+            continue
+        try:
+            source = url
+            if cache is not None:
+                session = session or requests.Session()
+                source = cache.get(session, url, immutable=year < datetime.now().year, timeout=120)
+            # Filtra os municípios e agrega por mês durante a leitura, bloco a bloco
+            partial = read_aneel_monthly(source, municipios.values())
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao baixar dados da ANEEL de {year}: {e}")
+            continue
+        except Exception as e:
+            print(f"Erro ao processar dados da ANEEL de {year}: {e}")
+            continue
+        if partial is not None:
+            monthly_consumption = partial if monthly_consumption is None else monthly_consumption.add(partial, fill_value=0)
+        print(f"Dados da ANEEL de {year} baixados com sucesso.")
+    if monthly_consumption is not None:
+        monthly_consumption = monthly_consumption.sort_index()
+
     try:
-        df_aneel = pd.read_csv(url_aneel_2023, sep=';', encoding='latin1')
-        print("Dados da ANEEL baixados com sucesso.")
-        
-        # Filtra para o município de São Paulo e agrega por mês
-        df_sp = df_aneel[df_aneel['Municipio'] == 'SAO PAULO']
-        if df_sp.empty:
-            print("Município de São Paulo não encontrado nos dados da ANEEL.")
-            return None
-        
-        # Ajusta a data para o formato correto
-        df_sp['MÊS_REFERENCIA'] = pd.to_datetime(df_sp['MÊS_REFERENCIA'], format='%Y-%m-%d')
-        
-        # Consumo total mensal para São Paulo
-        monthly_consumption = df_sp.groupby(df_sp['MÊS_REFERENCIA'].dt.to_period('M'))['CONSUMO_MMWH'].sum()
-        
         # Mudar MWh para MWh
         # 1 MWh = 1.000 KWh
         # 1 GWh = 1.000.000 kWh
@@ -95,143 +313,217 @@ def fetch_aneel_data():
         # Consumo_MMWH = consumo em mil MWh, então para MWh é CONSUMO_MMWH * 1000
         # O site da ANEEL usa MWh, então a coluna `CONSUMO_MMWH` está em Mil MWh, ou seja, 1.000 MWh
         # Corrigindo a conversão para MWh
-        monthly_consumption_mwh = monthly_consumption.astype(float) * 1000 
-        
-        df_monthly_sp = pd.DataFrame(monthly_consumption_mwh)
-        df_monthly_sp = df_monthly_sp.reset_index()
-        df_monthly_sp['MÊS_REFERENCIA'] = df_monthly_sp['MÊS_REFERENCIA'].dt.to_timestamp()
-        df_monthly_sp['Ano'] = df_monthly_sp['MÊS_REFERENCIA'].dt.year
-        df_monthly_sp['Mes'] = df_monthly_sp['MÊS_REFERENCIA'].dt.month
-        
-        # Colunas finais: ['Ano', 'Mes', 'Consumo_MWh']
-        return df_monthly_sp[['Ano', 'Mes', 'CONSUMO_MMWH']]
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao baixar dados da ANEEL: {e}")
-        return None
+        result = {}
+        for city_name, municipio in municipios.items():
+            if monthly_consumption is None or municipio not in monthly_consumption.index.get_level_values('Municipio'):
+                print(f"Município {municipio} não encontrado nos dados da ANEEL.")
+                continue
+            monthly_consumption_mwh = monthly_consumption.loc[municipio].astype(float) * 1000
+            
+            df_monthly = monthly_consumption_mwh.rename('CONSUMO_MMWH').reset_index()
+            df_monthly['MÊS_REFERENCIA'] = df_monthly['MÊS_REFERENCIA'].dt.to_timestamp()
+            df_monthly['Ano'] = df_monthly['MÊS_REFERENCIA'].dt.year
+            df_monthly['Mes'] = df_monthly['MÊS_REFERENCIA'].dt.month
+            
+            # Colunas finais: ['Ano', 'Mes', 'Consumo_MWh']
+            result[city_name] = df_monthly[['Ano', 'Mes', 'CONSUMO_MMWH']]
+        return result
     except Exception as e:
         print(f"Erro ao processar dados da ANEEL: {e}")
-        return None
+        return {}
+
+# Temperatura dos meses sem dados para cidades sem temperatura_padrao no catálogo
+DEFAULT_TEMPERATURE = 23.0
 
-def generate_monthly_data(city_name, temp_data, aneel_data=None):
+def generate_monthly_data(city_name, temp_data, aneel_data=None, start_date=None, end_date=None):
     """
     Agrega dados diários de temperatura para uma média mensal
     e combina com consumo de energia (real ou simulado) e população.
+    O período gerado vai de start_date a end_date (padrão: START_DATE a END_DATE).
+    A agregação é vetorizada: os dias são somados por mês com np.bincount (mesma ordem de soma
+    do loop original, portanto mesmos valores) e o consumo da ANEEL entra com um único merge.
     """
-    monthly_data = {}
+    start = np.datetime64(start_date or START_DATE, 'D')
+    end = np.datetime64(end_date or END_DATE, 'D')
+    first_month = start.astype('datetime64[M]')
+    months = np.arange(first_month, end.astype('datetime64[M]') + 1) if start <= end else np.array([], dtype='datetime64[M]')
+    n_months = len(months)
     
-    if temp_data and "time" in temp_data and "temperature_2m_mean" in temp_data:
-        for i in range(len(temp_data["time"])):
-            date_str = temp_data["time"][i]
-            temp = temp_data["temperature_2m_mean"][i]
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            month_key = date_obj.strftime("%Y-%m")
-            
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {"temps": []}
-            if temp is not None:
-                monthly_data[month_key]["temps"].append(temp)
+    # Soma e contagem das temperaturas válidas (não nulas) de cada mês do período
+    temp_sum = np.zeros(n_months)
+    temp_count = np.zeros(n_months, dtype=np.int64)
+    if temp_data and "time" in temp_data and "temperature_2m_mean" in temp_data and n_months:
+        day_month = np.array(temp_data["time"], dtype='datetime64[D]').astype('datetime64[M]')
+        temps = np.array(temp_data["temperature_2m_mean"], dtype=float) # None -> NaN
+        codes = (day_month - first_month).astype(np.int64)
+        valid = ~np.isnan(temps) & (codes >= 0) & (codes < n_months)
+        temp_sum = np.bincount(codes[valid], weights=temps[valid], minlength=n_months)
+        temp_count = np.bincount(codes[valid], minlength=n_months)
     
-    output_rows = []
-    pop_milhoes = get_population_data(city_name)
+    info = CITY_CATALOG.get(city_name, {})
+    default_temp = info.get("temperatura_padrao")
+    avg_temp = np.full(n_months, float(default_temp if default_temp is not None else DEFAULT_TEMPERATURE))
+    np.divide(temp_sum, temp_count, out=avg_temp, where=temp_count > 0)
     
-    # Adicionando um campo para indicar a fonte dos dados
-    source = "Simulado"
+    years = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month_numbers = months.astype(np.int64) % 12 + 1
+    pop_milhoes = get_population_data(city_name)
     
-    # Dados de consumo SIMULADOS (Mude esta seção se encontrar dados reais)
-    if city_name == "Berlim":
-        simulated_consumption = [1500, 1450, 1300, 1100, 950, 800, 850, 900, 1050, 1200, 1350, 1600]
-    elif city_name == "Nova York":
-        simulated_consumption = [6500, 6200, 5800, 5300, 5100, 5400, 6000, 5900, 5500, 5200, 5500, 6300]
+    # Consumo mensal (valores em arrays de objetos, para manter os inteiros simulados como int).
+    # O consumo simulado é indexado pelo mês do calendário, então coletas que começam fora de janeiro
+    # (incrementais) recebem o mesmo valor que o mês teria numa coleta completa.
+    simulated_consumption = info.get("consumo_simulado")
+    if city_name in ANEEL_MUNICIPIOS and aneel_data is not None:
+        calendar = pd.DataFrame({'Ano': years, 'Mes': month_numbers})
+        # Vale o primeiro registro da ANEEL de cada mês
+        aneel_months = aneel_data.drop_duplicates(['Ano', 'Mes'], keep='first')[['Ano', 'Mes', 'CONSUMO_MMWH']]
+        merged = calendar.merge(aneel_months, on=['Ano', 'Mes'], how='left')
+        aneel_mwh = (merged['CONSUMO_MMWH'] * 1000).to_numpy() # Convertendo para MWh
+        # Caso não haja dados da ANEEL para o mês, usamos o perfil simulado do catálogo, marcado como provisório:
+        # esses meses não avançam a marca d'água e são buscados de novo até a ANEEL publicá-los
+        missing = np.isnan(aneel_mwh)
+        if simulated_consumption:
+            simulated = np.array(simulated_consumption, dtype=object)[month_numbers - 1]
+            consumption = np.where(missing, simulated, aneel_mwh.astype(object))
+            sources = np.where(missing, FONTE_CONSUMO_PROVISORIA, "Real (ANEEL)").astype(object)
+        else:
+            keep = ~missing
+            years, month_numbers, avg_temp = years[keep], month_numbers[keep], avg_temp[keep]
+            consumption = aneel_mwh[keep].astype(object)
+            sources = np.full(len(consumption), "Real (ANEEL)", dtype=object)
     else:
-        simulated_consumption = None
-    
-    current_date = datetime.strptime(START_DATE, "%Y-%m-%d")
-    end_date_obj = datetime.strptime(END_DATE, "%Y-%m-%d")
+        # Dados de consumo SIMULADOS (perfil do catálogo); cidades ANEEL sem dados da ANEEL não geram linhas
+        if info.get("fonte_consumo") != FONTE_SIMULADA or not simulated_consumption:
+            return []
+        consumption = np.array(simulated_consumption, dtype=object)[month_numbers - 1]
+        sources = np.full(len(consumption), "Simulado", dtype=object)
     
-    month_idx = 0
-    while current_date <= end_date_obj:
-        year = current_date.year
-        month = current_date.month
-        month_key = current_date.strftime("%Y-%m")
-        
-        avg_temp = None
-        if month_key in monthly_data and monthly_data[month_key]["temps"]:
-            avg_temp = sum(monthly_data[month_key]["temps"]) / len(monthly_data[month_key]["temps"])
-        
-        if avg_temp is None:
-            if city_name == "Berlim": avg_temp = 10.0
-            elif city_name == "Nova York": avg_temp = 15.0
-            else: avg_temp = 23.0 # Para São Paulo
-            
-        consumo_mes = None
-        if city_name == "Sao Paulo" and aneel_data is not None:
-            source = "Real (ANEEL)"
-            # Converte a data para comparar com os dados da ANEEL
-            aneel_month_data = aneel_data[(aneel_data['Ano'] == year) & (aneel_data['Mes'] == month)]
-            if not aneel_month_data.empty:
-                consumo_mes = aneel_month_data['CONSUMO_MMWH'].iloc[0] * 1000 # Convertendo para MWh
-            else:
-                # Caso não haja dados da ANEEL para o mês, usamos um valor simulado
-                # AVISO: A ANEEL já tem dados completos para o ano de 2023. Isso seria mais útil no futuro.
-                # Para São Paulo, a sazonalidade é mais ligada a refrigeração (verão) e chuva/aquecimento (inverno)
-                simulated_consumption_sp = [8000, 7800, 7500, 7000, 6500, 6000, 6200, 6800, 7200, 7400, 7600, 8200]
-                consumo_mes = simulated_consumption_sp[month_idx % 12]
-        else:
-            source = "Simulado"
-            if simulated_consumption:
-                consumo_mes = simulated_consumption[month_idx % 12]
-        
-        if consumo_mes is not None:
-            row = {
-                "ano": year,
-                "mes": month,
-                "consumo_mwh": consumo_mes,
-                "temp_c": avg_temp,
-                "pop_milhoes": pop_milhoes,
-                "fonte_consumo": source
-            }
-            output_rows.append(row)
-        
-        # Avança para o próximo mês
-        if current_date.month == 12:
-            current_date = current_date.replace(year=current_date.year + 1, month=1, day=1)
-        else:
-            current_date = current_date.replace(month=current_date.month + 1, day=1)
-        
-        month_idx += 1
-        if current_date.year > int(END_DATE.split('-')[0]):
-            break
+    return [
+        {
+            "ano": year,
+            "mes": month,
+            "consumo_mwh": consumo_mes,
+            "temp_c": temp,
+            "pop_milhoes": pop_milhoes,
+            "fonte_consumo": source
+        }
+        for year, month, consumo_mes, temp, source in zip(years.tolist(), month_numbers.tolist(), consumption.tolist(),
+                                                         avg_temp.tolist(), sources.tolist())
+    ]
+
+def aneel_years(ranges):
+    """Anos de referência da ANEEL cobertos pelos períodos [(data_inicio, data_fim)] pedidos."""
+    ranges = list(ranges)
+    if not ranges:
+        return []
+    first = min(int(start[:4]) for start, _ in ranges)
+    last = max(int(end[:4]) for _, end in ranges)
+    return list(range(first, last + 1))
+
+def last_complete_month_end(today=None):
+    """Último dia do mês anterior: o mês corrente ainda está incompleto no arquivo histórico."""
+    today = today or datetime.now()
+    return (pd.Timestamp(today).normalize().replace(day=1) - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
 
-    return output_rows
+def plan_fetch_ranges(city_names, watermarks, history_start=START_DATE, end_date=None):
+    """
+    Define o período a buscar de cada cidade a partir das marcas d'água {(Cidade, Fonte): 'YYYY-MM'}:
+    do mês seguinte à última temperatura carregada (ou history_start, na primeira coleta) até end_date.
+    Cidades já atualizadas ficam fora do resultado.
+    """
+    end_date = end_date or last_complete_month_end()
+    ranges = {}
+    for city_name in city_names:
+        start_date = history_start
+        last_month = watermarks.get((city_name, FONTE_TEMPERATURA))
+        if last_month:
+            next_month = (pd.Period(last_month, freq="M") + 1).start_time.strftime("%Y-%m-%d")
+            start_date = max(start_date, next_month)
+        if start_date <= end_date:
+            ranges[city_name] = (start_date, end_date)
+    return ranges
 
-def main():
+def main(max_workers=DEFAULT_WORKERS, rate_limit=DEFAULT_RATE_LIMIT, use_cache=True, cache_max_bytes=DEFAULT_MAX_BYTES,
+         start_date=START_DATE, end_date=None, use_watermarks=True, batch_size=OPEN_METEO_BATCH_SIZE):
     os.makedirs("data/raw", exist_ok=True)
+    # Cache HTTP em disco (data/raw/cache): re-execuções reaproveitam os downloads anteriores
+    cache = HttpCache(CACHE_DIR, max_bytes=cache_max_bytes) if use_cache else None
+    file_path_all = RAW_OUTPUT_FILE
+    tmp_path = file_path_all + ".tmp"
     
-    # Coleta de dados da ANEEL para São Paulo
-    aneel_data = fetch_aneel_data()
+    # Período de cada cidade: só os meses posteriores ao que já está no banco
+    watermarks = load_watermarks(DB_PATH) if use_watermarks else {}
+    city_ranges = plan_fetch_ranges(CITIES_COORDS.keys(), watermarks, history_start=start_date, end_date=end_date)
+    if not city_ranges:
+        # Nada novo: um arquivo vazio mantém o Passo 2 funcionando (carga sem alterações)
+        open(file_path_all, 'w', encoding='utf-8').close()
+        print("Todas as cidades já estão atualizadas; nenhum mês novo para buscar.")
+        return
+    for city_name, (city_start, city_end) in city_ranges.items():
+        print(f"{city_name}: buscando de {city_start} a {city_end}.")
     
-    # Agora, itera sobre as cidades para buscar temperatura e gerar os dados
-    all_final_data = []
-    for city_name in CITIES_COORDS.keys():
-        print(f"Processando dados para {city_name}...")
-        temp_data = fetch_open_meteo_temperature(city_name, START_DATE, END_DATE)
-        final_data = generate_monthly_data(city_name, temp_data, aneel_data if city_name == "Sao Paulo" else None)
-        
-        if final_data:
-            all_final_data.extend(final_data)
-            print(f"Dados de {city_name} gerados com sucesso.")
-        else:
-            print(f"Não foi possível gerar dados para {city_name}.")
+    # Coleta de dados da ANEEL (São Paulo e demais municípios em ANEEL_MUNICIPIOS), se alguma delas tiver meses novos,
+    # apenas dos anos cobertos pelos períodos dessas cidades
+    aneel_municipios = {c: m for c, m in ANEEL_MUNICIPIOS.items() if c in city_ranges}
+    aneel_data = {}
+    if aneel_municipios:
+        aneel_data = fetch_aneel_data(cache=cache, municipios=aneel_municipios,
+                                      years=aneel_years(city_ranges[c] for c in aneel_municipios))
     
-    if all_final_data:
-        # Salva todos os dados em um único JSON para simplificar
-        file_path_all = "data/raw/dados_cidades_energia.json"
-        with open(file_path_all, 'w') as f:
-            json.dump(all_final_data, f, indent=4)
-        print(f"Todos os dados (Berlim, Nova York e Sao Paulo) salvos em {file_path_all}")
+    # Agora, busca as temperaturas de todas as cidades em paralelo e gera os dados.
+    # Cada cidade é gravada assim que fica pronta, em JSON delimitado por linha (uma linha por registro),
+    # para que nem o download nem a carga precisem manter o arquivo inteiro em memória.
+    total_rows = 0
+    print(f"Buscando temperaturas de {len(city_ranges)} cidades ({max_workers} threads, até {rate_limit} req/s, "
+          f"lotes de até {batch_size} cidades)...")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for city_name, temp_data in fetch_all_temperatures(city_ranges, max_workers=max_workers, rate_limit=rate_limit,
+                                                           cache=cache, batch_size=batch_size):
+            if temp_data is None:
+                # Sem linhas gravadas, a marca d'água não avança e a cidade é buscada de novo na próxima execução
+                print(f"Não foi possível buscar as temperaturas de {city_name}; nova tentativa na próxima execução.")
+                continue
+            print(f"Processando dados para {city_name}...")
+            city_start, city_end = city_ranges[city_name]
+            final_data = generate_monthly_data(city_name, temp_data, aneel_data.get(city_name),
+                                               start_date=city_start, end_date=city_end)
+
+            if final_data:
+                # Identifica a cidade em cada linha (chave da tabela energia_cidades junto com a data)
+                for row in final_data:
+                    row["cidade"] = city_name
+                    f.write(json.dumps(row) + "\n")
+                total_rows += len(final_data)
+                print(f"Dados de {city_name} gerados com sucesso.")
+            else:
+                print(f"Não foi possível gerar dados para {city_name}.")
+
+    # Mesmo sem linhas o arquivo é publicado (vazio), para o Passo 2 não recarregar uma coleta anterior
+    os.replace(tmp_path, file_path_all)
+    print(f"Todos os dados ({total_rows} registros) salvos em {file_path_all}")
+    if cache is not None:
+        print(f"Cache HTTP: {cache.stats['hits']} do disco, {cache.stats['revalidados']} revalidados (304), "
+              f"{cache.stats['baixados']} baixados.")
     
     print("Coleta e Geração de dados concluída!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Coleta de temperatura (Open-Meteo) e consumo (ANEEL/simulado).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Número de buscas simultâneas.")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT,
+                        help="Limite global de requisições por segundo (0 = sem limite).")
+    parser.add_argument("--no-cache", action="store_true", help="Ignora o cache HTTP em disco.")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help="Tamanho máximo do cache HTTP em MB (as entradas menos usadas são removidas).")
+    parser.add_argument("--start", default=START_DATE,
+                        help="Início do histórico (YYYY-MM-DD), usado para cidades ainda sem marca d'água.")
+    parser.add_argument("--end", default=None,
+                        help="Fim do período (YYYY-MM-DD). Padrão: último dia do mês anterior.")
+    parser.add_argument("--ignore-watermarks", action="store_true",
+                        help="Busca todo o período de --start a --end, ignorando o que já está no banco.")
+    parser.add_argument("--batch-size", type=int, default=OPEN_METEO_BATCH_SIZE,
+                        help="Cidades por requisição à Open-Meteo (1 = uma requisição por cidade).")
+    args = parser.parse_args()
+    main(max_workers=args.workers, rate_limit=args.rate_limit, use_cache=not args.no_cache,
+         cache_max_bytes=args.cache_max_mb * 1024 ** 2, start_date=args.start, end_date=args.end,
+         use_watermarks=not args.ignore_watermarks, batch_size=args.batch_size)
@@ -1,70 +1,186 @@
+import argparse
+import itertools
 import json
-import csv
 import os
-import sqlite3
+import sys
 
-input_file = "data/raw/dados_cidades_energia.json"
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.database import (FONTE_CONSUMO_PROVISORIA, FONTE_TEMPERATURA, advance_watermarks, begin_staging, bump_data_version, connect_for_write,
+                          count_changed_months, delete_missing_rows, ensure_energy_schema, upsert_energy_rows)
+from src.rollups import refresh_rollups
+
+input_file = "data/raw/dados_cidades_energia.jsonl"
+# Formato antigo (um único array JSON), lido apenas se o NDJSON não existir
+legacy_input_file = "data/raw/dados_cidades_energia.json"
 output_db = "data/processed/energia_cidades.db"
 
-def clean_and_load_data():
+# Linhas gravadas por lote: o pico de memória da carga depende deste valor, não do tamanho da entrada
+BATCH_SIZE = 5000
+
+def iter_entries(path):
+    """
+    Lê as entradas do arquivo bruto como um gerador.
+    NDJSON é lido linha a linha; o formato antigo (array JSON) precisa ser carregado inteiro.
+    """
+    with open(path, 'r', encoding='utf-8') as infile:
+        if path.endswith(".json"):
+            yield from json.load(infile)
+            return
+        for line_number, line in enumerate(infile, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Linha {line_number} inválida em '{path}': {e}. Pulando.")
+
+def iter_rows(entries):
+    """Converte as entradas em tuplas de energia_cidades, pulando (e reportando) as inválidas."""
+    for entry in entries:
+        try:
+            yield entry_to_row(entry)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Erro de conversão de tipo ou dados inválidos na entrada: {entry}. Erro: {e}. Pulando.")
+
+def track_watermarks(rows, marks, provisional=None):
+    """
+    Repassa as tuplas acumulando em `marks` o último mês (YYYY-MM) de cada (Cidade, Fonte):
+    a temperatura (FONTE_TEMPERATURA) e a fonte de consumo da linha.
+    Linhas com consumo provisório (FONTE_CONSUMO_PROVISORIA) não avançam as marcas; o primeiro mês
+    provisório de cada cidade fica em `provisional`, para cap_watermarks.
+    """
+    for row in rows:
+        cidade, data_str, fonte_consumo = row[0], row[1], row[5]
+        mes = data_str[:7]
+        if fonte_consumo == FONTE_CONSUMO_PROVISORIA:
+            if provisional is not None and mes < provisional.get(cidade, "9999-12"):
+                provisional[cidade] = mes
+            yield row
+            continue
+        for fonte in (FONTE_TEMPERATURA, fonte_consumo):
+            if fonte and mes > marks.get((cidade, fonte), ""):
+                marks[(cidade, fonte)] = mes
+        yield row
+
+def cap_watermarks(marks, provisional):
+    """
+    Mantém as marcas de cada cidade antes do seu primeiro mês provisório ({cidade: 'YYYY-MM'}),
+    mesmo que meses reais posteriores tenham sido carregados: a próxima coleta busca de novo a partir dele.
+    """
+    for (cidade, fonte), mes in list(marks.items()):
+        first = provisional.get(cidade)
+        if first and mes >= first:
+            ano, num = int(first[:4]), int(first[5:7])
+            marks[(cidade, fonte)] = f"{ano - 1}-12" if num == 1 else f"{ano}-{num - 1:02d}"
+    return marks
+
+def batched(iterable, size):
+    """Agrupa um iterável em listas de até `size` itens."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def entry_to_row(entry):
+    """Converte uma entrada do JSON bruto para a tupla gravada em energia_cidades."""
+    cidade = entry.get("cidade")
+    ano = entry.get("ano")
+    mes = entry.get("mes")
+    consumo_mwh = entry.get("consumo_mwh")
+    temp_c = entry.get("temp_c")
+    populacao_milhoes = entry.get("pop_milhoes")
+    fonte_consumo = entry.get("fonte_consumo")
+
+    if not cidade:
+        raise ValueError("entrada sem cidade")
+
+    # Converte para string no formato YYYY-MM-DD
+    data_str = f"{ano}-{mes:02d}-01"
+    return (cidade, data_str, consumo_mwh, temp_c, populacao_milhoes, fonte_consumo)
+
+def clean_and_load_data(full=False):
     """
     Limpa os dados do JSON e os carrega para o banco de dados SQLite.
+
+    O arquivo NDJSON é consumido em streaming e gravado em lotes de BATCH_SIZE linhas,
+    então o pico de memória não cresce com o tamanho da entrada.
+
+    A carga é incremental: as linhas são gravadas com upsert na chave (Cidade, Data), e apenas
+    meses novos ou alterados são escritos (e têm seus rollups recalculados). Tudo acontece em uma
+    única transação, então o dashboard continua lendo a versão anterior até o COMMIT.
+    Com full=True, linhas que não estão no JSON são removidas (o banco passa a refletir exatamente a entrada).
+    As marcas d'água da coleta (último mês por cidade e fonte) e a versão dos dados são atualizadas no mesmo COMMIT.
     """
     print(f"Limpando dados de {input_file} e carregando para o DB '{output_db}'...")
     
     if not os.path.exists(os.path.dirname(output_db)):
         os.makedirs(os.path.dirname(output_db), exist_ok=True)
 
+    path = input_file
+    if not os.path.exists(path) and os.path.exists(legacy_input_file):
+        print(f"Aviso: '{input_file}' não encontrado; lendo o formato antigo '{legacy_input_file}' (carregado inteiro em memória).")
+        path = legacy_input_file
+
+    conn = None
     try:
-        with open(input_file, 'r', encoding='utf-8') as infile:
-            data = json.load(infile)
-
-        conn = sqlite3.connect(output_db)
-        cursor = conn.cursor()
-        
-        # Cria a tabela no banco de dados
-        cursor.execute("DROP TABLE IF EXISTS energia_cidades")
-        cursor.execute("""
-            CREATE TABLE energia_cidades (
-                Cidade TEXT,
-                Data TEXT,
-                Consumo_MWh REAL,
-                Temperatura_C REAL,
-                Populacao_Milhoes REAL,
-                Fonte_Consumo TEXT
-            )
-        """)
-        
-        for entry in data:
-            try:
-                cidade = entry.get("cidade")
-                ano = entry.get("ano")
-                mes = entry.get("mes")
-                consumo_mwh = entry.get("consumo_mwh")
-                temp_c = entry.get("temp_c")
-                populacao_milhoes = entry.get("pop_milhoes")
-                fonte_consumo = entry.get("fonte_consumo")
-
-                # Converte para string no formato YYYY-MM-DD
-                data_str = f"{ano}-{mes:02d}-01"
-
-                cursor.execute("""
-                    INSERT INTO energia_cidades (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (cidade, data_str, consumo_mwh, temp_c, populacao_milhoes, fonte_consumo))
-            except (ValueError, TypeError) as e:
-                print(f"Erro de conversão de tipo ou dados inválidos na entrada: {entry}. Erro: {e}. Pulando.")
-                continue
-        
-        conn.commit()
-        conn.close()
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        conn = connect_for_write(output_db)
+        conn.execute("BEGIN IMMEDIATE")
+        migrated = ensure_energy_schema(conn)
+        begin_staging(conn, track_keys=full)
+
+        # Pipeline em streaming: arquivo -> entradas -> tuplas -> lotes de tamanho fixo -> upsert
+        total_rows = 0
+        marks, provisional = {}, {}
+        for batch in batched(track_watermarks(iter_rows(iter_entries(path)), marks, provisional), BATCH_SIZE):
+            upsert_energy_rows(conn, batch)
+            total_rows += len(batch)
+        if full and not total_rows:
+            raise ValueError(f"carga completa sem nenhuma linha em '{path}'; nada foi removido")
+        removed = delete_missing_rows(conn) if full else 0
+        # Marcas d'água da coleta, na mesma transação: a próxima coleta pede só os meses seguintes
+        # (e de novo os meses de consumo provisório)
+        advance_watermarks(conn, cap_watermarks(marks, provisional), reset=full)
+        if provisional:
+            print(f"{len(provisional)} cidade(s) com consumo provisório (ANEEL pendente); esses meses serão buscados de novo.")
+        n_changed_months = count_changed_months(conn)
+        # Nova versão dos dados só quando a tabela mudou: cópias derivadas (Parquet) continuam válidas se nada mudou
+        data_version = bump_data_version(conn, changed=bool(n_changed_months or removed or migrated))
+
+        if full or removed or migrated:
+            print("Reconstruindo tabelas de agregados (mensal, anual, mês do ano)...")
+            refresh_rollups(conn)
+        elif n_changed_months:
+            print(f"Atualizando agregados de {n_changed_months} mês(es) novo(s) ou alterado(s)...")
+            refresh_rollups(conn, months_table="_meses_alterados")
+        conn.execute("COMMIT")
+        print(f"Linhas lidas: {total_rows}. Meses novos ou alterados: {n_changed_months}. Linhas removidas: {removed}. "
+              f"Versão dos dados: {data_version}.")
         print("Limpeza de dados e carga no banco de dados concluída.")
     except FileNotFoundError:
         print(f"Erro: Arquivo '{input_file}' não encontrado. Execute 01_download_data.py primeiro.")
     except json.JSONDecodeError as e:
-        print(f"Erro ao decodificar JSON do arquivo '{input_file}'. Erro: {e}")
+        if conn is not None and conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"Erro ao decodificar JSON do arquivo '{path}'. Erro: {e}")
     except Exception as e:
+        if conn is not None and conn.in_transaction:
+            conn.execute("ROLLBACK")
         print(f"Ocorreu um erro inesperado: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 if __name__ == "__main__":
-    clean_and_load_data()
+    parser = argparse.ArgumentParser(description="Carga (incremental) do JSON bruto no banco SQLite.")
+    parser.add_argument("--full", action="store_true",
+                        help="Remove do banco as linhas ausentes no JSON (carga completa, ainda em uma única transação).")
+    args = parser.parse_args()
+    clean_and_load_data(full=args.full)
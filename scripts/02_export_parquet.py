@@ -0,0 +1,40 @@
+# scripts/02_export_parquet.py
+import argparse
+import os
+import sys
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.columnar_store import PYARROW_AVAILABLE, PARQUET_DIR, export_parquet, is_store_current
+from src.data_loader import DB_PATH
+
+def run_parquet_export(force=False):
+    """
+    Exporta o banco SQLite para Parquet particionado por Cidade e Ano.
+    A cópia colunar atende as leituras de linhas brutas (ex.: scripts/benchmark_load.py); o dashboard lê os
+    rollups do SQLite. Se a exportação existente já corresponde à versão atual dos dados, nada é refeito
+    (force=True exporta de novo mesmo assim).
+    """
+    if not PYARROW_AVAILABLE:
+        print("pyarrow não está instalado. Pulando a exportação Parquet (as leituras usarão o SQLite).")
+        return
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+    if not force and is_store_current(DB_PATH, PARQUET_DIR):
+        print(f"O armazenamento Parquet em '{PARQUET_DIR}' já está atualizado; nada a exportar.")
+        return
+
+    print(f"Exportando '{DB_PATH}' para Parquet em '{PARQUET_DIR}'...")
+    try:
+        total = export_parquet(DB_PATH, PARQUET_DIR)
+        print(f"Exportação Parquet concluída: {total} linhas.")
+    except Exception as e:
+        print(f"Erro durante a exportação Parquet: {e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta energia_cidades para o armazenamento Parquet.")
+    parser.add_argument("--force", action="store_true", help="Exporta mesmo que a cópia já esteja atualizada.")
+    args = parser.parse_args()
+    run_parquet_export(force=args.force)
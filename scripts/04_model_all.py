@@ -0,0 +1,88 @@
+# scripts/04_model_all.py
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.data_loader import DB_PATH, load_data
+from src.model_registry import REGISTRY_TABLE, dataset_versions, save_models
+from src.models import FEATURE_COLUMN, TARGET_COLUMN, train_many
+
+def print_interpretation(city, row):
+    """Interpretação do modelo de uma cidade (o mesmo texto dos antigos scripts 04_model_<cidade>.py)."""
+    coeficiente, intercepto, r_quadrado = row.coeficiente, row.intercepto, row.r2
+    print(f"\n--- Interpretação do Modelo - {city} ---")
+    print(f"Coeficiente (Impacto da Temperatura): {coeficiente:.2f} MWh/°C")
+    print(f"Intercepto (Consumo Base): {intercepto:.2f} MWh")
+    print(f"R-quadrado (Qualidade do Modelo): {r_quadrado:.2f}")
+    if r_quadrado > 0.7:
+        print(f"O modelo explica uma **alta proporção** da variação no consumo de energia de {city}.")
+    elif r_quadrado > 0.4:
+        print(f"O modelo explica uma **parte razoável** da variação no consumo de energia de {city}.")
+    else:
+        print("O modelo explica uma **baixa proporção** da variação, sugerindo que outros fatores (não incluídos) são mais relevantes.")
+
+    if coeficiente > 0:
+        print(f"Para cada aumento de 1°C na temperatura, o consumo de energia tende a **aumentar em {abs(coeficiente):.2f} MWh**.")
+    elif coeficiente < 0:
+        print(f"Para cada aumento de 1°C na temperatura, o consumo de energia tende a **diminuir em {abs(coeficiente):.2f} MWh**.")
+    else:
+        print("A temperatura não parece ter um impacto linear significativo no consumo de energia, de acordo com este modelo.")
+    print(f"O consumo base estimado, quando a temperatura é 0°C, é de {intercepto:.2f} MWh.")
+
+def run_models(cities=None, since=None, details=False):
+    """
+    Treina o modelo de regressão de todas as cidades (ou das cidades em `cities`) com os dados a partir de `since`.
+    Os dados são lidos em uma única consulta e ajustados de uma vez com train_many (forma fechada, vetorizado);
+    os modelos vão para o registro (src/model_registry.py) com a versão dos dados de cada cidade.
+    A leitura é a mesma de 05_populate_model_registry.py e do dashboard (rollup mensal, modo compacto), então
+    as versões coincidem: sem filtros, as chaves gravadas são as do histórico completo de 05, e um recorte
+    (--cities/--since) fica disponível para quem consultar o registro com os mesmos dados mensais.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+
+    t0 = time.perf_counter()
+    print("Treinando os modelos de regressão linear" + (f" a partir de {since}" if since else "") + "...")
+    df = load_data(cities=cities, start=since, columns=['Cidade', 'Data', FEATURE_COLUMN, TARGET_COLUMN],
+                   compact=True, granularity="mensal")
+    df = df[df['Cidade'].notna()] if not df.empty else df
+    if df.empty:
+        print("Não há dados suficientes para treinar os modelos.")
+        return
+    if cities:
+        missing = sorted(set(cities) - set(df['Cidade'].astype(str).unique()))
+        if missing:
+            print(f"Aviso: sem dados para: {', '.join(missing)}.")
+
+    table = train_many(df)
+    try:
+        saved = save_models(table, dataset_versions(df))
+    except Exception as e:
+        print(f"Erro ao gravar o registro de modelos ({REGISTRY_TABLE}): {e}")
+        return
+
+    trained = table[table['treinado']]
+    not_trained = table.index[~table['treinado']].tolist()
+    print(f"{saved} modelo(s) gravado(s) no registro de modelos ({REGISTRY_TABLE}) em {time.perf_counter() - t0:.2f}s.")
+    if not_trained:
+        print(f"Sem dados suficientes para: {', '.join(map(str, not_trained))}.")
+
+    print("\n--- Resultados dos Modelos de Regressão Linear ---")
+    print(trained[['n', 'coeficiente', 'intercepto', 'r2', 'mae', 'rmse']].sort_values('r2', ascending=False)
+          .round(2).to_string())
+    if details:
+        for city, row in trained.iterrows():
+            print_interpretation(city, row)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina os modelos de consumo x temperatura de todas as cidades.")
+    parser.add_argument("--cities", nargs="+", default=None, help="Cidades a modelar (padrão: todas).")
+    parser.add_argument("--since", default=None, help="Usa apenas os dados a partir desta data (YYYY-MM-DD).")
+    parser.add_argument("--details", action="store_true", help="Imprime a interpretação do modelo de cada cidade.")
+    args = parser.parse_args()
+    run_models(cities=args.cities, since=args.since, details=args.details)
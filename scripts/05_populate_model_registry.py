@@ -0,0 +1,58 @@
+# scripts/05_populate_model_registry.py
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.data_loader import DB_PATH, load_data
+from src.model_registry import dataset_versions, prune_registry, save_model_sets
+from src.models import FEATURE_COLUMN, TARGET_COLUMN, train_many
+
+def populate_model_registry(prune=True):
+    """
+    Treina os modelos de todas as cidades (train_many, em uma única passada por recorte) e os grava no registro,
+    com a versão dos dados de cada cidade. Os recortes são os que o dashboard seleciona: o histórico completo
+    e cada ano (slider de ano). Os dados são lidos exatamente como o dashboard os lê (rollup mensal, modo
+    compacto), então as versões coincidem e o app apenas consulta o registro.
+    Com prune=True, versões antigas das cidades treinadas são removidas.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+
+    t0 = time.perf_counter()
+    df = load_data(columns=['Cidade', 'Data', FEATURE_COLUMN, TARGET_COLUMN], compact=True, granularity="mensal")
+    df = df[df['Cidade'].notna()] if not df.empty else df
+    if df.empty:
+        print("Nenhum dado disponível para treinar os modelos.")
+        return
+
+    full_table = train_many(df)
+    model_sets = [(full_table, dataset_versions(df))]
+    # Um modelo por (cidade, ano): o recorte que o dashboard carrega quando um ano é selecionado
+    for _, df_year in df.groupby(df['Data'].dt.year, sort=True):
+        model_sets.append((train_many(df_year), dataset_versions(df_year)))
+
+    keep_versions = {}
+    for table, versions in model_sets:
+        for city in table.index[table['treinado']]:
+            keep_versions.setdefault(city, set()).add(versions[city])
+    try:
+        saved = save_model_sets(model_sets)
+        removed = prune_registry(keep_versions) if prune else 0
+    except Exception as e:
+        print(f"Erro ao gravar o registro de modelos: {e}")
+        return
+    not_trained = int((~full_table['treinado']).sum())
+    print(f"Registro de modelos atualizado: {saved} modelo(s) gravado(s) (histórico completo e {len(model_sets) - 1} "
+          f"ano(s)), {not_trained} cidade(s) sem dados suficientes, {removed} versão(ões) antiga(s) removida(s) "
+          f"em {time.perf_counter() - t0:.2f}s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula os modelos de todas as cidades no registro de modelos.")
+    parser.add_argument("--keep-old", action="store_true", help="Mantém as versões antigas dos modelos no registro.")
+    args = parser.parse_args()
+    populate_model_registry(prune=not args.keep_old)
@@ -0,0 +1,56 @@
+# scripts/06_backtest_models.py
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.backtesting import (DEFAULT_HORIZON, DEFAULT_MIN_TRAIN, DEFAULT_STEP, run_backtests, save_backtests,
+                             summarize_backtests)
+from src.data_loader import DB_PATH, load_data
+from src.models import FEATURE_COLUMN, TARGET_COLUMN
+
+def run_backtest_job(cities=None, min_train=DEFAULT_MIN_TRAIN, horizon=DEFAULT_HORIZON, step=DEFAULT_STEP, workers=None):
+    """
+    Avaliação fora da amostra (origem móvel, janela expansiva) dos modelos de todas as cidades,
+    com os resultados gravados na tabela backtests.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+
+    t0 = time.perf_counter()
+    df = load_data(cities=cities, columns=['Cidade', 'Data', FEATURE_COLUMN, TARGET_COLUMN], granularity="mensal")
+    if df.empty:
+        print("Nenhum dado disponível para o backtesting.")
+        return
+
+    print(f"Backtesting: treino inicial de {min_train} meses, horizonte de {horizon} mês(es), "
+          f"nova origem a cada {step} mês(es)...")
+    results = run_backtests(df, min_train=min_train, horizon=horizon, step=step, workers=workers)
+    if results.empty:
+        print(f"Nenhuma cidade tem mais de {min_train} meses de dados; nada a avaliar.")
+        return
+    try:
+        saved = save_backtests(results)
+    except Exception as e:
+        print(f"Erro ao gravar os resultados do backtesting: {e}")
+        return
+
+    summary = summarize_backtests(results)
+    print(f"{saved} janela(s) de {len(summary)} cidade(s) avaliadas e gravadas em {time.perf_counter() - t0:.2f}s.")
+    print("\n--- Erro fora da amostra por cidade (maiores MAE) ---")
+    print(summary.sort_values("MAE", ascending=False).head(20).round(2).to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtesting de origem móvel dos modelos de consumo de todas as cidades.")
+    parser.add_argument("--cities", nargs="+", default=None, help="Cidades a avaliar (padrão: todas).")
+    parser.add_argument("--min-train", type=int, default=DEFAULT_MIN_TRAIN, help="Meses na primeira janela de treino.")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Meses avaliados após cada origem.")
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP, help="Meses entre origens consecutivas.")
+    parser.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: número de CPUs).")
+    args = parser.parse_args()
+    run_backtest_job(cities=args.cities, min_train=args.min_train, horizon=args.horizon, step=args.step,
+                     workers=args.workers)
@@ -0,0 +1,97 @@
+# scripts/07_anomaly_sweep.py
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pandas as pd
+
+from src.analytics import ANOMALY_COLUMNS, BASELINES, detect_anomalies_batch
+from src.data_loader import DB_PATH, load_data
+from src.database import connect_for_write
+
+ANOMALY_TABLE = "anomalias"
+
+def create_anomaly_table(conn):
+    """Cria a tabela de anomalias detectadas (se ainda não existir)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ANOMALY_TABLE} (
+            Cidade TEXT NOT NULL,
+            Data TEXT NOT NULL,
+            Referencia TEXT NOT NULL,
+            Consumo_MWh REAL,
+            Z_Score REAL,
+            Tipo_Anomalia TEXT,
+            Detectado_Em TEXT,
+            PRIMARY KEY (Cidade, Data, Referencia)
+        )
+    """)
+
+def save_anomalies(anomalies, cities, baselines, db_path=DB_PATH):
+    """
+    Grava as anomalias em uma única transação. As anomalias anteriores das cidades e referências
+    varridas são substituídas (um ponto que deixou de ser anômalo sai da tabela). Retorna o número de linhas gravadas.
+    """
+    rows = anomalies.assign(Data=pd.to_datetime(anomalies['Data']).dt.strftime('%Y-%m-%d'))[ANOMALY_COLUMNS]
+    conn = connect_for_write(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_anomaly_table(conn)
+        conn.executemany(f"DELETE FROM {ANOMALY_TABLE} WHERE Cidade = ? AND Referencia = ?",
+                         [(city, b) for city in cities for b in baselines])
+        conn.executemany(f"""
+            INSERT INTO {ANOMALY_TABLE} ({", ".join(ANOMALY_COLUMNS)}, Detectado_Em)
+            VALUES ({", ".join("?" * len(ANOMALY_COLUMNS))}, datetime('now'))
+        """, rows.astype(object).itertuples(index=False, name=None))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+def run_anomaly_sweep(cities=None, baselines=BASELINES, threshold_std=1.5, window=12):
+    """
+    Varredura de anomalias de todas as cidades: uma leitura do rollup mensal e uma passada
+    de detect_anomalies_batch por referência, com o resultado gravado na tabela anomalias.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+
+    t0 = time.perf_counter()
+    df = load_data(cities=cities, columns=['Cidade', 'Data', 'Consumo_MWh'], compact=True, granularity="mensal")
+    df = df[df['Cidade'].notna()] if not df.empty else df
+    if df.empty:
+        print("Nenhum dado disponível para a varredura de anomalias.")
+        return
+
+    results = [detect_anomalies_batch(df, threshold_std=threshold_std, baseline=b, window=window) for b in baselines]
+    anomalies = pd.concat(results, ignore_index=True)
+    swept = df['Cidade'].astype(str).unique().tolist()
+    try:
+        saved = save_anomalies(anomalies, swept, baselines)
+    except Exception as e:
+        print(f"Erro ao gravar as anomalias: {e}")
+        return
+
+    print(f"{saved} anomalia(s) em {len(swept)} cidade(s) gravadas na tabela {ANOMALY_TABLE} "
+          f"em {time.perf_counter() - t0:.2f}s.")
+    if not anomalies.empty:
+        print("\n--- Anomalias por referência e tipo ---")
+        print(anomalies.groupby(['Referencia', 'Tipo_Anomalia']).size().unstack(fill_value=0).to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Varredura de anomalias de consumo de todas as cidades.")
+    parser.add_argument("--cities", nargs="+", default=None, help="Cidades a varrer (padrão: todas).")
+    parser.add_argument("--baselines", nargs="+", choices=BASELINES, default=list(BASELINES),
+                        help="Referências do Z-score (padrão: todas).")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Limite de |Z-score| para uma anomalia.")
+    parser.add_argument("--window", type=int, default=12, help="Meses da janela da referência móvel.")
+    args = parser.parse_args()
+    run_anomaly_sweep(cities=args.cities, baselines=args.baselines, threshold_std=args.threshold, window=args.window)
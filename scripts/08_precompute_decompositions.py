@@ -0,0 +1,48 @@
+# scripts/08_precompute_decompositions.py
+import argparse
+import os
+import sys
+import time
+
+# Permite importar os módulos de 'src' quando o script é executado a partir da raiz do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.data_loader import DB_PATH, load_data
+from src.decomposition import MIN_MONTHS
+from src.decomposition_store import DECOMPOSITION_TABLE, decompose_all, save_decompositions
+
+def precompute_decompositions(cities=None, workers=None):
+    """
+    Decompõe (tendência, sazonalidade, resíduos) a série mensal de consumo de todas as cidades e grava
+    os componentes na tabela decomposicoes. Os dados são lidos exatamente como o dashboard os lê
+    (rollup mensal, modo compacto), então as versões das séries coincidem e o app apenas renderiza.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute 02_clean_transform_all.py primeiro.")
+        return
+
+    t0 = time.perf_counter()
+    df = load_data(cities=cities, columns=['Cidade', 'Data', 'Consumo_MWh'], compact=True, granularity="mensal")
+    if df.empty:
+        print("Nenhum dado disponível para a decomposição.")
+        return
+
+    decompositions = decompose_all(df, workers=workers)
+    skipped = df['Cidade'].dropna().nunique() - len(decompositions)
+    if not decompositions:
+        print(f"Nenhuma cidade tem os {MIN_MONTHS} meses necessários para a decomposição.")
+        return
+    try:
+        saved = save_decompositions(decompositions)
+    except Exception as e:
+        print(f"Erro ao gravar as decomposições: {e}")
+        return
+    print(f"Decomposição de {saved} cidade(s) gravada na tabela {DECOMPOSITION_TABLE} em {time.perf_counter() - t0:.2f}s"
+          + (f" ({skipped} cidade(s) com menos de {MIN_MONTHS} meses)." if skipped else "."))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula a decomposição sazonal da série de consumo de todas as cidades.")
+    parser.add_argument("--cities", nargs="+", default=None, help="Cidades a decompor (padrão: todas).")
+    parser.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: número de CPUs).")
+    args = parser.parse_args()
+    precompute_decompositions(cities=args.cities, workers=args.workers)
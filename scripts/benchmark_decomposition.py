@@ -0,0 +1,91 @@
+# scripts/benchmark_decomposition.py
+# Compara a decomposição vetorizada (src/decomposition.py) com o seasonal_decompose do statsmodels,
+# série a série, conferindo tendência, sazonalidade e resíduos.
+# Uso: python3 scripts/benchmark_decomposition.py [--series 100 1000 10000] [--months 240]
+import argparse
+import os
+import sys
+import time
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.decomposition import seasonal_decompose_many
+
+# (período, extrapolate_trend) conferidos com o statsmodels; o benchmark de tempo usa o primeiro
+CASES = [(12, "period"), (12, 0), (12, 3), (7, "period"), (4, 1)]
+TOLERANCE = 1e-9
+
+def synthetic_series(n_series, n_months, seed=42):
+    """Séries mensais sintéticas de consumo: nível + tendência + sazonalidade anual + ruído."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_months)
+    level = rng.normal(1000, 200, (n_series, 1))
+    slope = rng.normal(0, 1, (n_series, 1))
+    amplitude = rng.normal(150, 50, (n_series, 1))
+    return level + slope * t + amplitude * np.sin(2 * np.pi * t / 12) + rng.normal(0, 30, (n_series, n_months))
+
+def statsmodels_per_series(values, period, extrapolate_trend):
+    """Referência: um seasonal_decompose do statsmodels por série."""
+    from statsmodels.tsa.seasonal import seasonal_decompose
+    components = {"trend": [], "seasonal": [], "resid": []}
+    for series in values:
+        result = seasonal_decompose(series, model="additive", period=period, extrapolate_trend=extrapolate_trend)
+        for name in components:
+            components[name].append(result.__getattribute__(name))
+    return {name: np.array(rows) for name, rows in components.items()}
+
+def max_difference(result, reference):
+    """Maior diferença absoluta entre os componentes (NaN nas mesmas posições contam como iguais)."""
+    worst = 0.0
+    for name, expected in reference.items():
+        got = getattr(result, name)
+        if not np.array_equal(np.isnan(got), np.isnan(expected)):
+            return np.inf
+        worst = max(worst, np.nanmax(np.abs(got - expected)))
+    return worst
+
+def validate(n_months):
+    """Confere todos os CASES (inclusive séries que não fecham um número inteiro de ciclos)."""
+    ok = True
+    for months in (n_months, n_months + 5):
+        values = synthetic_series(50, months, seed=months)
+        for period, extrapolate in CASES:
+            diff = max_difference(seasonal_decompose_many(values, period, extrapolate),
+                                  statsmodels_per_series(values, period, extrapolate))
+            status = "ok" if diff <= TOLERANCE else "DIVERGENTE"
+            ok = ok and diff <= TOLERANCE
+            print(f"  {months} meses, período {period}, extrapolate_trend={extrapolate!r}: {diff:.2e} ({status})")
+    return ok
+
+def run_benchmark(series_counts, n_months, reference_limit):
+    period, extrapolate = CASES[0]
+    print(f"{'séries':>8} {'vetorizado (s)':>15} {'statsmodels (s)':>16} {'maior diferença':>16}")
+    for n_series in series_counts:
+        values = synthetic_series(n_series, n_months)
+        t0 = time.perf_counter()
+        result = seasonal_decompose_many(values, period, extrapolate)
+        t_batch = time.perf_counter() - t0
+
+        if n_series > reference_limit:
+            print(f"{n_series:>8} {t_batch:>15.4f} {'-':>16} {'-':>16}")
+            continue
+        t0 = time.perf_counter()
+        reference = statsmodels_per_series(values, period, extrapolate)
+        t_ref = time.perf_counter() - t0
+        print(f"{n_series:>8} {t_batch:>15.4f} {t_ref:>16.2f} {max_difference(result, reference):>16.2e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validação e benchmark da decomposição sazonal vetorizada.")
+    parser.add_argument("--series", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--months", type=int, default=240, help="Meses por série.")
+    parser.add_argument("--reference-limit", type=int, default=10000,
+                        help="Maior número de séries para o qual o statsmodels também é executado.")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", FutureWarning) # avisos de depreciação do statsmodels
+    print("Validação contra o statsmodels:")
+    if not validate(args.months):
+        sys.exit(1)
+    print()
+    run_benchmark(args.series, args.months, args.reference_limit)
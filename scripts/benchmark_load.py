@@ -0,0 +1,86 @@
+# scripts/benchmark_load.py
+# Compara o tempo de carga do load_data a partir do SQLite e do armazenamento Parquet.
+# Uso: python3 scripts/benchmark_load.py [--sizes 100000 1000000 10000000]
+import argparse
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src import data_loader
+from src.columnar_store import PYARROW_AVAILABLE, export_parquet
+
+def build_synthetic_db(db_path, n_rows, n_cities=50):
+    """Gera um banco energia_cidades sintético com dados horários para n_cities cidades."""
+    rows_per_city = int(np.ceil(n_rows / n_cities))
+    datas = pd.date_range("2000-01-01", periods=rows_per_city, freq="h").strftime('%Y-%m-%d %H:%M:%S')
+    rng = np.random.default_rng(42)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE energia_cidades (
+            Cidade TEXT, Data TEXT, Consumo_MWh REAL, Temperatura_C REAL,
+            Populacao_Milhoes REAL, Fonte_Consumo TEXT
+        )
+    """)
+    remaining = n_rows
+    for c in range(n_cities):
+        n = min(rows_per_city, remaining)
+        if n <= 0:
+            break
+        cidade = f"Cidade {c:03d}"
+        consumo = rng.normal(1000, 100, n)
+        temp = rng.normal(15, 8, n)
+        conn.executemany(
+            "INSERT INTO energia_cidades VALUES (?, ?, ?, ?, ?, ?)",
+            zip([cidade] * n, datas[:n], consumo.tolist(), temp.tolist(), [1.0] * n, ["Simulado"] * n)
+        )
+        remaining -= n
+    conn.execute("CREATE INDEX idx_energia_cidade_data ON energia_cidades (Cidade, Data)")
+    conn.commit()
+    conn.close()
+
+def time_call(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def run_benchmark(sizes):
+    if not PYARROW_AVAILABLE:
+        print("pyarrow não está instalado; não é possível comparar com o Parquet.")
+        return
+
+    print(f"{'linhas':>12} | {'cenário':<22} | {'sqlite (s)':>10} | {'parquet (s)':>11} | {'linhas lidas':>12}")
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "energia_cidades.db")
+            parquet_dir = os.path.join(tmp, "parquet")
+            build_synthetic_db(db_path, n_rows)
+            export_parquet(db_path, parquet_dir)
+
+            data_loader.DB_PATH = db_path
+            data_loader.PARQUET_DIR = parquet_dir
+            scenarios = {
+                "tabela inteira": {},
+                "1 cidade, 1 ano": {"cities": ["Cidade 000"], "start": "2000-01-01", "end": "2000-12-31"},
+            }
+            for name, kwargs in scenarios.items():
+                t_sql, df_sql = time_call(lambda: data_loader.load_data(storage="sqlite", **kwargs))
+                t_pq, df_pq = time_call(lambda: data_loader.load_data(storage="parquet", **kwargs))
+                assert len(df_sql) == len(df_pq), "As duas origens retornaram quantidades diferentes de linhas."
+                print(f"{n_rows:>12} | {name:<22} | {t_sql:>10.3f} | {t_pq:>11.3f} | {len(df_pq):>12}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga: SQLite vs. Parquet.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10**5, 10**6, 10**7],
+                        help="Quantidades de linhas a testar.")
+    args = parser.parse_args()
+    run_benchmark(args.sizes)
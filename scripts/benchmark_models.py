@@ -0,0 +1,73 @@
+# scripts/benchmark_models.py
+# Compara o treino em lote (train_many, forma fechada) com um LinearRegression do sklearn por cidade,
+# conferindo coeficientes e métricas.
+# Uso: python3 scripts/benchmark_models.py [--cities 100 1000 10000] [--months 240]
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.models import train_many
+
+def synthetic_frame(n_cities, n_months, seed=42):
+    """Séries mensais sintéticas de temperatura e consumo para n_cities cidades."""
+    rng = np.random.default_rng(seed)
+    temp = rng.normal(15, 8, (n_cities, n_months))
+    slope = rng.normal(-20, 10, (n_cities, 1))
+    consumo = 1000 + slope * temp + rng.normal(0, 50, (n_cities, n_months))
+    return pd.DataFrame({
+        "Cidade": np.repeat([f"Cidade {c:05d}" for c in range(n_cities)], n_months),
+        "Temperatura_C": temp.ravel(),
+        "Consumo_MWh": consumo.ravel(),
+    })
+
+def sklearn_per_city(df):
+    """Referência: o treino original, um LinearRegression (e métricas do sklearn) por cidade."""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+    rows = {}
+    for city, df_city in df.groupby("Cidade", sort=True):
+        X = df_city["Temperatura_C"].values.reshape(-1, 1)
+        y = df_city["Consumo_MWh"].values
+        model = LinearRegression().fit(X, y)
+        y_pred = model.predict(X)
+        rows[city] = {
+            "coeficiente": model.coef_[0],
+            "intercepto": model.intercept_,
+            "r2": model.score(X, y),
+            "mae": mean_absolute_error(y, y_pred),
+            "rmse": math.sqrt(mean_squared_error(y, y_pred)),
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+def run_benchmark(city_counts, n_months, reference_limit):
+    print(f"{'cidades':>8} {'train_many (s)':>15} {'sklearn (s)':>12} {'maior diferença relativa':>25}")
+    for n_cities in city_counts:
+        df = synthetic_frame(n_cities, n_months)
+        t0 = time.perf_counter()
+        table = train_many(df)
+        t_batch = time.perf_counter() - t0
+
+        if n_cities > reference_limit:
+            print(f"{n_cities:>8} {t_batch:>15.4f} {'-':>12} {'-':>25}")
+            continue
+        t0 = time.perf_counter()
+        reference = sklearn_per_city(df)
+        t_ref = time.perf_counter() - t0
+        cols = list(reference.columns)
+        diff = ((table[cols] - reference[cols]).abs() / reference[cols].abs().clip(lower=1e-12)).max().max()
+        print(f"{n_cities:>8} {t_batch:>15.4f} {t_ref:>12.2f} {diff:>25.2e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do treino em lote dos modelos por cidade.")
+    parser.add_argument("--cities", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--months", type=int, default=240, help="Meses de histórico por cidade.")
+    parser.add_argument("--reference-limit", type=int, default=10000,
+                        help="Maior número de cidades para o qual o sklearn por cidade também é executado.")
+    args = parser.parse_args()
+    run_benchmark(args.cities, args.months, args.reference_limit)
@@ -0,0 +1,152 @@
+# scripts/benchmark_monthly_data.py
+# Compara a agregação mensal vetorizada de generate_monthly_data (scripts/01_download_data.py)
+# com o loop original dia a dia, conferindo que as linhas geradas são idênticas.
+# Uso: python3 scripts/benchmark_monthly_data.py [--years 1 10 40]
+import argparse
+import importlib.util
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "01_download_data.py")
+
+def load_download_module():
+    """Importa scripts/01_download_data.py (o nome começa com dígito, então não dá para usar import)."""
+    spec = importlib.util.spec_from_file_location("download_data", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def legacy_generate_monthly_data(dl, city_name, temp_data, aneel_data=None):
+    """Versão original (loop em Python), mantida aqui apenas como referência de resultado e de tempo.
+    Única mudança em relação ao original: meses sem dado da ANEEL levam a fonte provisória."""
+    monthly_data = {}
+    
+    if temp_data and "time" in temp_data and "temperature_2m_mean" in temp_data:
+        for i in range(len(temp_data["time"])):
+            date_str = temp_data["time"][i]
+            temp = temp_data["temperature_2m_mean"][i]
+            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+            month_key = date_obj.strftime("%Y-%m")
+            
+            if month_key not in monthly_data:
+                monthly_data[month_key] = {"temps": []}
+            if temp is not None:
+                monthly_data[month_key]["temps"].append(temp)
+    
+    output_rows = []
+    pop_milhoes = dl.get_population_data(city_name)
+    source = "Simulado"
+    
+    if city_name == "Berlim":
+        simulated_consumption = [1500, 1450, 1300, 1100, 950, 800, 850, 900, 1050, 1200, 1350, 1600]
+    elif city_name == "Nova York":
+        simulated_consumption = [6500, 6200, 5800, 5300, 5100, 5400, 6000, 5900, 5500, 5200, 5500, 6300]
+    else:
+        simulated_consumption = None
+    
+    current_date = datetime.strptime(dl.START_DATE, "%Y-%m-%d")
+    end_date_obj = datetime.strptime(dl.END_DATE, "%Y-%m-%d")
+    
+    month_idx = 0
+    while current_date <= end_date_obj:
+        year = current_date.year
+        month = current_date.month
+        month_key = current_date.strftime("%Y-%m")
+        
+        avg_temp = None
+        if month_key in monthly_data and monthly_data[month_key]["temps"]:
+            avg_temp = sum(monthly_data[month_key]["temps"]) / len(monthly_data[month_key]["temps"])
+        
+        if avg_temp is None:
+            if city_name == "Berlim": avg_temp = 10.0
+            elif city_name == "Nova York": avg_temp = 15.0
+            else: avg_temp = 23.0
+            
+        consumo_mes = None
+        if city_name == "Sao Paulo" and aneel_data is not None:
+            source = "Real (ANEEL)"
+            aneel_month_data = aneel_data[(aneel_data['Ano'] == year) & (aneel_data['Mes'] == month)]
+            if not aneel_month_data.empty:
+                consumo_mes = aneel_month_data['CONSUMO_MMWH'].iloc[0] * 1000
+            else:
+                # Mês ainda sem dado da ANEEL: valor simulado, marcado como provisório para ser
+                # substituído quando o dado real for publicado (mesmo rótulo de generate_monthly_data)
+                source = dl.FONTE_CONSUMO_PROVISORIA
+                simulated_consumption_sp = [8000, 7800, 7500, 7000, 6500, 6000, 6200, 6800, 7200, 7400, 7600, 8200]
+                consumo_mes = simulated_consumption_sp[month_idx % 12]
+        else:
+            source = "Simulado"
+            if simulated_consumption:
+                consumo_mes = simulated_consumption[month_idx % 12]
+        
+        if consumo_mes is not None:
+            output_rows.append({
+                "ano": year,
+                "mes": month,
+                "consumo_mwh": consumo_mes,
+                "temp_c": avg_temp,
+                "pop_milhoes": pop_milhoes,
+                "fonte_consumo": source
+            })
+        
+        if current_date.month == 12:
+            current_date = current_date.replace(year=current_date.year + 1, month=1, day=1)
+        else:
+            current_date = current_date.replace(month=current_date.month + 1, day=1)
+        
+        month_idx += 1
+        if current_date.year > int(dl.END_DATE.split('-')[0]):
+            break
+
+    return output_rows
+
+def synthetic_inputs(n_years, seed=42):
+    """Temperaturas diárias (com alguns dias nulos e um mês inteiro sem dados) e consumo mensal da ANEEL."""
+    rng = np.random.default_rng(seed)
+    start_year = 2023 - n_years + 1
+    days = pd.date_range(f"{start_year}-01-01", "2023-12-31", freq="D")
+    temps = np.round(rng.normal(18, 7, len(days)), 1).astype(object)
+    temps[rng.random(len(days)) < 0.02] = None
+    temps[(days.year == start_year) & (days.month == 2)] = None
+    temp_data = {"time": days.strftime("%Y-%m-%d").tolist(), "temperature_2m_mean": temps.tolist()}
+
+    # ANEEL com meses faltando e um mês duplicado (vale o primeiro registro)
+    months = pd.period_range(f"{start_year}-01", "2023-12", freq="M")
+    months = months[rng.random(len(months)) > 0.1]
+    aneel = pd.DataFrame({"Ano": months.year, "Mes": months.month, "CONSUMO_MMWH": rng.uniform(5, 9, len(months))})
+    aneel = pd.concat([aneel, aneel.iloc[[0]].assign(CONSUMO_MMWH=1.0)], ignore_index=True)
+    return f"{start_year}-01-01", temp_data, aneel
+
+def time_call(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def run_benchmark(years_list):
+    dl = load_download_module()
+    print(f"{'anos':>5} {'cidade':>10} {'loop (s)':>10} {'vetorizado (s)':>15} {'ganho':>7} {'idêntico':>9}")
+    for n_years in years_list:
+        start_date, temp_data, aneel = synthetic_inputs(n_years)
+        dl.START_DATE, dl.END_DATE = start_date, "2023-12-31"
+        for city_name, aneel_data in [("Berlim", None), ("Sao Paulo", aneel)]:
+            t_old, old_rows = time_call(lambda: legacy_generate_monthly_data(dl, city_name, temp_data, aneel_data))
+            t_new, new_rows = time_call(lambda: dl.generate_monthly_data(city_name, temp_data, aneel_data))
+            # Compara também os tipos (int x float) que aparecem no JSON gerado
+            identical = old_rows == new_rows and all(
+                type(o[k]) is type(n[k]) or isinstance(o[k], float) and isinstance(n[k], float)
+                for o, n in zip(old_rows, new_rows) for k in o
+            )
+            print(f"{n_years:>5} {city_name:>10} {t_old:>10.4f} {t_new:>15.4f} {t_old / t_new:>6.1f}x {str(identical):>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da agregação mensal de generate_monthly_data.")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 40],
+                        help="Tamanhos do histórico diário (em anos) a comparar.")
+    args = parser.parse_args()
+    run_benchmark(args.years)
@@ -27,6 +27,9 @@ SELECT * FROM energia_cidades LIMIT 5;
 .schema energia_cidades
 
 -- --- Parte 2: Consultas de Análise Exploratória e para Insights (serão usadas nos scripts Python) ---
+-- Observação: os agregados mensais, anuais e por mês do ano abaixo estão materializados nas tabelas
+-- energia_mensal, energia_anual e energia_mes_do_ano (ver src/rollups.py), atualizadas na ingestão.
+-- Ex.: SELECT Cidade, Ano, Consumo_MWh FROM energia_anual ORDER BY Cidade, Ano;
 
 -- 1. Consumo Médio Mensal por Cidade e Mês
 -- Usado para sazonalidade e gráficos comparativos.
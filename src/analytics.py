@@ -1,86 +1,189 @@
 # src/analytics.py
+import os
+import sqlite3
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from statsmodels.tsa.seasonal import seasonal_decompose # Para decomposição STL
+
+from src.data_loader import DB_PATH, calendar_columns
+from src.database import connect_for_write
+from src.dataset import CityDataset, city_frame, cities_frame
+from src.decomposition import MIN_MONTHS, monthly_series, seasonal_decompose_series
+from src.downsampling import DEFAULT_MAX_POINTS, downsample_frame, sample_indices, split_budget, use_webgl
+
+# As funções abaixo aceitam um DataFrame ou um CityDataset (src/dataset.py).
+# Com um CityDataset, o acesso a uma cidade é um fatiamento direto, sem varrer a tabela inteira.
+# Os gráficos recebem no máximo max_points pontos (src/downsampling.py) e usam WebGL acima de WEBGL_THRESHOLD,
+# então o tamanho da figura não cresce com os dados (ex.: séries diárias ou horárias de muitas cidades).
+
+MESES_MAP = {
+    1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
+    7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
+}
+
+# KPIs retornados para uma cidade sem dados
+KPIS_VAZIOS = {
+    "Consumo_Total_Anual": 0,
+    "Consumo_Per_Capita_Anual": 0,
+    "Mes_Pico": "N/A",
+    "Consumo_Pico": 0,
+    "Mes_Vale": "N/A",
+    "Consumo_Vale": 0,
+    "Temperatura_Media_Anual": 0
+}
+
+def _kpis_from_month_sums(sums, cities):
+    """
+    Monta a tabela de KPIs a partir de somas por (Cidade, Mes do ano) com as colunas
+    Consumo, Temp_Soma, Temp_N, Pop_Soma e Pop_N (no máximo 12 linhas por cidade).
+    """
+    result = pd.DataFrame({"Cidade": cities})
+    if sums.empty:
+        for key, value in KPIS_VAZIOS.items():
+            result[key] = value
+        return result
+
+    sums = sums.sort_values(['Cidade', 'Mes'], ignore_index=True)
+    por_cidade = sums.groupby('Cidade', sort=False).agg(
+        Consumo_Total_Anual=('Consumo', 'sum'),
+        Temp_Soma=('Temp_Soma', 'sum'), Temp_N=('Temp_N', 'sum'),
+        Pop_Soma=('Pop_Soma', 'sum'), Pop_N=('Pop_N', 'sum'),
+    )
+    avg_pop = por_cidade['Pop_Soma'] / por_cidade['Pop_N']
+    por_cidade['Consumo_Per_Capita_Anual'] = np.where(
+        avg_pop > 0, (por_cidade['Consumo_Total_Anual'] / (avg_pop * 1_000_000)) * 1000, 0) # kWh/pessoa
+    por_cidade['Temperatura_Media_Anual'] = por_cidade['Temp_Soma'] / por_cidade['Temp_N']
+
+    # Sazonalidade (mês de pico/vale): idxmax/idxmin retornam o primeiro mês em caso de empate
+    pico = sums.loc[sums.groupby('Cidade', sort=False)['Consumo'].idxmax()].set_index('Cidade')
+    vale = sums.loc[sums.groupby('Cidade', sort=False)['Consumo'].idxmin()].set_index('Cidade')
+    por_cidade['Mes_Pico'] = pico['Mes'].map(MESES_MAP)
+    por_cidade['Consumo_Pico'] = pico['Consumo']
+    por_cidade['Mes_Vale'] = vale['Mes'].map(MESES_MAP)
+    por_cidade['Consumo_Vale'] = vale['Consumo']
+
+    result = result.join(por_cidade[list(KPIS_VAZIOS.keys())], on='Cidade')
+    # Cidades sem dados recebem os valores padrão
+    return result.fillna(KPIS_VAZIOS)
+
+def calculate_kpis_batch(df, cities):
+    """
+    Calcula os KPIs de várias cidades em uma única agregação agrupada.
+    Uma passada sobre as linhas gera somas e contagens por (Cidade, mês do ano); total, per capita,
+    pico/vale e temperatura média de cada cidade saem dessa tabela pequena (no máximo 12 linhas por cidade).
+    Retorna uma tabela com uma linha por cidade (na ordem de `cities`) e as mesmas chaves de calculate_kpis.
+    """
+    cities = list(cities)
+    df_sel = cities_frame(df, cities)
+    if df_sel.empty:
+        return _kpis_from_month_sums(pd.DataFrame(), cities)
+
+    _, meses = calendar_columns(df_sel)
+    # Acumula em float64 mesmo quando o DataFrame está no modo compacto (float32)
+    sums = pd.DataFrame({
+        "Cidade": df_sel['Cidade'],
+        "Mes": meses,
+        "Consumo": df_sel['Consumo_MWh'].astype('float64'),
+        "Temperatura": df_sel['Temperatura_C'].astype('float64'),
+        "Populacao": df_sel['Populacao_Milhoes'].astype('float64'),
+    }).groupby(['Cidade', 'Mes'], observed=True).agg(
+        Consumo=('Consumo', 'sum'),
+        Temp_Soma=('Temperatura', 'sum'), Temp_N=('Temperatura', 'count'),
+        Pop_Soma=('Populacao', 'sum'), Pop_N=('Populacao', 'count'),
+    ).reset_index()
+    sums['Cidade'] = sums['Cidade'].astype(object)
+    return _kpis_from_month_sums(sums, cities)
+
+def calculate_kpis_from_rollup(df_mes_do_ano, cities):
+    """
+    Calcula os KPIs de todo o histórico a partir do rollup Cidade x mês do ano
+    (tabela energia_mes_do_ano, ver src/rollups.py), sem ler as linhas brutas.
+    """
+    cities = list(cities)
+    if df_mes_do_ano.empty:
+        return _kpis_from_month_sums(pd.DataFrame(), cities)
+    sums = df_mes_do_ano[df_mes_do_ano['Cidade'].isin(cities)].rename(columns={'Consumo_MWh': 'Consumo'})
+    return _kpis_from_month_sums(sums[['Cidade', 'Mes', 'Consumo', 'Temp_Soma', 'Temp_N', 'Pop_Soma', 'Pop_N']], cities)
 
 def calculate_kpis(df, city):
-    """Calcula KPIs chave para uma cidade específica."""
-    df_city = df[df['Cidade'] == city]
-    
-    if df_city.empty:
-        return {
-            "Consumo_Total_Anual": 0,
-            "Consumo_Per_Capita_Anual": 0,
-            "Mes_Pico": "N/A",
-            "Consumo_Pico": 0,
-            "Mes_Vale": "N/A",
-            "Consumo_Vale": 0,
-            "Temperatura_Media_Anual": 0
-        }
-
-    total_consumo = df_city['Consumo_MWh'].sum()
-    avg_pop = df_city['Populacao_Milhoes'].mean()
-    consumo_per_capita = (total_consumo / (avg_pop * 1_000_000)) * 1000 if avg_pop > 0 else 0 # kWh/pessoa
-
-    # Sazonalidade (mês de pico/vale)
-    monthly_summary = df_city.groupby(df_city['Data'].dt.month)['Consumo_MWh'].sum()
-    mes_pico_num = monthly_summary.idxmax()
-    consumo_pico = monthly_summary.max()
-    mes_vale_num = monthly_summary.idxmin()
-    consumo_vale = monthly_summary.min()
-
-    meses_map = {
-        1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
-        7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
-    }
-
-    avg_temp = df_city['Temperatura_C'].mean()
-
-    return {
-        "Consumo_Total_Anual": total_consumo,
-        "Consumo_Per_Capita_Anual": consumo_per_capita,
-        "Mes_Pico": meses_map.get(mes_pico_num, "N/A"),
-        "Consumo_Pico": consumo_pico,
-        "Mes_Vale": meses_map.get(mes_vale_num, "N/A"),
-        "Consumo_Vale": consumo_vale,
-        "Temperatura_Media_Anual": avg_temp
-    }
-
-def plot_consumption_trend(df, selected_cities):
-    """Cria um gráfico de linha interativo do consumo mensal para cidades selecionadas."""
-    df_plot = df[df['Cidade'].isin(selected_cities)].copy()
+    """Calcula KPIs chave para uma cidade específica (consulta à tabela de calculate_kpis_batch)."""
+    row = calculate_kpis_batch(df, [city]).iloc[0]
+    return {key: row[key] for key in KPIS_VAZIOS}
+
+def plot_consumption_trend(df, selected_cities, max_points=DEFAULT_MAX_POINTS):
+    """
+    Cria um gráfico de linha interativo do consumo mensal para cidades selecionadas.
+    Acima de max_points linhas, cada cidade é reduzida (LTTB) a uma parte do orçamento (split_budget),
+    de modo que o total de pontos do gráfico não passa de max_points.
+    """
+    df_plot = cities_frame(df, selected_cities)
     
     # Garantir que a data é tratada como datetime e usada como índice para Plotly
-    df_plot = df_plot.sort_values(by='Data')
+    # (um CityDataset já entrega cada cidade ordenada por Data)
+    if not isinstance(df, CityDataset):
+        df_plot = df_plot.sort_values(by='Data')
+
+    if len(df_plot) > max_points:
+        groups = [g for _, g in df_plot.groupby('Cidade', observed=True, sort=False)]
+        budgets = split_budget([len(g) for g in groups], max_points)
+        df_plot = pd.concat([downsample_frame(g, 'Data', 'Consumo_MWh', budget) for g, budget in zip(groups, budgets)])
+    webgl = use_webgl(len(df_plot))
 
     fig = px.line(df_plot, x='Data', y='Consumo_MWh', color='Cidade',
                   title='Consumo Mensal de Energia',
                   labels={'Data': 'Data', 'Consumo_MWh': 'Consumo (MWh)'},
-                  line_shape="linear") # ou "spline" para suavizar
+                  line_shape="linear", # ou "spline" para suavizar
+                  render_mode='webgl' if webgl else 'svg')
 
     fig.update_layout(hovermode="x unified", legend_title_text="Cidade")
-    fig.update_traces(mode='lines+markers') # Para mostrar os pontos mensais
+    fig.update_traces(mode='lines' if webgl else 'lines+markers') # Para mostrar os pontos mensais
 
     return fig
 
-def plot_temperature_consumption_scatter(df, city, temp_range=None):
-    """Cria um gráfico de dispersão interativo de Consumo vs. Temperatura."""
-    df_city = df[df['Cidade'] == city].copy()
+def _add_full_data_trendlines(fig, df_full, color_labels):
+    """
+    Linhas de tendência OLS por mês calculadas sobre todas as linhas (e não só sobre a amostra plotada),
+    com a cor e o grupo de legenda do traço de cada mês.
+    """
+    from src.models import train_many # import local: o ajuste em lote só é necessário com amostragem
+
+    table = train_many(df_full.assign(Mes_Nome=color_labels.to_numpy()), city_column='Mes_Nome')
+    x_range = df_full.groupby(color_labels.to_numpy())['Temperatura_C'].agg(['min', 'max'])
+    colors = {trace.name: trace.marker.color for trace in fig.data}
+    for mes, row in table[table['treinado']].iterrows():
+        x = np.array([x_range.loc[mes, 'min'], x_range.loc[mes, 'max']], dtype=np.float64)
+        fig.add_trace(go.Scatter(x=x, y=row.intercepto + row.coeficiente * x, mode='lines', name=mes,
+                                 legendgroup=mes, showlegend=False, line=dict(color=colors.get(mes)),
+                                 hovertemplate=f"OLS {mes}: %{{y:.2f}} MWh (R²={row.r2:.2f})<extra></extra>"))
+
+def plot_temperature_consumption_scatter(df, city, temp_range=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Cria um gráfico de dispersão interativo de Consumo vs. Temperatura.
+    Acima de max_points linhas, plota uma amostra uniforme com WebGL; as linhas de tendência
+    continuam sendo ajustadas sobre todos os dados.
+    """
+    df_city = city_frame(df, city)
 
     if temp_range:
         df_city = df_city[(df_city['Temperatura_C'] >= temp_range[0]) & (df_city['Temperatura_C'] <= temp_range[1])]
 
-    fig = px.scatter(df_city, x='Temperatura_C', y='Consumo_MWh',
-                     color=df_city['Data'].dt.month.map({
-                         1:'Jan', 2:'Fev', 3:'Mar', 4:'Abr', 5:'Mai', 6:'Jun',
-                         7:'Jul', 8:'Ago', 9:'Set', 10:'Out', 11:'Nov', 12:'Dez'
-                     }), # Colorir por mês/estação
+    month_labels = df_city['Data'].dt.month.map(MESES_MAP) # Colorir por mês/estação
+    sampled = len(df_city) > max_points
+    df_plot = df_city
+    if sampled:
+        rows = sample_indices(len(df_city), max_points)
+        df_plot = df_city.iloc[rows]
+
+    fig = px.scatter(df_plot, x='Temperatura_C', y='Consumo_MWh',
+                     color=month_labels.iloc[rows] if sampled else month_labels,
                      title=f'Consumo de Energia vs. Temperatura em {city}',
                      labels={'Temperatura_C': 'Temperatura (°C)', 'Consumo_MWh': 'Consumo (MWh)', 'color': 'Mês'},
-                     trendline="ols", # Adiciona uma linha de regressão OLS (Ordinary Least Squares)
+                     trendline=None if sampled else "ols", # Adiciona uma linha de regressão OLS (Ordinary Least Squares)
+                     render_mode='webgl' if use_webgl(len(df_plot)) else 'svg',
                      hover_data={'Data': '|%Y-%m-%d', 'Consumo_MWh': ':.2f', 'Temperatura_C': ':.2f'})
+    if sampled:
+        _add_full_data_trendlines(fig, df_city, month_labels)
     
     fig.update_layout(hovermode="closest")
     return fig
@@ -90,7 +193,7 @@ def detect_anomalies(df, city, threshold_std=1.5):
     Detecta anomalias no consumo de uma cidade usando o método Z-score.
     Retorna o DataFrame original com uma coluna 'Is_Anomaly' e um DataFrame de anomalias.
     """
-    df_city = df[df['Cidade'] == city].copy()
+    df_city = city_frame(df, city).copy()
 
     if df_city.empty or len(df_city) < 2:
         return df_city.assign(Is_Anomaly=False), pd.DataFrame()
@@ -105,30 +208,278 @@ def detect_anomalies(df, city, threshold_std=1.5):
     df_city['Z_Score'] = (df_city['Consumo_MWh'] - mean_consumo) / std_consumo
     df_city['Is_Anomaly'] = np.abs(df_city['Z_Score']) > threshold_std
 
-    anomalies_df = df_city[df_city['Is_Anomaly']].copy()
-    anomalies_df['Tipo_Anomalia'] = np.where(anomalies_df['Z_Score'] > threshold_std, 'Alto', 'Baixo')
+    anomalies_df = df_city[df_city['Is_Anomaly']]
+    anomalies_df = anomalies_df.assign(Tipo_Anomalia=np.where(anomalies_df['Z_Score'] > threshold_std, 'Alto', 'Baixo'))
     anomalies_df = anomalies_df[['Data', 'Consumo_MWh', 'Temperatura_C', 'Tipo_Anomalia', 'Z_Score']]
 
     return df_city, anomalies_df
 
-def plot_consumption_with_anomalies(df, city, anomalies_df):
-    """Cria um gráfico de linha com anomalias marcadas."""
-    df_city = df[df['Cidade'] == city].copy()
+# Referências (baselines) aceitas por detect_anomalies_batch
+BASELINE_GLOBAL = "global" # média/desvio de todo o histórico da cidade (como detect_anomalies)
+BASELINE_MOVEL = "movel" # média/desvio dos `window` meses anteriores ao ponto
+BASELINE_SAZONAL = "sazonal" # média/desvio do mesmo mês do ano na cidade (todos os anos)
+BASELINES = (BASELINE_GLOBAL, BASELINE_MOVEL, BASELINE_SAZONAL)
+
+ANOMALY_COLUMNS = ['Cidade', 'Data', 'Referencia', 'Consumo_MWh', 'Z_Score', 'Tipo_Anomalia']
+
+def _group_mean_std(groups, y, valid, n_groups):
+    """Média e desvio padrão amostral (ddof=1, como o pandas) de y por grupo, ignorando as posições inválidas."""
+    w = valid.astype(np.float64)
+    y0 = np.where(valid, y, 0.0)
+    n = np.bincount(groups, weights=w, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(groups, weights=y0, minlength=n_groups) / n
+        dev = np.where(valid, y - mean[groups], 0.0)
+        std = np.sqrt(np.bincount(groups, weights=dev * dev, minlength=n_groups) / (n - 1))
+    return mean, np.where(n >= 2, std, np.nan)
+
+def _rolling_mean_std(codes, y, valid, window, min_periods):
+    """
+    Média e desvio (ddof=1) dos `window` pontos anteriores de cada linha, dentro da mesma cidade
+    (linhas ordenadas por cidade e data). O próprio ponto fica fora da janela, para que uma anomalia
+    não infle a referência com que é comparada. Usa somas acumuladas: O(n) para todas as cidades.
+    """
+    size = len(y)
+    positions = np.arange(size)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, size]))
+    lo = np.maximum(group_start, positions - window)
+
+    # Centraliza pela média da cidade antes de acumular (evita cancelamento em Σy² - (Σy)²/n)
+    w = valid.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        city_mean = (np.bincount(codes, weights=np.where(valid, y, 0.0))
+                     / np.bincount(codes, weights=w))[codes]
+    d = np.where(valid, y - city_mean, 0.0)
+    cum_n, cum_d, cum_dd = (np.r_[0.0, np.cumsum(v)] for v in (w, d, d * d))
+    n = cum_n[positions] - cum_n[lo]
+    s = cum_d[positions] - cum_d[lo]
+    ss = cum_dd[positions] - cum_dd[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_d = s / n
+        std = np.sqrt(np.maximum(ss - s * mean_d, 0.0) / (n - 1))
+    enough = n >= max(min_periods, 2)
+    return np.where(enough, city_mean + mean_d, np.nan), np.where(enough, std, np.nan)
+
+def detect_anomalies_batch(df, cities=None, threshold_std=1.5, baseline=BASELINE_GLOBAL, window=12, min_periods=None):
+    """
+    Detecta anomalias de consumo de todas as cidades (ou das cidades em `cities`) em uma única passada agrupada.
+    - baseline="global": Z-score sobre a média e o desvio de todo o histórico da cidade (o mesmo de detect_anomalies);
+    - baseline="movel": Z-score sobre os `window` meses anteriores (exige min_periods pontos, padrão = window);
+    - baseline="sazonal": Z-score sobre o mesmo mês do ano da cidade (exige ao menos 2 anos daquele mês).
+    Retorna uma tabela compacta com ANOMALY_COLUMNS, apenas com as linhas anômalas (|Z| > threshold_std).
+    """
+    if baseline not in BASELINES:
+        raise ValueError(f"Referência inválida: {baseline}. Use uma de: {', '.join(BASELINES)}.")
+    df_sel = df.df if isinstance(df, CityDataset) else df
+    if cities is not None:
+        df_sel = cities_frame(df, cities)
+    df_sel = df_sel[df_sel['Cidade'].notna()]
+    if df_sel.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    codes, uniques = pd.factorize(df_sel['Cidade'], sort=True)
+    datas = df_sel['Data'].to_numpy()
+    # Ordem (Cidade, Data); um CityDataset já está ordenado e o lexsort só é feito quando necessário
+    if not CityDataset._is_sorted(codes, datas):
+        order = np.lexsort((datas, codes))
+        df_sel, codes, datas = df_sel.iloc[order], codes[order], datas[order]
+    y = df_sel['Consumo_MWh'].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(y)
+
+    if baseline == BASELINE_GLOBAL:
+        mean, std = _group_mean_std(codes, y, valid, len(uniques))
+        mean, std = mean[codes], std[codes]
+    elif baseline == BASELINE_SAZONAL:
+        _, meses = calendar_columns(df_sel)
+        groups = codes * 12 + (meses.to_numpy().astype(np.int64) - 1)
+        mean, std = _group_mean_std(groups, y, valid, len(uniques) * 12)
+        mean, std = mean[groups], std[groups]
+    else:
+        mean, std = _rolling_mean_std(codes, y, valid, window, window if min_periods is None else min_periods)
+
+    # Desvio nulo (série constante) ou referência insuficiente: o ponto não é avaliado
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(std > 0, (y - mean) / std, np.nan)
+    is_anomaly = np.abs(z) > threshold_std # NaN -> False
+
+    z = z[is_anomaly]
+    return pd.DataFrame({
+        'Cidade': np.asarray(uniques, dtype=object)[codes[is_anomaly]],
+        'Data': datas[is_anomaly],
+        'Referencia': baseline,
+        'Consumo_MWh': y[is_anomaly],
+        'Z_Score': z,
+        'Tipo_Anomalia': np.where(z > threshold_std, 'Alto', 'Baixo'),
+    }, columns=ANOMALY_COLUMNS)
+
+STREAM_STATE_TABLE = "anomalias_estado"
+MODO_WELFORD = "welford" # média/variância de todo o histórico (momentos de Welford)
+MODO_EWM = "ewm" # média/variância com pesos exponenciais (esquece o passado aos poucos)
+
+class StreamingAnomalyDetector:
+    """
+    Versão incremental de detect_anomalies para dados que chegam aos poucos.
+    Por cidade guarda apenas (n, média, M2, último instante): cada novo ponto é avaliado e incorporado
+    em O(1), sem recalcular média/desvio sobre o histórico, e a memória não cresce com a série.
+
+    - modo "welford": momentos de todo o histórico (desvio amostral, ddof=1, como detect_anomalies);
+    - modo "ewm": momentos com pesos exponenciais (alpha), que acompanham mudanças de nível.
+
+    O ponto é comparado com os momentos *anteriores* a ele e só depois entra no estado.
+    Pontos com instante (data e hora) igual ou anterior ao último visto da cidade são ignorados, então
+    reprocessar o mesmo lote não altera o estado; vários pontos no mesmo dia (ex.: dados horários) são todos
+    avaliados. save_state / load_state persistem o estado entre execuções.
+    """
+    def __init__(self, threshold_std=1.5, mode=MODO_WELFORD, alpha=0.1, min_periods=12):
+        if mode not in (MODO_WELFORD, MODO_EWM):
+            raise ValueError(f"Modo inválido: {mode}. Use '{MODO_WELFORD}' ou '{MODO_EWM}'.")
+        self.threshold_std = threshold_std
+        self.mode = mode
+        self.alpha = alpha
+        self.min_periods = max(min_periods, 2)
+        self.state = {} # cidade -> [n, média, M2 (ou variância no modo ewm), último instante em ns desde a época]
+
+    def score(self, city, value):
+        """Z-score de um valor em relação ao estado atual da cidade (None se ainda não há histórico suficiente)."""
+        moments = self.state.get(city)
+        if moments is None or moments[0] < self.min_periods:
+            return None
+        n, mean, m2 = moments[0], moments[1], moments[2]
+        var = m2 / (n - 1) if self.mode == MODO_WELFORD else m2
+        if var <= 0:
+            return None
+        return (value - mean) / np.sqrt(var)
+
+    def _update(self, moments, value):
+        n, mean, m2 = moments[0] + 1, moments[1], moments[2]
+        delta = value - mean
+        if self.mode == MODO_WELFORD:
+            mean += delta / n
+            m2 += delta * (value - mean)
+        elif n == 1:
+            mean, m2 = value, 0.0
+        else:
+            incr = self.alpha * delta
+            mean += incr
+            m2 = (1 - self.alpha) * (m2 + delta * incr)
+        moments[0], moments[1], moments[2] = n, mean, m2
+
+    def update(self, city, date, value):
+        """
+        Avalia e incorpora um ponto. Retorna (Z-score, Tipo_Anomalia) se o ponto é anômalo,
+        (Z-score, None) se é normal, ou None se foi ignorado (instante já visto, valor ausente ou histórico insuficiente).
+        """
+        instant = pd.Timestamp(date).value # comparação com hora completa, não só pelo dia
+        moments = self.state.setdefault(city, [0, 0.0, 0.0, None])
+        if (moments[3] is not None and instant <= moments[3]) or value is None or np.isnan(value):
+            return None
+        z = self.score(city, value)
+        self._update(moments, float(value))
+        moments[3] = instant
+        if z is None:
+            return None
+        if abs(z) > self.threshold_std:
+            return z, 'Alto' if z > self.threshold_std else 'Baixo'
+        return z, None
+
+    def update_many(self, df):
+        """
+        Processa um lote de linhas (Cidade, Data, Consumo_MWh) em ordem de data e
+        retorna as anomalias encontradas, com as colunas de detect_anomalies mais Cidade.
+        """
+        columns = ['Cidade', 'Data', 'Consumo_MWh', 'Tipo_Anomalia', 'Z_Score']
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        df = df[df['Cidade'].notna()].sort_values(['Data', 'Cidade'], kind='stable')
+        rows = []
+        for city, data, value in zip(df['Cidade'].astype(object), df['Data'], df['Consumo_MWh'].astype('float64')):
+            result = self.update(city, data, value)
+            if result is not None and result[1] is not None:
+                rows.append((city, data, value, result[1], result[0]))
+        return pd.DataFrame(rows, columns=columns)
+
+    def save_state(self, db_path=DB_PATH):
+        """
+        Grava o estado de todas as cidades na tabela anomalias_estado (uma transação).
+        Ultima_Data guarda o último instante em ISO 8601 com a hora (ex.: '2020-01-01T13:00:00').
+        """
+        conn = connect_for_write(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {STREAM_STATE_TABLE} (
+                    Cidade TEXT NOT NULL,
+                    Modo TEXT NOT NULL,
+                    N INTEGER,
+                    Media REAL,
+                    M2 REAL,
+                    Ultima_Data TEXT,
+                    Atualizado_Em TEXT,
+                    PRIMARY KEY (Cidade, Modo)
+                )
+            """)
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO {STREAM_STATE_TABLE} (Cidade, Modo, N, Media, M2, Ultima_Data, Atualizado_Em)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+            """, [(city, self.mode, int(moments[0]), moments[1], moments[2], pd.Timestamp(moments[3]).isoformat())
+                  for city, moments in self.state.items() if moments[3] is not None])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def load_state(self, db_path=DB_PATH):
+        """
+        Carrega o estado salvo para o modo deste detector. Retorna o número de cidades carregadas.
+        Estados gravados por versões antigas, só com a data ('YYYY-MM-DD'), valem como meia-noite desse dia.
+        """
+        if not os.path.exists(db_path):
+            return 0
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(f"""
+                SELECT Cidade, N, Media, M2, Ultima_Data FROM {STREAM_STATE_TABLE} WHERE Modo = ?
+            """, (self.mode,)).fetchall()
+        except sqlite3.OperationalError:
+            return 0 # Tabela ainda não criada: começa do zero
+        finally:
+            conn.close()
+        for city, n, mean, m2, last in rows:
+            self.state[city] = [n, mean, m2, pd.Timestamp(last).value if last is not None else None]
+        return len(rows)
+
+def plot_consumption_with_anomalies(df, city, anomalies_df, max_points=DEFAULT_MAX_POINTS):
+    """
+    Cria um gráfico de linha com anomalias marcadas.
+    Acima de max_points linhas, a série é reduzida com LTTB; os pontos anômalos são sempre mantidos.
+    """
+    df_city = city_frame(df, city)
+    if len(df_city) > max_points:
+        if not isinstance(df, CityDataset):
+            df_city = df_city.sort_values(by='Data')
+        keep = df_city['Data'].isin(anomalies_df['Data']).to_numpy() if not anomalies_df.empty else None
+        df_city = downsample_frame(df_city, 'Data', 'Consumo_MWh', max_points, keep=keep)
 
     fig = px.line(df_city, x='Data', y='Consumo_MWh',
                   title=f'Consumo Mensal de Energia com Anomalias - {city}',
-                  labels={'Data': 'Data', 'Consumo_MWh': 'Consumo (MWh)'})
+                  labels={'Data': 'Data', 'Consumo_MWh': 'Consumo (MWh)'},
+                  render_mode='webgl' if use_webgl(len(df_city)) else 'svg')
     
     if not anomalies_df.empty:
-        fig.add_trace(go.Scatter(
+        scatter = go.Scattergl if use_webgl(len(anomalies_df)) else go.Scatter
+        fig.add_trace(scatter(
             x=anomalies_df['Data'],
             y=anomalies_df['Consumo_MWh'],
             mode='markers',
             name='Anomalia',
             marker=dict(color='red', size=10, symbol='circle'),
             hoverinfo='text',
-            text=[f"Anomalia {row['Tipo_Anomalia']}: {row['Consumo_MWh']:.2f} MWh ({row['Z_Score']:.2f} Z-Score)" 
-                  for idx, row in anomalies_df.iterrows()]
+            text=[f"Anomalia {tipo}: {consumo:.2f} MWh ({z:.2f} Z-Score)"
+                  for tipo, consumo, z in zip(anomalies_df['Tipo_Anomalia'], anomalies_df['Consumo_MWh'], anomalies_df['Z_Score'])]
         ))
     
     fig.update_layout(hovermode="x unified")
@@ -136,7 +487,9 @@ def plot_consumption_with_anomalies(df, city, anomalies_df):
 
 def plot_seasonal_comparison_by_year(df, city):
     """Cria um gráfico de linha de sazonalidade por ano (requer múltiplos anos de dados)."""
-    df_city = df[df['Cidade'] == city].copy()
+    df_city = city_frame(df, city).copy()
+    # Ano pode não estar materializado (modo compacto do load_data)
+    df_city['Ano'], _ = calendar_columns(df_city)
     
     if df_city['Ano'].nunique() < 2:
         return None, "Não há dados suficientes (múltiplos anos) para esta análise de sazonalidade por ano."
@@ -155,27 +508,29 @@ def plot_seasonal_comparison_by_year(df, city):
     
     return fig, None
 
-def plot_time_series_decomposition(df, city):
-    """Realiza e plota a decomposição de série temporal (tendência, sazonalidade, resíduos)."""
-    df_city = df[df['Cidade'] == city].set_index('Data').sort_index()
-    if df_city.empty or len(df_city) < 24: # Pelo menos 2 anos para sazonalidade anual
-        return None, "Dados insuficientes para decomposição de série temporal (mínimo de 24 meses recomendado)."
-
-    # Assegura que a frequência é mensal
-    df_city = df_city['Consumo_MWh'].asfreq('MS') 
-    
-    # Preenche NaNs se houver lacunas (necessário para decomposição)
-    df_city = df_city.fillna(df_city.mean())
+def plot_time_series_decomposition(df, city, decomposition=None):
+    """
+    Realiza e plota a decomposição de série temporal (tendência, sazonalidade, resíduos).
+    decomposition (opcional): componentes já calculados (ex.: lidos de src/decomposition_store.py);
+    nesse caso o gráfico apenas os renderiza, sem decompor de novo.
+    """
+    if decomposition is None:
+        df_city = city_frame(df, city)
+        if df_city.empty or len(df_city) < MIN_MONTHS: # Pelo menos 2 anos para sazonalidade anual
+            return None, "Dados insuficientes para decomposição de série temporal (mínimo de 24 meses recomendado)."
 
     try:
-        # Usa um modelo aditivo (tendência + sazonalidade + resíduos)
-        # Period = 12 para sazonalidade anual (12 meses)
-        decomposition = seasonal_decompose(df_city, model='additive', period=12, extrapolate_trend='freq')
+        if decomposition is None:
+            # Série mensal com as lacunas preenchidas pela média (necessário para decomposição).
+            # Modelo aditivo (tendência + sazonalidade + resíduos), período 12 para sazonalidade anual,
+            # com a decomposição vetorizada de src/decomposition.py (equivalente ao seasonal_decompose do statsmodels)
+            decomposition = seasonal_decompose_series(monthly_series(df_city), period=12, extrapolate_trend='period')
+        observed = decomposition.observed
 
         fig = go.Figure()
 
         # Componente Original
-        fig.add_trace(go.Scatter(x=df_city.index, y=df_city, mode='lines', name='Original',
+        fig.add_trace(go.Scatter(x=observed.index, y=observed, mode='lines', name='Original',
                                  line=dict(color='blue')))
         # Componente de Tendência
         fig.add_trace(go.Scatter(x=decomposition.trend.index, y=decomposition.trend, mode='lines', name='Tendência',
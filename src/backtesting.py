@@ -0,0 +1,183 @@
+# src/backtesting.py
+# Avaliação fora da amostra dos modelos de src/models.py por origem móvel (rolling origin) com janela expansiva:
+# para cada origem, o modelo é ajustado com todos os meses anteriores e avaliado nos `horizon` meses seguintes.
+# As estatísticas suficientes da janela de treino são reaproveitadas de uma origem para a próxima
+# (somas acumuladas: só os meses novos entram), em vez de reajustar do zero a cada origem.
+# As cidades são distribuídas em um pool de processos; os resultados vão para a tabela backtests.
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from src.data_loader import DB_PATH
+from src.database import connect_for_write
+from src.models import FEATURE_COLUMN, MIN_TRAIN_ROWS, TARGET_COLUMN, _coefficients
+
+BACKTEST_TABLE = "backtests"
+DEFAULT_MIN_TRAIN = 24 # meses na primeira janela de treino
+DEFAULT_HORIZON = 1 # meses avaliados após cada origem
+DEFAULT_STEP = 1 # meses entre origens consecutivas
+
+RESULT_COLUMNS = ["Cidade", "Origem", "Horizonte", "N_Treino", "N_Teste", "MAE", "RMSE", "Vies", "MAPE",
+                  "Coeficiente", "Intercepto"]
+
+def create_backtest_table(conn):
+    """Cria a tabela de resultados do backtesting (se ainda não existir)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {BACKTEST_TABLE} (
+            Cidade TEXT NOT NULL,
+            Origem TEXT NOT NULL,
+            Horizonte INTEGER NOT NULL,
+            N_Treino INTEGER,
+            N_Teste INTEGER,
+            MAE REAL,
+            RMSE REAL,
+            Vies REAL,
+            MAPE REAL,
+            Coeficiente REAL,
+            Intercepto REAL,
+            Executado_Em TEXT,
+            PRIMARY KEY (Cidade, Origem, Horizonte)
+        )
+    """)
+
+def backtest_city(city, x, y, dates, min_train=DEFAULT_MIN_TRAIN, horizon=DEFAULT_HORIZON, step=DEFAULT_STEP):
+    """
+    Backtest de uma cidade (linhas em ordem de data). Retorna uma lista de tuplas no formato de RESULT_COLUMNS,
+    uma por origem: a origem é a data do primeiro mês avaliado.
+
+    As estatísticas de todas as janelas de treino saem de somas acumuladas: a janela de cada origem
+    reaproveita a anterior e só acrescenta os meses novos, e todas as origens são avaliadas de uma vez.
+    As somas são feitas sobre os desvios em relação às médias da primeira janela, o que evita o
+    cancelamento numérico de Σx² - (Σx)²/n.
+    """
+    n = len(x)
+    min_train = max(min_train, MIN_TRAIN_ROWS)
+    if n <= min_train:
+        return []
+
+    shift_x, shift_y = x[:min_train].mean(), y[:min_train].mean()
+    dx, dy = x - shift_x, y - shift_y
+    sum_x, sum_y = np.cumsum(dx), np.cumsum(dy)
+    sum_xx, sum_xy = np.cumsum(dx * dx), np.cumsum(dx * dy)
+
+    # Janela expansiva: a origem o treina com as linhas [0, o)
+    origins = np.arange(min_train, n, step)
+    last = origins - 1
+    n_train = origins.astype(np.float64)
+    mean_dx, mean_dy = sum_x[last] / n_train, sum_y[last] / n_train
+    sxx = np.maximum(sum_xx[last] - sum_x[last] * mean_dx, 0.0)
+    sxy = sum_xy[last] - sum_x[last] * mean_dy
+    coef, intercept = _coefficients(shift_x + mean_dx, shift_y + mean_dy, sxx, sxy)
+
+    # Meses avaliados de cada origem (matriz origens x horizonte, mascarada no fim da série)
+    test_idx = origins[:, None] + np.arange(horizon)[None, :]
+    valid = test_idx < n
+    test_idx = np.minimum(test_idx, n - 1)
+    x_test, y_test = x[test_idx], y[test_idx]
+    err = np.where(valid, y_test - (intercept[:, None] + coef[:, None] * x_test), 0.0)
+    n_test = valid.sum(axis=1)
+    mae = np.abs(err).sum(axis=1) / n_test
+    rmse = np.sqrt((err * err).sum(axis=1) / n_test)
+    bias = err.sum(axis=1) / n_test
+    nonzero = valid & (y_test != 0)
+    n_nonzero = nonzero.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ape = np.where(nonzero, np.abs(err / np.where(nonzero, y_test, 1.0)), 0.0)
+        mape = ape.sum(axis=1) / n_nonzero
+
+    return [
+        (city, dates[o], horizon, o, nt, m, r, b, (None if nz == 0 else p), c, i)
+        for o, nt, m, r, b, nz, p, c, i in zip(origins.tolist(), n_test.tolist(), mae.tolist(), rmse.tolist(),
+                                               bias.tolist(), n_nonzero.tolist(), mape.tolist(), coef.tolist(),
+                                               intercept.tolist())
+    ]
+
+def _backtest_chunk(task):
+    """Executado nos processos do pool: backtest de um lote de cidades."""
+    cities, min_train, horizon, step = task
+    rows = []
+    for city, x, y, dates in cities:
+        rows.extend(backtest_city(city, x, y, dates, min_train=min_train, horizon=horizon, step=step))
+    return rows
+
+def _city_arrays(df):
+    """(cidade, x, y, datas 'YYYY-MM-DD') de cada cidade, em ordem de data e sem linhas com valores ausentes."""
+    df = df.dropna(subset=['Cidade', 'Data', FEATURE_COLUMN, TARGET_COLUMN]).sort_values(['Cidade', 'Data'])
+    datas = pd.to_datetime(df['Data']).dt.strftime('%Y-%m-%d').to_numpy()
+    x = df[FEATURE_COLUMN].to_numpy(dtype=np.float64)
+    y = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    codes, cities = pd.factorize(df['Cidade'], sort=True)
+    bounds = np.searchsorted(codes, np.arange(len(cities) + 1))
+    return [
+        (city, x[bounds[i]:bounds[i + 1]], y[bounds[i]:bounds[i + 1]], datas[bounds[i]:bounds[i + 1]])
+        for i, city in enumerate(np.asarray(cities).tolist())
+    ]
+
+def run_backtests(df, min_train=DEFAULT_MIN_TRAIN, horizon=DEFAULT_HORIZON, step=DEFAULT_STEP, workers=None):
+    """
+    Backtest de origem móvel de todas as cidades do DataFrame (colunas Cidade, Data, Temperatura_C, Consumo_MWh).
+    As cidades são divididas em lotes e processadas em um pool de `workers` processos (padrão: número de CPUs;
+    1 = no próprio processo). Retorna um DataFrame com RESULT_COLUMNS.
+    """
+    cities = _city_arrays(df)
+    if not cities:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    workers = workers or os.cpu_count() or 1
+    # Alguns lotes por processo equilibram cidades com históricos de tamanhos diferentes
+    n_chunks = min(len(cities), workers * 4)
+    tasks = [(cities[i::n_chunks], min_train, horizon, step) for i in range(n_chunks)]
+
+    if workers == 1:
+        chunks = map(_backtest_chunk, tasks)
+        rows = [row for chunk in chunks for row in chunk]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = [row for chunk in executor.map(_backtest_chunk, tasks) for row in chunk]
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS).sort_values(['Cidade', 'Origem'], ignore_index=True)
+
+def summarize_backtests(results):
+    """
+    Resumo por cidade: número de origens, MAE médio (ponderado pelos meses avaliados),
+    RMSE agregado de todos os erros e viés médio.
+    """
+    if results.empty:
+        return pd.DataFrame(columns=["Cidade", "Janelas", "MAE", "RMSE", "Vies"]).set_index("Cidade")
+    weighted = results.assign(
+        _abs=results["MAE"] * results["N_Teste"],
+        _sq=results["RMSE"] ** 2 * results["N_Teste"],
+        _bias=results["Vies"] * results["N_Teste"],
+    )
+    grouped = weighted.groupby("Cidade")
+    n_test = grouped["N_Teste"].sum()
+    return pd.DataFrame({
+        "Janelas": grouped.size(),
+        "MAE": grouped["_abs"].sum() / n_test,
+        "RMSE": np.sqrt(grouped["_sq"].sum() / n_test),
+        "Vies": grouped["_bias"].sum() / n_test,
+    })
+
+def save_backtests(results, db_path=DB_PATH):
+    """
+    Grava os resultados na tabela backtests em uma única transação. Os resultados anteriores
+    das mesmas (cidade, horizonte) são substituídos. Retorna o número de linhas gravadas.
+    """
+    conn = connect_for_write(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_backtest_table(conn)
+        keys = results[["Cidade", "Horizonte"]].drop_duplicates().itertuples(index=False, name=None)
+        conn.executemany(f"DELETE FROM {BACKTEST_TABLE} WHERE Cidade = ? AND Horizonte = ?",
+                         [(city, int(h)) for city, h in keys])
+        conn.executemany(f"""
+            INSERT INTO {BACKTEST_TABLE} ({", ".join(RESULT_COLUMNS)}, Executado_Em)
+            VALUES ({", ".join("?" * len(RESULT_COLUMNS))}, datetime('now'))
+        """, results[RESULT_COLUMNS].astype(object).where(results[RESULT_COLUMNS].notna(), None).itertuples(index=False, name=None))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return len(results)
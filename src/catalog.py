@@ -0,0 +1,63 @@
+# src/catalog.py
+# Catálogo de cidades acompanhadas pela coleta (scripts/01_download_data.py), lido de config/cidades.csv.
+# Cada linha traz coordenadas, população, fonte do consumo e o perfil simulado usado quando não há dado real:
+# - fonte_consumo: "ANEEL" (consumo real do município municipio_aneel) ou "Simulado";
+# - temperatura_padrao: temperatura usada nos meses sem dados diários;
+# - consumo_simulado: 12 valores (Jan..Dez) separados por ';'. Para cidades ANEEL, é o perfil
+#   usado nos meses ainda não publicados pela ANEEL.
+import csv
+
+CATALOG_PATH = "config/cidades.csv"
+FONTE_ANEEL = "ANEEL"
+FONTE_SIMULADA = "Simulado"
+
+def _parse_number(text):
+    """Converte um campo numérico do CSV mantendo inteiros como int (eles vão assim para o JSON bruto)."""
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def _parse_profile(text):
+    """Perfil mensal 'v1;v2;...;v12' -> lista com 12 números (ou None se vazio)."""
+    if not text or not text.strip():
+        return None
+    values = [_parse_number(v) for v in text.split(";")]
+    if len(values) != 12 or any(v is None for v in values):
+        raise ValueError(f"consumo_simulado deve ter 12 valores, recebeu '{text}'")
+    return values
+
+def load_city_catalog(path=CATALOG_PATH):
+    """
+    Lê o catálogo de cidades como {cidade: {latitude, longitude, populacao_milhoes, fonte_consumo,
+    municipio_aneel, temperatura_padrao, consumo_simulado}}, na ordem do arquivo.
+    Linhas inválidas são reportadas e ignoradas; um arquivo ausente resulta em catálogo vazio.
+    """
+    catalog = {}
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    cidade = (row.get("cidade") or "").strip()
+                    if not cidade:
+                        raise ValueError("linha sem cidade")
+                    fonte = (row.get("fonte_consumo") or "").strip() or FONTE_SIMULADA
+                    if fonte not in (FONTE_ANEEL, FONTE_SIMULADA):
+                        raise ValueError(f"fonte_consumo desconhecida: '{fonte}'")
+                    catalog[cidade] = {
+                        "latitude": float(row["latitude"]),
+                        "longitude": float(row["longitude"]),
+                        "populacao_milhoes": _parse_number(row.get("populacao_milhoes") or ""),
+                        "fonte_consumo": fonte,
+                        "municipio_aneel": (row.get("municipio_aneel") or "").strip() or None,
+                        "temperatura_padrao": _parse_number(row.get("temperatura_padrao") or ""),
+                        "consumo_simulado": _parse_profile(row.get("consumo_simulado")),
+                    }
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Linha {line_number} inválida no catálogo '{path}': {e}. Pulando.")
+    except FileNotFoundError:
+        print(f"Erro: Catálogo de cidades não encontrado em '{path}'.")
+    return catalog
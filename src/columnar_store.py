@@ -0,0 +1,156 @@
+# src/columnar_store.py
+# Camada de armazenamento colunar (Parquet) gerada a partir do energia_cidades.db.
+# O SQLite continua sendo a fonte de verdade; os arquivos Parquet são uma cópia
+# particionada por Cidade e Ano, lida com poda de partições e filtros por row group.
+# Atende as leituras de linhas brutas (load_data com granularity=None, ex.: scripts/benchmark_load.py);
+# o dashboard lê os rollups mensais do SQLite e não usa esta cópia.
+import os
+import sqlite3
+import shutil
+import pandas as pd
+
+from src.database import read_data_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    PYARROW_AVAILABLE = True
+except ImportError: # pyarrow é opcional: sem ele, load_data usa apenas o SQLite
+    PYARROW_AVAILABLE = False
+
+PARQUET_DIR = "data/processed/parquet"
+# Arquivo marcador gravado ao final de uma exportação completa, com a versão dos dados exportada
+EXPORT_MARKER = "_EXPORT_OK"
+
+# Tamanho dos lotes lidos do SQLite durante a exportação (limita o pico de memória)
+EXPORT_CHUNK_ROWS = 500_000
+# Linhas por row group: define a granularidade da poda por estatísticas min/max de Data
+ROW_GROUP_ROWS = 64_000
+
+def _schema():
+    return pa.schema([
+        ("Cidade", pa.string()),
+        ("Data", pa.timestamp("ns")),
+        ("Consumo_MWh", pa.float64()),
+        ("Temperatura_C", pa.float64()),
+        ("Populacao_Milhoes", pa.float64()),
+        ("Fonte_Consumo", pa.string()),
+        ("Ano", pa.int16()),
+    ])
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("Cidade", pa.string()), ("Ano", pa.int16())]), flavor="hive")
+
+def _read_db_version(db_path):
+    """Versão dos dados do banco (database.read_data_version) lida por uma conexão somente leitura."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return read_data_version(conn)
+    finally:
+        conn.close()
+
+def is_store_current(db_path, parquet_dir=PARQUET_DIR):
+    """
+    Indica se existe uma exportação Parquet completa da versão atual dos dados de energia_cidades.
+    A comparação usa a versão gravada pela ingestão (tabela energia_versao), não a data de modificação
+    do arquivo: escritas em outras tabelas (registro de modelos, decomposições) não invalidam a cópia.
+    """
+    marker = os.path.join(parquet_dir, EXPORT_MARKER)
+    if not PYARROW_AVAILABLE or not os.path.exists(marker):
+        return False
+    if not os.path.exists(db_path):
+        return True
+    try:
+        version = _read_db_version(db_path)
+    except sqlite3.Error:
+        return False
+    if version is None:
+        # Banco anterior à versão dos dados: não há como saber se a cópia está atualizada
+        return False
+    with open(marker, "r", encoding="utf-8") as f:
+        return f.read().strip() == str(version)
+
+def export_parquet(db_path, parquet_dir=PARQUET_DIR, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Exporta a tabela energia_cidades para Parquet particionado por Cidade e Ano.
+    A leitura do SQLite é feita em lotes ordenados por (Cidade, Data), de forma que
+    cada arquivo fica ordenado por data e as estatísticas dos row groups permitem filtrar períodos.
+    A versão dos dados e as linhas são lidas na mesma transação de leitura, então o marcador
+    registra exatamente a versão exportada mesmo que uma carga aconteça durante a exportação.
+    Retorna o número de linhas exportadas.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow não está instalado; a exportação Parquet não está disponível.")
+
+    # Escreve em um diretório temporário e troca no final para nunca expor uma exportação parcial
+    tmp_dir = parquet_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    schema = _schema()
+    total_rows = 0
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        version = read_data_version(conn)
+        query = ("SELECT Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo "
+                 "FROM energia_cidades ORDER BY Cidade, Data")
+        for i, chunk in enumerate(pd.read_sql_query(query, conn, chunksize=chunk_rows)):
+            chunk['Data'] = pd.to_datetime(chunk['Data'])
+            chunk['Ano'] = chunk['Data'].dt.year.astype('int16')
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            ds.write_dataset(
+                table, tmp_dir, format="parquet",
+                partitioning=_partitioning(),
+                basename_template=f"part-{i:05d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                max_rows_per_group=ROW_GROUP_ROWS,
+                min_rows_per_group=min(ROW_GROUP_ROWS, len(chunk)),
+            )
+            total_rows += len(chunk)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    with open(os.path.join(tmp_dir, EXPORT_MARKER), "w", encoding="utf-8") as f:
+        f.write("" if version is None else str(version))
+    shutil.rmtree(parquet_dir, ignore_errors=True)
+    os.replace(tmp_dir, parquet_dir)
+    return total_rows
+
+def read_parquet(parquet_dir=PARQUET_DIR, cities=None, start=None, end=None, columns=None):
+    """
+    Lê o armazenamento Parquet aplicando os filtros durante a varredura:
+    cidade e ano podam partições inteiras; o período filtra row groups pelas estatísticas de Data.
+    Retorna um DataFrame com as mesmas colunas da tabela energia_cidades (Data já como datetime64).
+    """
+    dataset = ds.dataset(parquet_dir, format="parquet", partitioning=_partitioning())
+
+    def _ts(value):
+        return pa.scalar(pd.Timestamp(value).to_pydatetime(), type=pa.timestamp("ns"))
+
+    def _and(current, new):
+        return new if current is None else current & new
+
+    expr = None
+    if cities is not None:
+        expr = _and(expr, ds.field("Cidade").isin(list(cities)))
+    if start is not None:
+        start_ts = pd.Timestamp(start)
+        expr = _and(expr, ds.field("Ano") >= start_ts.year)
+        expr = _and(expr, ds.field("Data") >= _ts(start_ts))
+    if end is not None:
+        end_ts = pd.Timestamp(end)
+        expr = _and(expr, ds.field("Ano") <= end_ts.year)
+        if end_ts == end_ts.normalize():
+            # Fim informado como dia inteiro: inclui também registros horários desse dia
+            expr = _and(expr, ds.field("Data") < _ts(end_ts + pd.Timedelta(days=1)))
+        else:
+            expr = _and(expr, ds.field("Data") <= _ts(end_ts))
+
+    read_columns = list(columns) if columns else [f for f in _schema().names if f != "Ano"]
+    table = dataset.to_table(columns=read_columns, filter=expr)
+    df = table.to_pandas()
+    if 'Cidade' in df.columns and 'Data' in df.columns:
+        df = df.sort_values(['Cidade', 'Data'], kind='stable', ignore_index=True)
+    return df
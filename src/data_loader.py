@@ -3,26 +3,220 @@ import sqlite3
 import pandas as pd
 import os
 
+from src.columnar_store import PARQUET_DIR, is_store_current, read_parquet
+from src.rollups import ROLLUP_TABLES
+
 DB_PATH = "data/processed/energia_cidades.db"
 
-def load_data():
-    """Carrega os dados da tabela energia_cidades do SQLite para um DataFrame Pandas."""
+# Colunas da tabela energia_cidades (usadas para validar a projeção pedida em load_data)
+COLUNAS_ENERGIA = ["Cidade", "Data", "Consumo_MWh", "Temperatura_C", "Populacao_Milhoes", "Fonte_Consumo"]
+
+def _format_date_bound(value):
+    """Converte um limite de data (str, datetime ou Timestamp) para o formato texto usado na coluna Data."""
+    ts = pd.Timestamp(value)
+    if ts == ts.normalize():
+        return ts.strftime('%Y-%m-%d')
+    return ts.strftime('%Y-%m-%d %H:%M:%S')
+
+def _build_query(table, cities=None, start=None, end=None, columns=None):
+    """Monta o SELECT com projeção de colunas e filtros (cidade/período) aplicados no próprio SQLite."""
+    select_cols = ", ".join(columns) if columns else "*"
+    where = []
+    params = []
+
+    if cities is not None:
+        cities = list(cities)
+        where.append(f"Cidade IN ({', '.join('?' * len(cities))})")
+        params.extend(cities)
+    if start is not None:
+        where.append("Data >= ?")
+        params.append(_format_date_bound(start))
+    if end is not None:
+        end_str = _format_date_bound(end)
+        if len(end_str) == 10:
+            # Fim informado como dia inteiro: inclui também registros horários desse dia
+            where.append("Data < ?")
+            params.append((pd.Timestamp(end_str) + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+        else:
+            where.append("Data <= ?")
+            params.append(end_str)
+
+    query = f"SELECT {select_cols} FROM {table}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return query, params
+
+# Tipos usados no modo compacto (ver compact_frame)
+COLUNAS_CATEGORICAS = ["Cidade", "Fonte_Consumo"]
+COLUNAS_MEDIDAS = ["Consumo_MWh", "Temperatura_C", "Populacao_Milhoes"]
+
+def compact_frame(df, report=True):
+    """
+    Converte o DataFrame para uma representação compacta em memória:
+    - Cidade/Fonte_Consumo como category (um código inteiro por linha em vez de uma string);
+    - medidas em float32;
+    - sem as colunas Ano/Mes materializadas (são derivadas de Data apenas quando necessárias);
+    - linhas ordenadas por (Cidade, Data), o que deixa cada cidade em um bloco contíguo.
+    Com report=True, imprime o uso de memória (memory_usage(deep=True)) antes e depois.
+    """
+    if df.empty:
+        return df
+
+    memoria_antes = df.memory_usage(deep=True).sum()
+
+    df = df.drop(columns=[c for c in ('Ano', 'Mes') if c in df.columns])
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in COLUNAS_MEDIDAS:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    sort_cols = [c for c in ('Cidade', 'Data') if c in df.columns]
+    if sort_cols:
+        df = df.sort_values(sort_cols, kind='stable', ignore_index=True)
+
+    memoria_depois = df.memory_usage(deep=True).sum()
+    df.attrs['memoria_bytes'] = {"antes": int(memoria_antes), "depois": int(memoria_depois)}
+    if report:
+        reducao = 100 * (1 - memoria_depois / memoria_antes) if memoria_antes else 0
+        print(f"Memória do DataFrame: {memoria_antes / 1024**2:.2f} MB -> {memoria_depois / 1024**2:.2f} MB "
+              f"({reducao:.1f}% de redução).")
+    return df
+
+def calendar_columns(df):
+    """
+    Retorna (ano, mes) como Series de inteiros pequenos, usando as colunas Ano/Mes
+    quando existem ou derivando-as de Data (caso dos DataFrames no modo compacto).
+    """
+    if 'Ano' in df.columns and 'Mes' in df.columns:
+        return df['Ano'], df['Mes']
+    return df['Data'].dt.year.astype('int16'), df['Data'].dt.month.astype('int8')
+
+def _add_calendar_columns(df):
+    """Adiciona as colunas derivadas Ano/Mes a partir de Data (quando Data foi carregada)."""
+    if 'Data' in df.columns:
+        df['Ano'] = df['Data'].dt.year
+        df['Mes'] = df['Data'].dt.month
+    return df
+
+def _table_exists(conn, table):
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+def load_data(cities=None, start=None, end=None, columns=None, storage="auto", compact=False, granularity=None):
+    """
+    Carrega os dados da tabela energia_cidades para um DataFrame Pandas.
+
+    Os filtros são aplicados na própria leitura, de forma que só as linhas e colunas necessárias são lidas:
+    - cities: lista de cidades a carregar (None = todas).
+    - start / end: limites inclusivos do período (str 'YYYY-MM-DD', datetime ou Timestamp).
+    - columns: lista de colunas a carregar (None = todas).
+    - storage: vale para as linhas brutas (granularity=None). "auto" usa o armazenamento Parquet
+      (scripts/02_export_parquet.py) quando ele existe e está atualizado, caindo para o SQLite caso contrário;
+      "parquet" ou "sqlite" forçam a origem.
+    - compact: retorna a representação compacta de compact_frame (categorias, float32, sem Ano/Mes).
+    - granularity: "mensal" lê o rollup Cidade x mês (energia_mensal, mesmas colunas) do SQLite em vez das
+      linhas brutas, independentemente de storage (é o caminho do dashboard); se o rollup ainda não existir,
+      lê a tabela bruta.
+    """
+    if columns is not None:
+        invalid = [c for c in columns if c not in COLUNAS_ENERGIA]
+        if invalid:
+            print(f"Erro: Colunas inválidas solicitadas: {', '.join(invalid)}.")
+            return pd.DataFrame()
+    if cities is not None and len(cities) == 0:
+        return pd.DataFrame(columns=columns or COLUNAS_ENERGIA)
+
+    use_parquet = granularity is None and (
+        storage == "parquet" or (storage == "auto" and is_store_current(DB_PATH, PARQUET_DIR)))
+    if use_parquet:
+        try:
+            # Data já chega tipada (timestamp), sem o custo de pd.to_datetime sobre texto
+            df = read_parquet(PARQUET_DIR, cities=cities, start=start, end=end, columns=columns)
+            return compact_frame(df) if compact else _add_calendar_columns(df)
+        except Exception as e:
+            if storage == "parquet":
+                print(f"Erro ao carregar dados do armazenamento Parquet: {e}")
+                return pd.DataFrame()
+            print(f"Aviso: falha ao ler o armazenamento Parquet ({e}). Usando o SQLite.")
+
     if not os.path.exists(DB_PATH):
         print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute './run.sh' primeiro.")
         return pd.DataFrame()
-    
+
     conn = None
     try:
         conn = sqlite3.connect(DB_PATH)
+        table = "energia_cidades"
+        if granularity == "mensal" and _table_exists(conn, ROLLUP_TABLES["mensal"]):
+            table = ROLLUP_TABLES["mensal"]
+        query, params = _build_query(table, cities, start, end, columns or COLUNAS_ENERGIA)
         # Carrega a nova coluna 'Fonte_Consumo'
-        df = pd.read_sql_query("SELECT * FROM energia_cidades", conn)
-        df['Data'] = pd.to_datetime(df['Data'])
-        df['Ano'] = df['Data'].dt.year
-        df['Mes'] = df['Data'].dt.month
-        return df
+        df = pd.read_sql_query(query, conn, params=params)
+        if 'Data' in df.columns:
+            df['Data'] = pd.to_datetime(df['Data'])
+        return compact_frame(df) if compact else _add_calendar_columns(df)
     except sqlite3.Error as e:
         print(f"Erro ao carregar dados do banco de dados: {e}")
         return pd.DataFrame()
     finally:
         if conn:
             conn.close()
+
+def load_rollup(level, cities=None):
+    """
+    Carrega uma tabela de rollup ("anual" ou "mes_do_ano", ver src/rollups.py) para as cidades pedidas.
+    Retorna um DataFrame vazio se o rollup não existir.
+    """
+    if level not in ROLLUP_TABLES:
+        print(f"Erro: Rollup desconhecido: {level}.")
+        return pd.DataFrame()
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute './run.sh' primeiro.")
+        return pd.DataFrame()
+
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        if not _table_exists(conn, ROLLUP_TABLES[level]):
+            return pd.DataFrame()
+        query, params = _build_query(ROLLUP_TABLES[level], cities)
+        df = pd.read_sql_query(query, conn, params=params)
+        if 'Data' in df.columns:
+            df['Data'] = pd.to_datetime(df['Data'])
+        return df
+    except sqlite3.Error as e:
+        print(f"Erro ao carregar rollup '{level}' do banco de dados: {e}")
+        return pd.DataFrame()
+    finally:
+        if conn:
+            conn.close()
+
+def load_metadata():
+    """
+    Retorna as cidades disponíveis e o intervalo de anos do banco, sem carregar as linhas.
+    Usado pelo dashboard para montar os filtros antes de decidir o que carregar.
+    """
+    metadata = {"cidades": [], "ano_min": None, "ano_max": None}
+    if not os.path.exists(DB_PATH):
+        print(f"Erro: Banco de dados não encontrado em {DB_PATH}. Execute './run.sh' primeiro.")
+        return metadata
+
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT Cidade FROM energia_cidades ORDER BY Cidade")
+        metadata["cidades"] = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT MIN(Data), MAX(Data) FROM energia_cidades")
+        data_min, data_max = cursor.fetchone()
+        if data_min is not None:
+            metadata["ano_min"] = pd.Timestamp(data_min).year
+            metadata["ano_max"] = pd.Timestamp(data_max).year
+        return metadata
+    except sqlite3.Error as e:
+        print(f"Erro ao carregar metadados do banco de dados: {e}")
+        return metadata
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,241 @@
+# src/database.py
+# Funções de escrita no energia_cidades.db usadas pela ingestão (scripts/02_clean_transform_all.py)
+# as marcas d'água da coleta incremental (scripts/01_download_data.py) e a versão dos dados carregados.
+import os
+import sqlite3
+
+COLUNAS_VALORES = ["Consumo_MWh", "Temperatura_C", "Populacao_Milhoes", "Fonte_Consumo"]
+
+# Pragmas aplicados nas conexões de escrita: WAL permite que o dashboard continue lendo
+# a versão anterior dos dados enquanto a ingestão grava, e synchronous=NORMAL é seguro com WAL.
+# As tabelas temporárias (staging e chaves da carga completa) ficam em arquivo, para que a memória
+# da ingestão não cresça com o tamanho da entrada.
+PRAGMAS_ESCRITA = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=FILE",
+    "PRAGMA cache_size=-65536", # 64 MB
+    "PRAGMA busy_timeout=10000",
+]
+
+def connect_for_write(db_path):
+    """Abre uma conexão de escrita com os pragmas de ingestão aplicados."""
+    # isolation_level=None: as transações são controladas explicitamente com BEGIN/COMMIT
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for pragma in PRAGMAS_ESCRITA:
+        conn.execute(pragma)
+    return conn
+
+def _create_energy_table(cursor, table):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            Cidade TEXT NOT NULL,
+            Data TEXT NOT NULL,
+            Consumo_MWh REAL,
+            Temperatura_C REAL,
+            Populacao_Milhoes REAL,
+            Fonte_Consumo TEXT,
+            PRIMARY KEY (Cidade, Data)
+        )
+    """)
+
+def ensure_energy_schema(conn):
+    """
+    Garante que energia_cidades existe com chave primária (Cidade, Data).
+    Uma tabela antiga (sem chave) é migrada dentro da transação corrente, descartando
+    linhas sem cidade/data e mantendo a última ocorrência de cada (Cidade, Data).
+    Retorna True se houve migração (nesse caso os rollups devem ser reconstruídos).
+    """
+    cursor = conn.cursor()
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'energia_cidades'").fetchone()
+    if row is None:
+        _create_energy_table(cursor, "energia_cidades")
+        return False
+    if "PRIMARY KEY" in row[0].upper():
+        return False
+
+    print("Migrando a tabela energia_cidades para o esquema com chave primária (Cidade, Data)...")
+    _create_energy_table(cursor, "energia_cidades_nova")
+    cursor.execute("""
+        INSERT OR REPLACE INTO energia_cidades_nova (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo)
+        SELECT Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo
+        FROM energia_cidades
+        WHERE Cidade IS NOT NULL AND Data IS NOT NULL
+        ORDER BY rowid
+    """)
+    cursor.execute("DROP TABLE energia_cidades")
+    cursor.execute("ALTER TABLE energia_cidades_nova RENAME TO energia_cidades")
+    return True
+
+def begin_staging(conn, track_keys=False):
+    """
+    Cria a tabela temporária que recebe cada lote antes do upsert.
+    Com track_keys=True, as chaves recebidas são acumuladas para delete_missing_rows (carga completa).
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS temp._chaves_recebidas")
+    if track_keys:
+        cursor.execute("CREATE TEMP TABLE _chaves_recebidas (Cidade TEXT, Data TEXT, PRIMARY KEY (Cidade, Data))")
+    # Meses (Cidade, 'YYYY-MM') novos ou alterados, acumulados no próprio SQLite para os rollups
+    cursor.execute("DROP TABLE IF EXISTS temp._meses_alterados")
+    cursor.execute("CREATE TEMP TABLE _meses_alterados (Cidade TEXT, Mes TEXT, PRIMARY KEY (Cidade, Mes))")
+    cursor.execute("DROP TABLE IF EXISTS temp._staging_energia")
+    cursor.execute("""
+        CREATE TEMP TABLE _staging_energia (
+            Cidade TEXT NOT NULL,
+            Data TEXT NOT NULL,
+            Consumo_MWh REAL,
+            Temperatura_C REAL,
+            Populacao_Milhoes REAL,
+            Fonte_Consumo TEXT,
+            PRIMARY KEY (Cidade, Data)
+        )
+    """)
+
+def upsert_energy_rows(conn, rows):
+    """
+    Grava um lote de linhas (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo)
+    em energia_cidades com INSERT ... ON CONFLICT DO UPDATE, escrevendo apenas linhas novas ou alteradas.
+    O lote é inserido com executemany na tabela temporária (criada por begin_staging), o que permite
+    identificar os meses efetivamente alterados antes do upsert.
+    Os meses (Cidade, 'YYYY-MM') afetados são acumulados na tabela temporária _meses_alterados
+    (usada para atualizar os rollups). Retorna o número de linhas novas ou alteradas no lote.
+    Não abre nem fecha transação: o chamador controla o BEGIN/COMMIT.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM _staging_energia")
+    # Em caso de chave repetida no mesmo lote, vale a última ocorrência
+    cursor.executemany("""
+        INSERT OR REPLACE INTO _staging_energia (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    if cursor.execute("SELECT 1 FROM temp.sqlite_master WHERE name = '_chaves_recebidas'").fetchone():
+        cursor.execute("INSERT OR IGNORE INTO _chaves_recebidas SELECT Cidade, Data FROM _staging_energia")
+
+    differs = " OR ".join(f"e.{c} IS NOT s.{c}" for c in COLUNAS_VALORES)
+    cursor.execute(f"""
+        CREATE TEMP TABLE _staging_alteradas AS
+        SELECT s.Cidade, s.Data
+        FROM _staging_energia s
+        LEFT JOIN energia_cidades e ON e.Cidade = s.Cidade AND e.Data = s.Data
+        WHERE e.Cidade IS NULL OR {differs}
+    """)
+    n_changed = cursor.execute("SELECT COUNT(*) FROM _staging_alteradas").fetchone()[0]
+
+    if n_changed:
+        cursor.execute("INSERT OR IGNORE INTO _meses_alterados SELECT Cidade, substr(Data, 1, 7) FROM _staging_alteradas")
+        set_clause = ", ".join(f"{c} = excluded.{c}" for c in COLUNAS_VALORES)
+        differs_excluded = " OR ".join(f"energia_cidades.{c} IS NOT excluded.{c}" for c in COLUNAS_VALORES)
+        cursor.execute(f"""
+            INSERT INTO energia_cidades (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo)
+            SELECT Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes, Fonte_Consumo
+            FROM _staging_energia WHERE true
+            ON CONFLICT (Cidade, Data) DO UPDATE SET {set_clause}
+            WHERE {differs_excluded}
+        """)
+    cursor.execute("DROP TABLE _staging_alteradas")
+    return n_changed
+
+def count_changed_months(conn):
+    """Número de meses (Cidade, 'YYYY-MM') alterados desde begin_staging."""
+    return conn.execute("SELECT COUNT(*) FROM _meses_alterados").fetchone()[0]
+
+def delete_missing_rows(conn):
+    """
+    Remove de energia_cidades as linhas que não vieram na carga completa (begin_staging com track_keys=True).
+    Retorna o número de linhas removidas.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM energia_cidades
+        WHERE NOT EXISTS (
+            SELECT 1 FROM _chaves_recebidas k WHERE k.Cidade = energia_cidades.Cidade AND k.Data = energia_cidades.Data
+        )
+    """)
+    return cursor.rowcount
+
+# Marcas d'água da coleta: último mês (YYYY-MM) já carregado por cidade e fonte.
+# A fonte "Open-Meteo" marca a temperatura; as demais são o valor de Fonte_Consumo das linhas carregadas.
+FONTE_TEMPERATURA = "Open-Meteo"
+# Fonte_Consumo dos meses de cidades ANEEL preenchidos com o perfil simulado porque a ANEEL ainda não tem
+# o mês: as linhas são gravadas, mas não avançam as marcas d'água da cidade, e a próxima coleta as busca de novo.
+FONTE_CONSUMO_PROVISORIA = "Simulado (ANEEL pendente)"
+
+def create_watermark_table(conn):
+    """Cria a tabela coleta_watermarks (se ainda não existir)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS coleta_watermarks (
+            Cidade TEXT NOT NULL,
+            Fonte TEXT NOT NULL,
+            Ultimo_Mes TEXT NOT NULL,
+            Atualizado_Em TEXT,
+            PRIMARY KEY (Cidade, Fonte)
+        )
+    """)
+
+def load_watermarks(db_path):
+    """
+    Lê as marcas d'água da coleta como {(Cidade, Fonte): 'YYYY-MM'}.
+    Retorna um dicionário vazio se o banco ou a tabela ainda não existirem (primeira execução).
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT Cidade, Fonte, Ultimo_Mes FROM coleta_watermarks").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+    return {(cidade, fonte): mes for cidade, fonte, mes in rows}
+
+def advance_watermarks(conn, marks, reset=False):
+    """
+    Grava as marcas d'água {(Cidade, Fonte): 'YYYY-MM'} das linhas carregadas.
+    Uma marca nunca recua (vale o maior mês); com reset=True (carga completa) as marcas
+    anteriores são descartadas e passam a refletir exatamente a entrada.
+    Não abre nem fecha transação: deve ser chamada na mesma transação da carga.
+    """
+    create_watermark_table(conn)
+    if reset:
+        conn.execute("DELETE FROM coleta_watermarks")
+    conn.executemany("""
+        INSERT INTO coleta_watermarks (Cidade, Fonte, Ultimo_Mes, Atualizado_Em)
+        VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT (Cidade, Fonte) DO UPDATE SET
+            Ultimo_Mes = max(Ultimo_Mes, excluded.Ultimo_Mes),
+            Atualizado_Em = excluded.Atualizado_Em
+    """, [(cidade, fonte, mes) for (cidade, fonte), mes in marks.items()])
+
+# Versão dos dados de energia_cidades: um contador incrementado pela ingestão a cada carga que altera
+# a tabela. Cópias derivadas (ex.: o armazenamento Parquet) gravam a versão de que partiram e ficam
+# válidas enquanto ela não mudar, independentemente de outras escritas no banco (registro, decomposições).
+VERSION_TABLE = "energia_versao"
+
+def bump_data_version(conn, changed=True):
+    """
+    Incrementa a versão dos dados (ou cria a primeira, se ainda não existir).
+    Com changed=False, apenas garante que a versão existe. Retorna a versão corrente.
+    Não abre nem fecha transação: deve ser chamada na mesma transação da carga.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            Id INTEGER PRIMARY KEY CHECK (Id = 1),
+            Versao INTEGER NOT NULL,
+            Atualizado_Em TEXT
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO {VERSION_TABLE} (Id, Versao, Atualizado_Em) VALUES (1, 1, datetime('now'))
+        ON CONFLICT (Id) DO UPDATE SET Versao = Versao + 1, Atualizado_Em = excluded.Atualizado_Em
+        WHERE ?
+    """, (1 if changed else 0,))
+    return conn.execute(f"SELECT Versao FROM {VERSION_TABLE} WHERE Id = 1").fetchone()[0]
+
+def read_data_version(conn):
+    """Versão corrente dos dados, ou None se o banco ainda não tem a tabela de versão."""
+    try:
+        row = conn.execute(f"SELECT Versao FROM {VERSION_TABLE} WHERE Id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
@@ -0,0 +1,81 @@
+# src/dataset.py
+import numpy as np
+import pandas as pd
+
+class CityDataset:
+    """
+    Encapsula o DataFrame de energia ordenado por (Cidade, Data) com um índice
+    cidade -> faixa contígua de linhas [inicio, fim).
+    O acesso a uma cidade vira um fatiamento posicional (iloc) que devolve uma view,
+    sem varrer a tabela inteira com df[df['Cidade'] == city] nem copiar os dados.
+    """
+    def __init__(self, df):
+        if df.empty:
+            self.df = df
+            self._ranges = {}
+            return
+
+        codes, uniques = pd.factorize(df['Cidade'], sort=True)
+        if not self._is_sorted(codes, df['Data'].to_numpy()):
+            order = np.lexsort((df['Data'].to_numpy(), codes))
+            df = df.iloc[order].reset_index(drop=True)
+            codes = codes[order]
+
+        # Posições onde a cidade muda: cada cidade ocupa o bloco [inicio, fim)
+        boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(codes)]))
+        self.df = df
+        self._ranges = {uniques[codes[s]]: (int(s), int(e)) for s, e in zip(starts, stops)}
+
+    @staticmethod
+    def _is_sorted(codes, datas):
+        """Verifica se as linhas já estão ordenadas por cidade e, dentro de cada cidade, por data."""
+        if len(codes) < 2:
+            return True
+        code_diff = np.diff(codes)
+        if (code_diff < 0).any():
+            return False
+        same_city = code_diff == 0
+        return not (datas[1:][same_city] < datas[:-1][same_city]).any()
+
+    @property
+    def cities(self):
+        """Lista das cidades presentes, na ordem em que estão armazenadas."""
+        return list(self._ranges.keys())
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, city):
+        return city in self._ranges
+
+    def city(self, city):
+        """Retorna as linhas de uma cidade (view, ordenada por Data). Cidade ausente -> DataFrame vazio."""
+        start, stop = self._ranges.get(city, (0, 0))
+        return self.df.iloc[start:stop]
+
+    def select(self, cities):
+        """Retorna as linhas das cidades pedidas, concatenando apenas os blocos necessários."""
+        frames = [self.city(c) for c in cities if c in self._ranges]
+        if not frames:
+            return self.df.iloc[0:0]
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+def city_frame(data, city):
+    """Linhas de uma cidade a partir de um CityDataset (fatiamento) ou de um DataFrame (filtro booleano)."""
+    if isinstance(data, CityDataset):
+        return data.city(city)
+    return data[data['Cidade'] == city]
+
+def cities_frame(data, cities):
+    """Linhas de várias cidades a partir de um CityDataset ou de um DataFrame."""
+    if isinstance(data, CityDataset):
+        return data.select(cities)
+    return data[data['Cidade'].isin(cities)]
@@ -0,0 +1,129 @@
+# src/decomposition.py
+# Decomposição aditiva de séries temporais (tendência + sazonalidade + resíduos) em NumPy vetorizado.
+# Reproduz o seasonal_decompose(model='additive') do statsmodels (média móvel centrada, médias sazonais
+# e a mesma semântica de extrapolate_trend), mas decompõe muitas séries de uma vez, sem importar o statsmodels.
+# A equivalência com o statsmodels é conferida por scripts/benchmark_decomposition.py.
+from collections import namedtuple
+import hashlib
+import numpy as np
+import pandas as pd
+
+DEFAULT_PERIOD = 12 # sazonalidade anual em dados mensais
+MIN_MONTHS = 2 * DEFAULT_PERIOD # dois ciclos completos
+
+Decomposicao = namedtuple("Decomposicao", ["observed", "trend", "seasonal", "resid"])
+
+def _trend_filter(period):
+    """Pesos da média móvel centrada: 2 x period para período par (pontas com meio peso), simples para ímpar."""
+    if period % 2 == 0:
+        return np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+    return np.repeat(1.0 / period, period)
+
+def _extrapolation_points(extrapolate_trend, period):
+    """Número de pontos da regressão usada para extrapolar a tendência nas pontas (0 = sem extrapolação)."""
+    if isinstance(extrapolate_trend, str):
+        if extrapolate_trend not in ("freq", "period"):
+            raise ValueError(f"extrapolate_trend inválido: {extrapolate_trend}. Use um inteiro, 'period' ou 'freq'.")
+        extrapolate_trend = period - 1
+    return extrapolate_trend + 1 if extrapolate_trend > 0 else 0
+
+def _linear_fit(positions, values):
+    """Reta de mínimos quadrados (coeficiente, intercepto) de cada linha de values sobre as mesmas posições."""
+    xc = positions - positions.mean()
+    slope = (values - values.mean(axis=1, keepdims=True)) @ xc / (xc @ xc)
+    return slope, values.mean(axis=1) - slope * positions.mean()
+
+def _extrapolate_trend(trend, front, back, npoints):
+    """
+    Preenche as pontas da tendência (NaN fora de [front, back]) com retas ajustadas aos npoints pontos
+    definidos mais próximos de cada ponta, como o statsmodels (o ajuste final não inclui o ponto `back`).
+    """
+    n_obs = trend.shape[1]
+    front_last = min(front + npoints, back)
+    back_first = max(front, back - npoints)
+
+    positions = np.arange(front, front_last, dtype=np.float64)
+    slope, intercept = _linear_fit(positions, trend[:, front:front_last])
+    trend[:, :front] = np.arange(0, front)[None, :] * slope[:, None] + intercept[:, None]
+
+    positions = np.arange(back_first, back, dtype=np.float64)
+    slope, intercept = _linear_fit(positions, trend[:, back_first:back])
+    trend[:, back + 1:] = np.arange(back + 1, n_obs)[None, :] * slope[:, None] + intercept[:, None]
+    return trend
+
+def seasonal_decompose_many(values, period=DEFAULT_PERIOD, extrapolate_trend=0):
+    """
+    Decomposição aditiva de várias séries de mesmo comprimento em uma única chamada vetorizada.
+    values: array 2-D (uma série por linha) ou 1-D (uma série). extrapolate_trend: inteiro, 'period' ou 'freq'
+    (period - 1), como no statsmodels; 0 deixa NaN nas pontas da tendência e dos resíduos.
+    Retorna um Decomposicao(observed, trend, seasonal, resid) com arrays no formato da entrada.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    one_series = x.ndim == 1
+    x = np.atleast_2d(x)
+    if x.ndim != 2:
+        raise ValueError("values deve ser um array 1-D ou 2-D (uma série por linha).")
+    if not np.isfinite(x).all():
+        raise ValueError("A decomposição não aceita valores ausentes; preencha as lacunas antes.")
+    n_series, n_obs = x.shape
+    if n_obs < 2 * period:
+        raise ValueError(f"A decomposição exige 2 ciclos completos ({2 * period} observações); "
+                         f"a série tem {n_obs}.")
+
+    # Tendência: média móvel centrada (NaN nas pontas onde a janela não cabe)
+    filt = _trend_filter(period)
+    half = (len(filt) - 1) // 2
+    trend = np.full((n_series, n_obs), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(x, len(filt), axis=1)
+    trend[:, half:n_obs - half] = windows @ filt
+
+    npoints = _extrapolation_points(extrapolate_trend, period)
+    if npoints:
+        trend = _extrapolate_trend(trend, half, n_obs - 1 - half, npoints)
+
+    # Sazonalidade: média de cada posição do ciclo sobre a série sem tendência, centrada em zero
+    detrended = x - trend
+    cycles = -(-n_obs // period)
+    padded = np.full((n_series, cycles * period), np.nan)
+    padded[:, :n_obs] = detrended
+    period_averages = np.nanmean(padded.reshape(n_series, cycles, period), axis=1)
+    period_averages -= period_averages.mean(axis=1, keepdims=True)
+    seasonal = np.tile(period_averages, (1, cycles))[:, :n_obs]
+    resid = detrended - seasonal
+
+    if one_series:
+        return Decomposicao(x[0], trend[0], seasonal[0], resid[0])
+    return Decomposicao(x, trend, seasonal, resid)
+
+def seasonal_decompose_series(series, period=DEFAULT_PERIOD, extrapolate_trend=0):
+    """seasonal_decompose_many para uma pandas Series: os componentes voltam como Series com o mesmo índice."""
+    result = seasonal_decompose_many(series.to_numpy(), period=period, extrapolate_trend=extrapolate_trend)
+    return Decomposicao(*(pd.Series(component, index=series.index, name=series.name) for component in result))
+
+def monthly_series(df_city):
+    """
+    Série mensal de consumo de uma cidade pronta para a decomposição: indexada por Data, com frequência
+    mensal ('MS') e lacunas preenchidas pela média da série (a decomposição não aceita valores ausentes).
+    """
+    series = pd.Series(df_city['Consumo_MWh'].to_numpy(dtype=np.float64), index=pd.DatetimeIndex(df_city['Data']),
+                       name='Consumo_MWh').sort_index()
+    datas = series.index.to_numpy(dtype='datetime64[ns]')
+    months = datas.astype('datetime64[M]')
+    if len(datas) and (months == datas).all():
+        # Datas no primeiro dia do mês (rollup mensal): a grade mensal sai de aritmética de datas do NumPy,
+        # bem mais rápida que o asfreq('MS') do pandas, com o mesmo resultado
+        series = series.reindex(pd.DatetimeIndex(np.arange(months[0], months[-1] + 1).astype('datetime64[ns]')))
+    else:
+        series = series.asfreq('MS')
+    return series.fillna(series.mean())
+
+def series_version(series):
+    """
+    Versão do conteúdo de uma série mensal: hash SHA-256 (16 primeiros dígitos) das datas e dos valores.
+    Os valores são normalizados para float32, como em model_registry.dataset_version, então o modo
+    compacto e o modo normal do load_data produzem a mesma versão.
+    """
+    h = hashlib.sha256()
+    h.update(series.index.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    h.update(np.ascontiguousarray(series.to_numpy(dtype=np.float32)).tobytes())
+    return h.hexdigest()[:16]
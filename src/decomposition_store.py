@@ -0,0 +1,127 @@
+# src/decomposition_store.py
+# Componentes pré-calculados da decomposição sazonal (src/decomposition.py), na tabela decomposicoes.
+# Cada cidade guarda a decomposição da sua série mensal mais recente, identificada pela versão do
+# conteúdo da série (decomposition.series_version). O dashboard busca (cidade, versão) e só renderiza;
+# a tabela é preenchida por scripts/08_precompute_decompositions.py após a ingestão.
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from src.data_loader import DB_PATH
+from src.database import connect_for_write
+from src.decomposition import (DEFAULT_PERIOD, MIN_MONTHS, Decomposicao, monthly_series, seasonal_decompose_many,
+                               series_version)
+
+DECOMPOSITION_TABLE = "decomposicoes"
+EXTRAPOLATE_TREND = "period" # o mesmo usado pelo dashboard
+
+def create_decomposition_table(conn):
+    """Cria a tabela de componentes da decomposição (se ainda não existir)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DECOMPOSITION_TABLE} (
+            Cidade TEXT NOT NULL,
+            Data TEXT NOT NULL,
+            Versao_Serie TEXT NOT NULL,
+            Observado REAL,
+            Tendencia REAL,
+            Sazonalidade REAL,
+            Residuo REAL,
+            PRIMARY KEY (Cidade, Data)
+        )
+    """)
+
+def _decompose_chunk(values):
+    """Executado nos processos do pool: decomposição vetorizada de um bloco de séries de mesmo comprimento."""
+    return seasonal_decompose_many(values, period=DEFAULT_PERIOD, extrapolate_trend=EXTRAPOLATE_TREND)
+
+def decompose_all(df, workers=None):
+    """
+    Decompõe a série mensal de consumo de todas as cidades do DataFrame (colunas Cidade, Data, Consumo_MWh).
+    As séries de mesmo comprimento são empilhadas e decompostas em blocos vetorizados, distribuídos
+    em um pool de `workers` processos (padrão: número de CPUs; 1 = no próprio processo).
+    Retorna {cidade: (versão, Decomposicao de Series)}; cidades com menos de MIN_MONTHS meses ficam de fora.
+    """
+    series = {}
+    for city, df_city in df[df['Cidade'].notna()].groupby('Cidade', observed=True, sort=True):
+        s = monthly_series(df_city)
+        if len(s) >= MIN_MONTHS:
+            series[city] = s
+    if not series:
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    by_length = {}
+    for city, s in series.items():
+        by_length.setdefault(len(s), []).append(city)
+    # Alguns blocos por processo; cada bloco é uma única chamada de seasonal_decompose_many
+    chunk_size = max(1, -(-len(series) // (workers * 4)))
+    chunks = [cities[i:i + chunk_size] for cities in by_length.values() for i in range(0, len(cities), chunk_size)]
+    blocks = [np.vstack([series[c].to_numpy() for c in cities]) for cities in chunks]
+
+    if workers == 1:
+        results = map(_decompose_chunk, blocks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_decompose_chunk, blocks))
+
+    decompositions = {}
+    for cities, result in zip(chunks, results):
+        for row, city in enumerate(cities):
+            index = series[city].index
+            decompositions[city] = (series_version(series[city]), Decomposicao(
+                *(pd.Series(component[row], index=index, name='Consumo_MWh') for component in result)))
+    return decompositions
+
+def save_decompositions(decompositions, db_path=DB_PATH):
+    """
+    Grava os componentes em uma única transação, substituindo a decomposição anterior de cada cidade.
+    Retorna o número de cidades gravadas.
+    """
+    rows = []
+    for city, (version, dec) in decompositions.items():
+        datas = dec.observed.index.strftime('%Y-%m-%d')
+        values = np.column_stack([dec.observed, dec.trend, dec.seasonal, dec.resid]).astype(object)
+        values[pd.isna(values)] = None
+        rows.extend((city, data, version, *v) for data, v in zip(datas, values.tolist()))
+
+    conn = connect_for_write(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_decomposition_table(conn)
+        conn.executemany(f"DELETE FROM {DECOMPOSITION_TABLE} WHERE Cidade = ?", [(c,) for c in decompositions])
+        conn.executemany(f"""
+            INSERT INTO {DECOMPOSITION_TABLE} (Cidade, Data, Versao_Serie, Observado, Tendencia, Sazonalidade, Residuo)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return len(decompositions)
+
+def load_decomposition(city, version, db_path=DB_PATH):
+    """
+    Busca os componentes gravados de (cidade, versão da série). Retorna um Decomposicao de Series
+    indexadas por Data, ou None se a cidade não foi pré-calculada ou a série mudou desde então.
+    """
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query(f"""
+            SELECT Data, Observado, Tendencia, Sazonalidade, Residuo FROM {DECOMPOSITION_TABLE}
+            WHERE Cidade = ? AND Versao_Serie = ? ORDER BY Data
+        """, conn, params=(city, version), parse_dates=['Data'])
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        return None
+    finally:
+        conn.close()
+    if df.empty:
+        return None
+    df = df.set_index('Data').asfreq('MS')
+    return Decomposicao(*(df[c].rename('Consumo_MWh') for c in ['Observado', 'Tendencia', 'Sazonalidade', 'Residuo']))
@@ -0,0 +1,96 @@
+# src/downsampling.py
+# Redução de pontos para os gráficos do plotly: o tamanho da figura (JSON enviado ao navegador) fica
+# limitado por um orçamento de pontos, qualquer que seja o tamanho dos dados (diários, horários, muitas cidades).
+# - Séries temporais: Largest-Triangle-Three-Buckets (LTTB), que mantém o formato visual da curva (picos e vales)
+#   e pode preservar pontos obrigatórios (ex.: anomalias);
+# - Dispersões: amostra uniforme das linhas (o LTTB pressupõe x ordenado).
+# Acima de WEBGL_THRESHOLD pontos, os traços usam WebGL (Scattergl) em vez de SVG.
+import numpy as np
+
+DEFAULT_MAX_POINTS = 2000 # orçamento de pontos por gráfico
+WEBGL_THRESHOLD = 1000 # mesmo limite do render_mode="auto" do plotly express
+
+def use_webgl(n_points, threshold=WEBGL_THRESHOLD):
+    """Indica se um traço com n_points pontos deve ser renderizado com WebGL."""
+    return n_points > threshold
+
+def _as_float(values):
+    """Valores do eixo x como float64 (datas viram nanossegundos desde a época)."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+def lttb_indices(x, y, n_out):
+    """
+    Índices (ordenados) dos n_out pontos escolhidos pelo LTTB para a série (x crescente, y).
+    O primeiro e o último ponto são sempre mantidos; cada balde intermediário contribui com o ponto que
+    forma o maior triângulo com o ponto escolhido no balde anterior e a média do balde seguinte.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)])
+    x, y = _as_float(x), _as_float(y)
+
+    # Limites dos n_out - 2 baldes intermediários (o primeiro e o último ponto ficam de fora)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    with np.errstate(invalid='ignore'):
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            next_hi = edges[i + 2] if i + 2 < len(edges) else n
+            avg_x, avg_y = np.nanmean(x[hi:next_hi]), np.nanmean(y[hi:next_hi])
+            area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+            a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+            selected[i + 1] = a
+    return selected
+
+def downsample_indices(x, y, max_points=DEFAULT_MAX_POINTS, keep=None):
+    """
+    Índices ordenados das linhas a plotar de uma série temporal: todas, se couberem em max_points;
+    caso contrário, os pontos do LTTB mais as posições marcadas em keep (máscara booleana, ex.: anomalias),
+    que são preservadas e descontadas do orçamento. O total nunca passa de max_points: se as posições
+    marcadas sozinhas já excedem o orçamento, plota-se uma amostra uniforme delas.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    kept = np.flatnonzero(keep) if keep is not None else np.array([], dtype=np.int64)
+    if len(kept) >= max_points:
+        return kept[sample_indices(len(kept), max_points)]
+    selected = lttb_indices(x, y, max_points - len(kept))
+    return np.union1d(selected, kept)
+
+def downsample_frame(df, x_col, y_col, max_points=DEFAULT_MAX_POINTS, keep=None):
+    """Aplica downsample_indices a um DataFrame ordenado por x_col (devolve o próprio df se couber no orçamento)."""
+    if len(df) <= max_points:
+        return df
+    return df.iloc[downsample_indices(df[x_col].to_numpy(), df[y_col].to_numpy(), max_points, keep)]
+
+def split_budget(sizes, max_points=DEFAULT_MAX_POINTS):
+    """
+    Divide o orçamento entre várias séries (ex.: uma por cidade) com soma de no máximo max_points.
+    Cada série recebe uma parte igual do orçamento e o que uma série curta não usa é redistribuído entre
+    as demais. Com mais séries que pontos, algumas ficam com orçamento 0 (e não são plotadas).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    budgets = np.zeros(len(sizes), dtype=np.int64)
+    remaining = max_points
+    # Das séries mais curtas para as mais longas, cada uma leva o que precisa, limitado à parte igual do restante
+    order = np.argsort(sizes, kind='stable')
+    for pos, i in enumerate(order):
+        share, extra = divmod(remaining, len(sizes) - pos)
+        budgets[i] = min(sizes[i], share + (extra > 0))
+        remaining -= budgets[i]
+    return budgets
+
+def sample_indices(n, max_points=DEFAULT_MAX_POINTS):
+    """Índices de uma amostra uniforme (determinística) de até max_points linhas de n, para gráficos de dispersão."""
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))
@@ -0,0 +1,176 @@
+# src/http_cache.py
+# Cache em disco das respostas HTTP usadas na coleta (Open-Meteo e ANEEL).
+# Estrutura em data/raw/cache:
+# - objetos/<sha256 do conteúdo>: corpo das respostas (endereçado pelo conteúdo, sem duplicatas);
+# - indice/<sha256 da requisição>.json: URL, parâmetros, ETag/Last-Modified e o objeto correspondente.
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = "data/raw/cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3 # 2 GB
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+class HttpCache:
+    """
+    Cache de respostas HTTP em disco, com revalidação condicional e despejo por tamanho.
+    - Entradas marcadas como imutáveis (ex.: períodos históricos fechados) são servidas sem acessar a rede.
+    - As demais são revalidadas com If-None-Match / If-Modified-Since; um 304 reaproveita o corpo salvo.
+    - Quando o total de objetos passa de max_bytes, as entradas usadas há mais tempo são removidas.
+    Pode ser compartilhado entre threads.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, "objetos")
+        self.index_dir = os.path.join(cache_dir, "indice")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidados": 0, "baixados": 0}
+
+    @staticmethod
+    def request_key(url, params=None):
+        """Chave da requisição: hash da URL e dos parâmetros (em ordem canônica)."""
+        canonical = json.dumps({"url": url, "params": sorted((params or {}).items())}, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _index_path(self, key):
+        return os.path.join(self.index_dir, f"{key}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest)
+
+    def _load_entry(self, key):
+        try:
+            with open(self._index_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not os.path.exists(self._object_path(entry["objeto"])):
+            return None
+        return entry
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _touch(self, key):
+        """Marca o uso da entrada (o mtime do índice define a ordem de despejo)."""
+        try:
+            os.utime(self._index_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, session, url, params=None, immutable=False, timeout=30, before_request=None):
+        """
+        Retorna o caminho local do corpo da resposta para (url, params), usando o cache quando possível.
+        before_request (opcional) é chamado imediatamente antes de acessar a rede (ex.: limite de taxa).
+        Erros HTTP são propagados com response.raise_for_status() (requests.HTTPError), para que o
+        chamador decida sobre novas tentativas.
+        """
+        key = self.request_key(url, params)
+        entry = self._load_entry(key)
+
+        if entry is not None and (immutable or entry.get("imutavel")):
+            self._touch(key)
+            self._count("hits")
+            return self._object_path(entry["objeto"])
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        if before_request is not None:
+            before_request()
+        with session.get(url, params=params, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and entry is not None:
+                self._touch(key)
+                self._count("revalidados")
+                return self._object_path(entry["objeto"])
+            response.raise_for_status()
+            digest, size = self._store_body(response)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        new_entry = {
+            "url": url,
+            "params": params or {},
+            "objeto": digest,
+            "tamanho": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "imutavel": bool(immutable),
+            "armazenado_em": time.time(),
+        }
+        self._write_json_atomic(self._index_path(key), new_entry)
+        self._count("baixados")
+        self.evict()
+        return self._object_path(digest)
+
+    def _store_body(self, response):
+        """Grava o corpo em streaming (sem carregá-lo inteiro em memória) e o move para o endereço do seu hash."""
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+                    sha.update(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            os.replace(tmp_path, self._object_path(digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, size
+
+    @staticmethod
+    def _write_json_atomic(path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Remove as entradas usadas há mais tempo até o total de objetos caber em max_bytes."""
+        with self._lock:
+            objects = {e.name: e.stat().st_size for e in os.scandir(self.objects_dir)
+                       if e.is_file() and not e.name.endswith(".tmp")}
+            total = sum(objects.values())
+            if total <= self.max_bytes:
+                return
+
+            entries = []
+            for e in os.scandir(self.index_dir):
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    with open(e.path, "r", encoding="utf-8") as f:
+                        digest = json.load(f)["objeto"]
+                except (OSError, ValueError, KeyError):
+                    digest = None
+                entries.append((e.stat().st_mtime, e.path, digest))
+            entries.sort()
+
+            referenced = {}
+            for _, _, digest in entries:
+                referenced[digest] = referenced.get(digest, 0) + 1
+
+            for _, index_path, digest in entries:
+                if total <= self.max_bytes:
+                    break
+                os.remove(index_path)
+                referenced[digest] = referenced.get(digest, 1) - 1
+                # O objeto só é apagado quando nenhuma outra entrada aponta para o mesmo conteúdo
+                if digest in objects and referenced[digest] <= 0:
+                    os.remove(self._object_path(digest))
+                    total -= objects.pop(digest)
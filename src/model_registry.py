@@ -0,0 +1,186 @@
+# src/model_registry.py
+# Registro persistente dos modelos de src/models.py, na tabela modelos_registro do energia_cidades.db.
+# Cada modelo é identificado por (Cidade, Features, Versao_Dados):
+# - Features: colunas explicativas do modelo (hoje só a temperatura);
+# - Versao_Dados: hash do conteúdo dos dados de treino da cidade (ver dataset_version).
+# O registro é preenchido após a ingestão por scripts/05_populate_model_registry.py, com o histórico completo
+# e cada ano de cada cidade (os recortes que o dashboard seleciona); o dashboard apenas consulta a chave,
+# sem treinar nada.
+import hashlib
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from src.data_loader import DB_PATH
+from src.database import connect_for_write
+from src.models import FEATURE_COLUMN, TARGET_COLUMN, EnergyModel
+
+REGISTRY_TABLE = "modelos_registro"
+FEATURE_SET = FEATURE_COLUMN
+
+def create_registry_table(conn):
+    """Cria a tabela do registro de modelos (se ainda não existir)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+            Cidade TEXT NOT NULL,
+            Features TEXT NOT NULL,
+            Versao_Dados TEXT NOT NULL,
+            Coeficiente REAL,
+            Intercepto REAL,
+            R2 REAL,
+            MAE REAL,
+            RMSE REAL,
+            N INTEGER,
+            Media_X REAL,
+            Media_Y REAL,
+            Sxx REAL,
+            Sxy REAL,
+            Syy REAL,
+            Treinado_Em TEXT,
+            PRIMARY KEY (Cidade, Features, Versao_Dados)
+        )
+    """)
+
+def dataset_version(df_city):
+    """
+    Versão dos dados de treino de uma cidade: hash SHA-256 (16 primeiros dígitos) das datas e dos valores
+    de temperatura e consumo, em ordem de data. Os valores são normalizados para float32, então o modo
+    compacto (float32) e o modo normal (float64) do load_data produzem a mesma versão.
+    """
+    df = df_city[['Data', FEATURE_COLUMN, TARGET_COLUMN]]
+    datas = pd.to_datetime(df['Data'])
+    if not datas.is_monotonic_increasing:
+        order = np.argsort(datas.to_numpy(), kind='stable')
+        df, datas = df.iloc[order], datas.iloc[order]
+    h = hashlib.sha256()
+    h.update(datas.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    h.update(np.ascontiguousarray(df[[FEATURE_COLUMN, TARGET_COLUMN]].to_numpy(dtype=np.float32)).tobytes())
+    return h.hexdigest()[:16]
+
+def dataset_versions(df, city_column='Cidade'):
+    """
+    dataset_version de cada cidade do DataFrame: {cidade: versão}.
+    As linhas são ordenadas por (cidade, data) uma única vez e cada cidade é uma fatia contígua dos arrays,
+    então o custo por cidade é só o hash (sem operações do pandas por grupo). Os bytes hasheados são
+    os mesmos de dataset_version.
+    """
+    codes, cities = pd.factorize(df[city_column])
+    datas = pd.to_datetime(df['Data']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    values = df[[FEATURE_COLUMN, TARGET_COLUMN]].to_numpy(dtype=np.float32)
+    # lexsort é estável: empates de data mantêm a ordem original, como em dataset_version
+    order = np.lexsort((datas, codes))
+    codes, datas, values = codes[order], datas[order], values[order]
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    versions = {}
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+        if start == end or codes[start] < 0: # linhas sem cidade
+            continue
+        h = hashlib.sha256()
+        h.update(datas[start:end].tobytes())
+        h.update(np.ascontiguousarray(values[start:end]).tobytes())
+        versions[cities[codes[start]]] = h.hexdigest()[:16]
+    return versions
+
+def _registry_rows(table, versions, features):
+    for row in table[table['treinado']].itertuples():
+        city = row.Index
+        if city not in versions:
+            continue
+        yield (city, features, versions[city], float(row.coeficiente), float(row.intercepto), float(row.r2),
+               float(row.mae), float(row.rmse), int(row.n), float(row.media_x), float(row.media_y),
+               float(row.sxx), float(row.sxy), float(row.syy))
+
+def _write_rows(rows, db_path):
+    conn = connect_for_write(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_registry_table(conn)
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO {REGISTRY_TABLE}
+                (Cidade, Features, Versao_Dados, Coeficiente, Intercepto, R2, MAE, RMSE, N,
+                 Media_X, Media_Y, Sxx, Sxy, Syy, Treinado_Em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        """, rows)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def save_models(table, versions, features=FEATURE_SET, db_path=DB_PATH):
+    """
+    Grava no registro os modelos de uma tabela de train_many (apenas cidades treinadas),
+    com a versão dos dados de cada cidade ({cidade: versão}). Uma chave já existente é sobrescrita.
+    Retorna o número de modelos gravados.
+    """
+    return save_model_sets([(table, versions)], features=features, db_path=db_path)
+
+def save_model_sets(model_sets, features=FEATURE_SET, db_path=DB_PATH):
+    """
+    Grava em uma única transação vários conjuntos [(tabela de train_many, {cidade: versão})],
+    ex.: o histórico completo e cada ano. Retorna o número de modelos gravados.
+    """
+    rows = [row for table, versions in model_sets for row in _registry_rows(table, versions, features)]
+    _write_rows(rows, db_path)
+    return len(rows)
+
+def load_model(city, version, features=FEATURE_SET, db_path=DB_PATH):
+    """Busca no registro o modelo de (cidade, features, versão). Retorna um EnergyModel ou None."""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute(f"""
+            SELECT Coeficiente, Intercepto, R2, MAE, RMSE, N, Media_X, Media_Y, Sxx, Sxy, Syy
+            FROM {REGISTRY_TABLE}
+            WHERE Cidade = ? AND Features = ? AND Versao_Dados = ?
+        """, (city, features, version)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    coef, intercept, r2, mae, rmse = row[:5]
+    return EnergyModel.from_coefficients(coef, intercept, r2=r2, mae=mae, rmse=rmse, stats=row[5:])
+
+def prune_registry(keep_versions, features=FEATURE_SET, db_path=DB_PATH):
+    """
+    Remove do registro as versões que não estão em keep_versions para as cidades listadas,
+    evitando que o registro cresça a cada ingestão. keep_versions mapeia cada cidade para uma versão
+    ou para um conjunto de versões (ex.: histórico completo e anos). Retorna o número de modelos removidos.
+    """
+    keep = [
+        (city, version)
+        for city, versions in keep_versions.items()
+        for version in ([versions] if isinstance(versions, str) else versions)
+    ]
+    conn = connect_for_write(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        create_registry_table(conn)
+        conn.execute("DROP TABLE IF EXISTS temp._versoes_mantidas")
+        conn.execute("CREATE TEMP TABLE _versoes_mantidas (Cidade TEXT, Versao_Dados TEXT, PRIMARY KEY (Cidade, Versao_Dados))")
+        conn.executemany("INSERT OR IGNORE INTO _versoes_mantidas VALUES (?, ?)", keep)
+        cursor = conn.execute(f"""
+            DELETE FROM {REGISTRY_TABLE}
+            WHERE Features = ?
+              AND Cidade IN (SELECT Cidade FROM _versoes_mantidas)
+              AND NOT EXISTS (
+                  SELECT 1 FROM _versoes_mantidas k
+                  WHERE k.Cidade = {REGISTRY_TABLE}.Cidade AND k.Versao_Dados = {REGISTRY_TABLE}.Versao_Dados
+              )
+        """, (features,))
+        removed = cursor.rowcount
+        conn.execute("DROP TABLE _versoes_mantidas")
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return removed
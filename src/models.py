@@ -1,48 +1,328 @@
 # src/models.py
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error
 import math
+from src.data_loader import calendar_columns
+
+# Colunas da regressão: consumo (y) explicado pela temperatura (x)
+FEATURE_COLUMN = 'Temperatura_C'
+TARGET_COLUMN = 'Consumo_MWh'
+MIN_TRAIN_ROWS = 2
+# Bucket do histórico agregado de um modelo restaurado (from_coefficients): mais antigo que qualquer mês
+HISTORY_BUCKET = -1
+# Passo (°C) da grade das curvas de previsão, igual ao passo do slider do dashboard
+CURVE_STEP = 0.1
+
+def _group_moments(codes, x, y, n_groups):
+    """
+    Estatísticas suficientes da regressão simples por grupo, em uma passada vetorizada (np.bincount):
+    n, médias de x e y e os co-momentos centrados Sxx = Σ(x-x̄)², Sxy = Σ(x-x̄)(y-ȳ), Syy = Σ(y-ȳ)².
+    As médias vêm de Σx/n e Σy/n; os co-momentos são somados já centrados, o que evita o
+    cancelamento numérico de Σx² - (Σx)²/n.
+    """
+    n = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.bincount(codes, weights=x, minlength=n_groups) / n
+        mean_y = np.bincount(codes, weights=y, minlength=n_groups) / n
+    dx = x - mean_x[codes]
+    dy = y - mean_y[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+    return n, mean_x, mean_y, sxx, sxy, syy
+
+def _coefficients(mean_x, mean_y, sxx, sxy):
+    """Coeficiente e intercepto de mínimos quadrados; com x constante (Sxx = 0) o coeficiente é 0, como no sklearn."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coef = np.where(sxx > 0, sxy / np.where(sxx > 0, sxx, 1.0), 0.0)
+    intercept = mean_y - coef * mean_x
+    return coef, intercept
+
+def _r2(ss_res, syy):
+    """R² como o sklearn (r2_score): com y constante, 1.0 se o ajuste é perfeito e 0.0 caso contrário."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r2 = 1.0 - ss_res / syy
+    return np.where(syy > 0, r2, np.where(ss_res == 0, 1.0, 0.0))
+
+def _merge_moments(a, b):
+    """
+    Combina dois blocos de estatísticas [n, média_x, média_y, Sxx, Sxy, Syy, Σ|erro|]
+    pela atualização de Chan et al. (generalização paralela de Welford), sem revisitar as linhas.
+    """
+    n_a, n_b = a[0], b[0]
+    if n_a == 0:
+        return b.copy()
+    if n_b == 0:
+        return a.copy()
+    n = n_a + n_b
+    dx = b[1] - a[1]
+    dy = b[2] - a[2]
+    w = n_a * n_b / n
+    return np.array([
+        n,
+        a[1] + dx * n_b / n,
+        a[2] + dy * n_b / n,
+        a[3] + b[3] + dx * dx * w,
+        a[4] + b[4] + dx * dy * w,
+        a[5] + b[5] + dy * dy * w,
+        a[6] + b[6],
+    ])
+
+def _month_keys(df):
+    """Mês de cada linha como inteiro (ano * 12 + mês - 1); 0 para todas se não houver Data/Ano/Mes."""
+    if 'Data' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Data']):
+        df = df.assign(Data=pd.to_datetime(df['Data']))
+    if 'Data' in df.columns or ('Ano' in df.columns and 'Mes' in df.columns):
+        ano, mes = calendar_columns(df)
+        return ano.to_numpy(dtype=np.int64) * 12 + mes.to_numpy(dtype=np.int64) - 1
+    return np.zeros(len(df), dtype=np.int64)
+
+def interpolate_curve(curve, temperatures):
+    """
+    Consulta uma curva de prediction_curve por interpolação linear (np.interp), sem refazer o modelo.
+    Fora da grade, a curva é prolongada pela inclinação do primeiro/último segmento.
+    Aceita um escalar (retorna float) ou um array (retorna array).
+    """
+    grid, values = curve
+    t = np.asarray(temperatures, dtype=np.float64)
+    result = np.interp(t, grid, values)
+    below, above = t < grid[0], t > grid[-1]
+    if below.any() or above.any():
+        slope_low = (values[1] - values[0]) / (grid[1] - grid[0])
+        slope_high = (values[-1] - values[-2]) / (grid[-1] - grid[-2])
+        result = np.where(below, values[0] + (t - grid[0]) * slope_low, result)
+        result = np.where(above, values[-1] + (t - grid[-1]) * slope_high, result)
+    return float(result) if result.ndim == 0 else result
+
+def train_many(df, city_column='Cidade'):
+    """
+    Treina a regressão Consumo_MWh ~ Temperatura_C de todas as cidades de uma vez, em forma fechada,
+    a partir das estatísticas suficientes de cada cidade (sem um LinearRegression por cidade).
+    R², MAE e RMSE (sobre os dados de treino) são calculados na mesma passada vetorizada.
+    Retorna um DataFrame indexado por cidade com as colunas n, coeficiente, intercepto, r2, mae, rmse,
+    treinado e as estatísticas suficientes (media_x, media_y, sxx, sxy, syy).
+    Cidades com menos de MIN_TRAIN_ROWS linhas ou com valores ausentes ficam com treinado=False.
+    """
+    columns = ['n', 'coeficiente', 'intercepto', 'r2', 'mae', 'rmse', 'treinado',
+               'media_x', 'media_y', 'sxx', 'sxy', 'syy']
+    if df.empty:
+        return pd.DataFrame(columns=columns).rename_axis(city_column)
+
+    codes, cities = pd.factorize(df[city_column], sort=True)
+    n_groups = len(cities)
+    x = df[FEATURE_COLUMN].to_numpy(dtype=np.float64)
+    y = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+
+    # Linhas sem cidade (código -1) não pertencem a nenhum modelo
+    if (codes < 0).any():
+        has_city = codes >= 0
+        codes, x, y = codes[has_city], x[has_city], y[has_city]
+
+    # O sklearn recusa valores ausentes; aqui a cidade inteira fica sem modelo
+    invalid = np.isnan(x) | np.isnan(y)
+    has_invalid = np.bincount(codes, weights=invalid, minlength=n_groups) > 0
+    if invalid.any():
+        codes, x, y = codes[~invalid], x[~invalid], y[~invalid]
+
+    n, mean_x, mean_y, sxx, sxy, syy = _group_moments(codes, x, y, n_groups)
+    coef, intercept = _coefficients(mean_x, mean_y, sxx, sxy)
+
+    # Métricas a partir dos resíduos de cada linha
+    resid = y - (intercept[codes] + coef[codes] * x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.bincount(codes, weights=np.abs(resid), minlength=n_groups) / n
+        ss_res = np.bincount(codes, weights=resid * resid, minlength=n_groups)
+        rmse = np.sqrt(ss_res / n)
+    r2 = _r2(ss_res, syy)
+
+    trained = (n >= MIN_TRAIN_ROWS) & ~has_invalid
+    result = pd.DataFrame({
+        'n': n.astype(np.int64),
+        'coeficiente': coef,
+        'intercepto': intercept,
+        'r2': r2,
+        'mae': mae,
+        'rmse': rmse,
+        'treinado': trained,
+        'media_x': mean_x,
+        'media_y': mean_y,
+        'sxx': sxx,
+        'sxy': sxy,
+        'syy': syy,
+    }, index=pd.Index(np.asarray(cities), name=city_column))
+    result.loc[~trained, ['coeficiente', 'intercepto', 'r2', 'mae', 'rmse']] = np.nan
+    return result
+
+def training_error(df_city):
+    """
+    Mensagem de erro se os dados de uma cidade não permitem treinar o modelo (as mesmas regras de train_many:
+    menos de MIN_TRAIN_ROWS linhas ou valores ausentes), ou None se o treino é possível.
+    """
+    if df_city.empty or len(df_city) < MIN_TRAIN_ROWS:
+        return "Dados insuficientes para treinar o modelo."
+    if df_city[[FEATURE_COLUMN, TARGET_COLUMN]].isna().any().any():
+        return "Dados de temperatura ou consumo ausentes; não é possível treinar o modelo."
+    return None
+
+def models_from_table(table):
+    """
+    Cria um EnergyModel treinado para cada cidade da tabela de train_many (linhas com treinado=True).
+    As estatísticas suficientes da tabela acompanham o modelo, que pode então seguir com partial_fit.
+    """
+    return {
+        city: EnergyModel.from_coefficients(row.coeficiente, row.intercepto, r2=row.r2, mae=row.mae, rmse=row.rmse,
+                                            stats=(row.n, row.media_x, row.media_y, row.sxx, row.sxy, row.syy))
+        for city, row in table[table['treinado']].iterrows()
+    }
 
 class EnergyModel:
     """
     Classe para encapsular o modelo de regressão linear para previsão de consumo.
+    O ajuste é feito em forma fechada (ver train_many); a previsão usa apenas coeficiente e intercepto.
+
+    O modelo guarda estatísticas suficientes por mês (buckets), então partial_fit incorpora
+    meses novos sem reler o histórico. Com window_months, só os últimos N meses entram no ajuste.
     """
-    def __init__(self):
-        self.model = LinearRegression()
+    def __init__(self, window_months=None):
         self.coef = None
         self.intercept = None
         self.r2 = None
         self.mae = None
         self.rmse = None
         self.is_trained = False
+        self.window_months = window_months
+        # mês (ano * 12 + mês - 1) -> [n, média_x, média_y, Sxx, Sxy, Syy, Σ|erro|]
+        # (HISTORY_BUCKET guarda o histórico agregado de um modelo restaurado por from_coefficients)
+        self.buckets = {}
+        self.stats = None
+
+    @classmethod
+    def from_coefficients(cls, coef, intercept, r2=None, mae=None, rmse=None, stats=None):
+        """
+        Cria um modelo já treinado a partir dos coeficientes (ex.: uma linha de train_many).
+        stats (opcional) = (n, média_x, média_y, Sxx, Sxy, Syy) do treino: permite continuar com partial_fit,
+        tratando o histórico como um único bloco mais antigo que qualquer mês novo. Sem a divisão por mês,
+        esse bloco não pode ser descartado por uma janela: o modelo restaurado não aceita window_months.
+        """
+        model = cls()
+        model.coef = float(coef)
+        model.intercept = float(intercept)
+        model.r2 = None if r2 is None else float(r2)
+        model.mae = None if mae is None else float(mae)
+        model.rmse = None if rmse is None else float(rmse)
+        model.is_trained = True
+        if stats is not None:
+            n = float(stats[0])
+            abs_err = (model.mae or 0.0) * n
+            model.buckets = {HISTORY_BUCKET: np.array([*map(float, stats), abs_err])}
+            model.stats = model.buckets[HISTORY_BUCKET].copy()
+        return model
 
     def train(self, df_city):
         """Treina o modelo de regressão linear."""
-        if df_city.empty or len(df_city) < 2:
+        error = training_error(df_city)
+        if error:
             self.is_trained = False
-            return "Dados insuficientes para treinar o modelo."
-        
-        X = df_city['Temperatura_C'].values.reshape(-1, 1)
-        y = df_city['Consumo_MWh'].values
+            return error
 
-        self.model.fit(X, y)
-        self.coef = self.model.coef_[0]
-        self.intercept = self.model.intercept_
-        
-        y_pred = self.model.predict(X)
-        self.r2 = self.model.score(X, y)
-        self.mae = mean_absolute_error(y, y_pred)
-        self.rmse = math.sqrt(mean_squared_error(y, y_pred))
+        # Treino completo = atualização incremental a partir do zero (erros medidos com os coeficientes finais)
+        self.buckets = {}
+        self.stats = None
+        return self.partial_fit(df_city)
+
+    def partial_fit(self, new_rows):
+        """
+        Atualiza o modelo com linhas novas (ex.: o mês recém-carregado), em O(linhas novas + meses guardados).
+        As estatísticas das linhas são agregadas por mês e combinadas aos buckets (Chan/Welford);
+        coeficiente, intercepto, R² e RMSE saem exatamente das estatísticas combinadas.
+        O MAE é aproximado: o erro absoluto de cada linha é medido com os coeficientes vigentes quando
+        ela foi incorporada (e não é recalculado depois).
+        Com window_months, os meses anteriores à janela são descartados; um modelo restaurado de estatísticas
+        agregadas (from_coefficients) não tem os meses separados e, com window_months, gera ValueError.
+        As linhas devem ser novas: reenviar um mês já incorporado soma as linhas de novo ao bucket.
+        Linhas com valores ausentes são ignoradas. Retorna None ou uma mensagem de erro, como train.
+        """
+        if self.window_months and HISTORY_BUCKET in self.buckets:
+            raise ValueError("window_months exige estatísticas por mês; um modelo restaurado de estatísticas agregadas "
+                             "(from_coefficients) deve ser treinado de novo com train para usar a janela.")
+        rows = new_rows.dropna(subset=[FEATURE_COLUMN, TARGET_COLUMN])
+        if not rows.empty:
+            keys, codes = np.unique(_month_keys(rows), return_inverse=True)
+            x = rows[FEATURE_COLUMN].to_numpy(dtype=np.float64)
+            y = rows[TARGET_COLUMN].to_numpy(dtype=np.float64)
+            moments = np.column_stack(_group_moments(codes, x, y, len(keys)) + (np.zeros(len(keys)),))
+            for key, block in zip(keys.tolist(), moments):
+                self.buckets[key] = _merge_moments(self.buckets[key], block) if key in self.buckets else block
+
+            if self.window_months:
+                oldest = max(self.buckets) - self.window_months + 1
+                self.buckets = {k: v for k, v in self.buckets.items() if k >= oldest}
+            self._refit()
+
+            # Erro absoluto das linhas novas, com os coeficientes já atualizados
+            if self.stats is not None and self.coef is not None:
+                abs_err = np.abs(y - (self.intercept + self.coef * x))
+                per_month = np.bincount(codes, weights=abs_err, minlength=len(keys))
+                for key, err in zip(keys.tolist(), per_month):
+                    if key in self.buckets:
+                        self.buckets[key][6] += err
+                        self.stats[6] += err
+                self.mae = float(self.stats[6] / self.stats[0])
+
+        if self.stats is None or self.stats[0] < MIN_TRAIN_ROWS:
+            self.is_trained = False
+            return "Dados insuficientes para treinar o modelo."
         self.is_trained = True
         return None
 
+    def _refit(self):
+        """Recombina os buckets da janela e recalcula coeficientes e métricas a partir das estatísticas."""
+        self.stats = None
+        for key in sorted(self.buckets):
+            self.stats = self.buckets[key].copy() if self.stats is None else _merge_moments(self.stats, self.buckets[key])
+        if self.stats is None or self.stats[0] == 0:
+            self.stats = None
+            self.coef = self.intercept = self.r2 = self.mae = self.rmse = None
+            return
+        n, mean_x, mean_y, sxx, sxy, syy, abs_err = self.stats
+        coef, intercept = _coefficients(mean_x, mean_y, sxx, sxy)
+        # Soma dos quadrados dos resíduos do ajuste ótimo: Syy - Sxy²/Sxx
+        ss_res = max(syy - (sxy * sxy / sxx if sxx > 0 else 0.0), 0.0)
+        self.coef = float(coef)
+        self.intercept = float(intercept)
+        self.r2 = float(_r2(np.float64(ss_res), syy))
+        self.rmse = math.sqrt(ss_res / n)
+        self.mae = float(abs_err / n)
+
     def predict(self, temperature_c):
         """Faz uma previsão de consumo para uma dada temperatura."""
         if not self.is_trained:
             return None
-        return self.model.predict(np.array([[temperature_c]]))[0]
+        return self.intercept + self.coef * temperature_c
+
+    def predict_many(self, temperatures):
+        """Previsões para um array de temperaturas, em uma única operação vetorizada."""
+        if not self.is_trained:
+            return None
+        return self.intercept + self.coef * np.asarray(temperatures, dtype=np.float64)
+
+    def prediction_curve(self, t_min, t_max, step=CURVE_STEP):
+        """
+        Curva de previsão pré-calculada numa grade de temperaturas (de t_min a t_max, passo step),
+        para ser guardada em cache e consultada com interpolate_curve. Retorna (grade, previsões).
+        """
+        if not self.is_trained:
+            return None
+        n_points = max(int(np.ceil((t_max - t_min) / step)) + 1, 2)
+        grid = np.linspace(t_min, t_max, n_points)
+        return grid, self.predict_many(grid)
+
+    def scenario_table(self, temperatures):
+        """Tabela de cenários (Temperatura_C, Consumo_Previsto_MWh) para um array de temperaturas."""
+        if not self.is_trained:
+            return pd.DataFrame(columns=[FEATURE_COLUMN, 'Consumo_Previsto_MWh'])
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        return pd.DataFrame({FEATURE_COLUMN: temperatures, 'Consumo_Previsto_MWh': self.predict_many(temperatures)})
 
     def get_summary(self):
         """Retorna um resumo dos resultados do modelo."""
@@ -88,8 +368,8 @@ class EnergyModel:
         }
 
 if __name__ == '__main__':
-    # Exemplo de uso (para teste da modularização)
-    from data_loader import load_data
+    # Exemplo de uso (para teste da modularização). Execute a partir da raiz: python -m src.models
+    from src.data_loader import load_data
     df = load_data()
     if not df.empty:
         berlim_data = df[df['Cidade'] == 'Berlim']
@@ -111,3 +391,7 @@ if __name__ == '__main__':
             print("\nResumo do Modelo - Nova York:")
             print(model_ny.get_summary()["interpretacao"])
             print(f"Previsão para 25°C: {model_ny.predict(25):.2f} MWh")
+
+        # Todas as cidades de uma vez, em forma fechada
+        print("\nModelos de todas as cidades (train_many):")
+        print(train_many(df)[['n', 'coeficiente', 'intercepto', 'r2', 'mae', 'rmse']])
@@ -0,0 +1,138 @@
+# src/rollups.py
+# Tabelas de agregados (rollups) materializadas na ingestão, a partir de energia_cidades:
+# - energia_mensal:     Cidade x mês (mesmas colunas de energia_cidades, com Data = primeiro dia do mês)
+# - energia_anual:      Cidade x ano
+# - energia_mes_do_ano: Cidade x mês do ano (Jan..Dez), acumulando todos os anos
+# As consultas esboçadas em scripts/sql_queries.sql passam a ser lidas prontas destas tabelas.
+# A atualização é incremental: só os meses informados (e os anos / meses do ano que eles afetam) são recalculados.
+
+ROLLUP_TABLES = {
+    "mensal": "energia_mensal",
+    "anual": "energia_anual",
+    "mes_do_ano": "energia_mes_do_ano",
+}
+
+def create_rollup_tables(conn):
+    """Cria as tabelas de rollup (se ainda não existirem)."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS energia_mensal (
+            Cidade TEXT NOT NULL,
+            Data TEXT NOT NULL,
+            Consumo_MWh REAL,
+            Temperatura_C REAL,
+            Populacao_Milhoes REAL,
+            Fonte_Consumo TEXT,
+            N_Registros INTEGER,
+            Temp_N INTEGER,
+            Pop_N INTEGER,
+            PRIMARY KEY (Cidade, Data)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS energia_anual (
+            Cidade TEXT NOT NULL,
+            Ano INTEGER NOT NULL,
+            Consumo_MWh REAL,
+            Temperatura_C REAL,
+            Populacao_Milhoes REAL,
+            N_Meses INTEGER,
+            PRIMARY KEY (Cidade, Ano)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS energia_mes_do_ano (
+            Cidade TEXT NOT NULL,
+            Mes INTEGER NOT NULL,
+            Consumo_MWh REAL,
+            Consumo_Medio_MWh REAL,
+            Temp_Soma REAL,
+            Temp_N INTEGER,
+            Pop_Soma REAL,
+            Pop_N INTEGER,
+            N_Anos INTEGER,
+            PRIMARY KEY (Cidade, Mes)
+        )
+    """)
+
+def refresh_rollups(conn, months=None, months_table=None):
+    """
+    Atualiza as tabelas de rollup.
+    - months: iterável de (Cidade, 'YYYY-MM') com os meses inseridos/alterados em energia_cidades.
+      Apenas esses meses são reagregados, além dos anos e meses do ano que os contêm.
+    - months_table: alternativa a months, nome de uma tabela com colunas (Cidade, Mes 'YYYY-MM')
+      (ex.: a tabela temporária preenchida pela ingestão), lida sem passar pelo Python.
+    - sem months nem months_table: reconstrói todos os rollups a partir de energia_cidades.
+    Não faz commit: o chamador controla a transação.
+    """
+    create_rollup_tables(conn)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TABLE IF EXISTS temp._rollup_meses")
+    cursor.execute("CREATE TEMP TABLE _rollup_meses (Cidade TEXT, Inicio TEXT, Fim TEXT, PRIMARY KEY (Cidade, Inicio))")
+    if months_table is not None:
+        cursor.execute(f"INSERT OR IGNORE INTO _rollup_meses (Cidade, Inicio) SELECT Cidade, Mes || '-01' FROM {months_table}")
+    elif months is None:
+        cursor.execute("DELETE FROM energia_mensal")
+        cursor.execute("DELETE FROM energia_anual")
+        cursor.execute("DELETE FROM energia_mes_do_ano")
+        cursor.execute("""
+            INSERT INTO _rollup_meses (Cidade, Inicio)
+            SELECT DISTINCT Cidade, substr(Data, 1, 7) || '-01' FROM energia_cidades
+        """)
+    else:
+        cursor.executemany("INSERT OR IGNORE INTO _rollup_meses (Cidade, Inicio) VALUES (?, ?)",
+                           ((cidade, f"{mes}-01") for cidade, mes in months))
+    cursor.execute("UPDATE _rollup_meses SET Fim = date(Inicio, '+1 month')")
+
+    # 1. Cidade x mês, a partir das linhas brutas (faixa de datas -> usa o índice (Cidade, Data))
+    cursor.execute("""
+        DELETE FROM energia_mensal
+        WHERE (Cidade, Data) IN (SELECT Cidade, Inicio FROM _rollup_meses)
+    """)
+    cursor.execute("""
+        INSERT INTO energia_mensal (Cidade, Data, Consumo_MWh, Temperatura_C, Populacao_Milhoes,
+                                    Fonte_Consumo, N_Registros, Temp_N, Pop_N)
+        SELECT k.Cidade, k.Inicio, SUM(e.Consumo_MWh), AVG(e.Temperatura_C), AVG(e.Populacao_Milhoes),
+               MAX(e.Fonte_Consumo), COUNT(*), COUNT(e.Temperatura_C), COUNT(e.Populacao_Milhoes)
+        FROM _rollup_meses k
+        JOIN energia_cidades e ON e.Cidade = k.Cidade AND e.Data >= k.Inicio AND e.Data < k.Fim
+        GROUP BY k.Cidade, k.Inicio
+    """)
+
+    # 2. Cidade x ano, a partir do rollup mensal (médias ponderadas pelas contagens)
+    cursor.execute("""
+        DELETE FROM energia_anual
+        WHERE (Cidade, Ano) IN (SELECT DISTINCT Cidade, CAST(substr(Inicio, 1, 4) AS INTEGER) FROM _rollup_meses)
+    """)
+    cursor.execute("""
+        INSERT INTO energia_anual (Cidade, Ano, Consumo_MWh, Temperatura_C, Populacao_Milhoes, N_Meses)
+        SELECT m.Cidade, CAST(substr(m.Data, 1, 4) AS INTEGER) AS Ano, SUM(m.Consumo_MWh),
+               SUM(m.Temperatura_C * m.Temp_N) / SUM(m.Temp_N),
+               SUM(m.Populacao_Milhoes * m.Pop_N) / SUM(m.Pop_N),
+               COUNT(*)
+        FROM energia_mensal m
+        WHERE (m.Cidade, CAST(substr(m.Data, 1, 4) AS INTEGER)) IN
+              (SELECT DISTINCT Cidade, CAST(substr(Inicio, 1, 4) AS INTEGER) FROM _rollup_meses)
+        GROUP BY m.Cidade, Ano
+    """)
+
+    # 3. Cidade x mês do ano (todos os anos), também a partir do rollup mensal
+    cursor.execute("""
+        DELETE FROM energia_mes_do_ano
+        WHERE (Cidade, Mes) IN (SELECT DISTINCT Cidade, CAST(substr(Inicio, 6, 2) AS INTEGER) FROM _rollup_meses)
+    """)
+    cursor.execute("""
+        INSERT INTO energia_mes_do_ano (Cidade, Mes, Consumo_MWh, Consumo_Medio_MWh,
+                                        Temp_Soma, Temp_N, Pop_Soma, Pop_N, N_Anos)
+        SELECT m.Cidade, CAST(substr(m.Data, 6, 2) AS INTEGER) AS Mes, SUM(m.Consumo_MWh), AVG(m.Consumo_MWh),
+               TOTAL(m.Temperatura_C * m.Temp_N), SUM(m.Temp_N),
+               TOTAL(m.Populacao_Milhoes * m.Pop_N), SUM(m.Pop_N),
+               COUNT(*)
+        FROM energia_mensal m
+        WHERE (m.Cidade, CAST(substr(m.Data, 6, 2) AS INTEGER)) IN
+              (SELECT DISTINCT Cidade, CAST(substr(Inicio, 6, 2) AS INTEGER) FROM _rollup_meses)
+        GROUP BY m.Cidade, Mes
+    """)
+
+    cursor.execute("DROP TABLE temp._rollup_meses")
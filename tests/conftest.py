@@ -0,0 +1,26 @@
+# tests/conftest.py
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Permite importar os módulos de 'src' como nos scripts, executados a partir da raiz do projeto
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def load_script():
+    """Importa um script de scripts/ pelo nome do arquivo (os nomes começam com dígitos e não são importáveis)."""
+    modules = {}
+
+    def _load(filename):
+        if filename not in modules:
+            path = os.path.join(ROOT, "scripts", filename)
+            spec = importlib.util.spec_from_file_location(f"scripts_{filename[:-3]}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            modules[filename] = module
+        return modules[filename]
+
+    return _load
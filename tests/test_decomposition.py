@@ -0,0 +1,45 @@
+# tests/test_decomposition.py
+# A decomposição vetorizada (src/decomposition.py) precisa reproduzir o seasonal_decompose do statsmodels,
+# série a série, nos mesmos casos validados por scripts/benchmark_decomposition.py.
+import warnings
+
+import numpy as np
+import pytest
+from statsmodels.tsa.seasonal import seasonal_decompose
+
+from src.decomposition import seasonal_decompose_many
+
+# (período, extrapolate_trend): períodos par e ímpar; sem extrapolação, com um inteiro e com 'period'
+CASES = [(12, "period"), (12, 0), (12, 3), (7, "period"), (4, 1)]
+TOLERANCE = 1e-9
+
+def synthetic_series(n_series, n_months, seed):
+    """Séries mensais sintéticas: nível + tendência + sazonalidade anual + ruído."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_months)
+    level = rng.normal(1000, 200, (n_series, 1))
+    slope = rng.normal(0, 1, (n_series, 1))
+    amplitude = rng.normal(150, 50, (n_series, 1))
+    return level + slope * t + amplitude * np.sin(2 * np.pi * t / 12) + rng.normal(0, 30, (n_series, n_months))
+
+@pytest.mark.parametrize("period, extrapolate", CASES)
+@pytest.mark.parametrize("n_months", [240, 245]) # 245: a série não fecha um número inteiro de ciclos
+def test_batch_matches_statsmodels(period, extrapolate, n_months):
+    values = synthetic_series(8, n_months, seed=n_months)
+    result = seasonal_decompose_many(values, period, extrapolate)
+    assert result.trend.shape == values.shape
+
+    for i, series in enumerate(values):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning) # avisos de depreciação do statsmodels
+            expected = seasonal_decompose(series, model="additive", period=period, extrapolate_trend=extrapolate)
+        for name in ("trend", "seasonal", "resid"):
+            np.testing.assert_allclose(getattr(result, name)[i], getattr(expected, name),
+                                       rtol=0, atol=TOLERANCE, equal_nan=True, err_msg=f"série {i}, {name}")
+
+def test_single_series_matches_batch_row():
+    values = synthetic_series(3, 60, seed=1)
+    batch = seasonal_decompose_many(values, 12, "period")
+    single = seasonal_decompose_many(values[1], 12, "period")
+    assert single.trend.ndim == 1
+    np.testing.assert_array_equal(single.resid, batch.resid[1])
@@ -0,0 +1,143 @@
+# tests/test_download_retry.py
+# Re-tentativas e busca concorrente da Open-Meteo (scripts/01_download_data.py) contra um servidor HTTP local
+# (http.server) que injeta respostas 429/5xx/4xx e registra o horário e a conexão de cada requisição.
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+class StubServer(ThreadingHTTPServer):
+    """Servidor que responde, em ordem, as respostas roteirizadas em `script` e depois 200 com dados diários."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.script = [] # [(status, headers)] consumidos um por requisição
+        self.requests = [] # [(horário, porta do cliente, parâmetros)]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/archive"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive: permite verificar a reutilização das conexões da Session
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), self.client_address[1], params))
+            status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        if status == 200:
+            # Um objeto por coordenada (a API responde uma lista quando há mais de uma); a temperatura
+            # devolvida é a latitude pedida, para conferir a correspondência cidade -> dados
+            items = [{"daily": {"time": [params["start_date"]], "temperature_2m_mean": [float(lat)]}}
+                     for lat in params["latitude"].split(",")]
+            body = json.dumps(items if len(items) > 1 else items[0]).encode()
+        else:
+            body = json.dumps({"error": True, "reason": f"status {status}"}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    srv = StubServer()
+    thread = threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+@pytest.fixture
+def dl(load_script, server, monkeypatch):
+    module = load_script("01_download_data.py")
+    monkeypatch.setattr(module, "OPEN_METEO_ARCHIVE_URL", server.url)
+    return module
+
+PARAMS = {"latitude": "1.0", "longitude": "2.0", "start_date": "2020-01-01", "end_date": "2020-01-31",
+          "daily": "temperature_2m_mean", "timezone": "auto"}
+
+def request(dl, **kwargs):
+    session = dl.create_session(1)
+    try:
+        return dl._request_open_meteo(PARAMS, "teste", PARAMS["end_date"], session=session, **kwargs)
+    finally:
+        session.close()
+
+def gaps(server):
+    times = [t for t, _, _ in server.requests]
+    return [b - a for a, b in zip(times, times[1:])]
+
+def test_429_is_retried_after_retry_after(dl, server):
+    server.script = [(429, {"Retry-After": "1"})]
+    # Sem o Retry-After, a espera seria de no máximo `delay` (0,01 s)
+    data = request(dl, retries=3, delay=0.01, max_delay=5)
+    assert data["daily"]["temperature_2m_mean"] == [1.0]
+    assert len(server.requests) == 2
+    assert gaps(server)[0] >= 0.95
+
+def test_retry_after_is_capped_by_max_delay(dl, server):
+    server.script = [(429, {"Retry-After": "120"})]
+    data = request(dl, retries=2, delay=0.01, max_delay=0.2)
+    assert data is not None
+    assert 0.15 <= gaps(server)[0] < 5
+
+def test_503_is_retried_with_exponential_backoff(dl, server):
+    server.script = [(503, {}), (503, {})]
+    data = request(dl, retries=3, delay=0.2, max_delay=5)
+    assert data["daily"]["temperature_2m_mean"] == [1.0]
+    assert len(server.requests) == 3
+    # Tentativa i espera entre metade e o total de delay * 2**i (jitter)
+    first, second = gaps(server)
+    assert first >= 0.1
+    assert second >= 0.2
+
+def test_5xx_gives_up_after_retries(dl, server):
+    server.script = [(500, {}), (502, {}), (504, {})]
+    assert request(dl, retries=3, delay=0.01, max_delay=0.05) is None
+    assert len(server.requests) == 3
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_other_4xx_fail_fast(dl, server, status):
+    server.script = [(status, {})]
+    assert request(dl, retries=3, delay=0.01, max_delay=0.05) is None
+    assert len(server.requests) == 1
+
+def test_fetch_all_temperatures_shares_session_and_rate_limiter(dl, server, monkeypatch):
+    cities = {f"Cidade {i:02d}": {"latitude": float(i), "longitude": 0.0} for i in range(20)}
+    monkeypatch.setattr(dl, "CITIES_COORDS", cities)
+
+    sessions, limiters = [], []
+    create_session, rate_limiter = dl.create_session, dl.RateLimiter
+    monkeypatch.setattr(dl, "create_session", lambda *a, **k: sessions.append(create_session(*a, **k)) or sessions[-1])
+    monkeypatch.setattr(dl, "RateLimiter", lambda *a, **k: limiters.append(rate_limiter(*a, **k)) or limiters[-1])
+
+    # Um 429 (sem espera) e um 503 no meio da coleta: as re-tentativas também passam pelo limite de taxa
+    server.script = [(200, {}), (429, {"Retry-After": "0"}), (200, {}), (503, {})]
+    rate = 20.0
+    ranges = {city: ("2020-01-01", "2020-01-31") for city in cities}
+    results = dict(dl.fetch_all_temperatures(ranges, max_workers=4, rate_limit=rate, batch_size=2))
+
+    assert len(sessions) == 1 and len(limiters) == 1
+    assert results.keys() == cities.keys()
+    for city, daily in results.items():
+        assert daily["temperature_2m_mean"] == [cities[city]["latitude"]]
+
+    # 10 lotes + 2 re-tentativas; o limite é global, então as requisições ficam espaçadas de 1/rate
+    n_requests = len(server.requests)
+    assert n_requests == 12
+    times = sorted(t for t, _, _ in server.requests)
+    assert times[-1] - times[0] >= (n_requests - 1) / rate * 0.9
+    # A Session compartilhada reaproveita as conexões do pool (no máximo uma por thread)
+    assert len({port for _, port, _ in server.requests}) <= 4
@@ -0,0 +1,51 @@
+# tests/test_downsampling.py
+# Orçamento de pontos dos gráficos (src/downsampling.py): o total plotado nunca passa de max_points,
+# inclusive com muitos pontos obrigatórios (anomalias) ou muitas cidades no mesmo gráfico.
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics import plot_consumption_trend
+from src.downsampling import downsample_indices, split_budget
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), rng.normal(1000, 100, n)
+
+@pytest.mark.parametrize("n_keep", [0, 10, 499, 500, 3000])
+def test_downsample_indices_respects_budget_with_kept_points(n_keep):
+    x, y = series(10_000)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[np.random.default_rng(1).choice(len(x), n_keep, replace=False)] = True
+    idx = downsample_indices(x, y, max_points=500, keep=keep)
+
+    assert len(idx) <= 500
+    assert np.all(np.diff(idx) > 0)
+    if n_keep < 500:
+        # Cabem no orçamento: todos os pontos marcados são preservados
+        assert keep[idx].sum() == n_keep
+    else:
+        assert keep[idx].all()
+
+@pytest.mark.parametrize("sizes, max_points", [
+    ([100] * 7, 50), # resto da divisão entre as séries
+    ([5, 5, 1000, 1000], 100), # séries curtas cedem o que não usam
+    ([240] * 3000, 2000), # mais séries que pontos
+    ([10, 20], 1000), # tudo cabe
+])
+def test_split_budget_sum_is_bounded(sizes, max_points):
+    budgets = split_budget(sizes, max_points)
+    assert budgets.sum() <= max_points
+    assert np.all(budgets <= np.asarray(sizes))
+    assert budgets.sum() == min(sum(sizes), max_points)
+
+def test_consumption_trend_with_many_cities_stays_within_budget():
+    n_cities, n_months, max_points = 800, 120, 2000
+    datas = pd.date_range("2014-01-01", periods=n_months, freq="MS")
+    df = pd.DataFrame({
+        "Cidade": np.repeat([f"Cidade {i:03d}" for i in range(n_cities)], n_months),
+        "Data": np.tile(datas, n_cities),
+        "Consumo_MWh": np.random.default_rng(2).normal(1000, 100, n_cities * n_months),
+    })
+    fig = plot_consumption_trend(df, df["Cidade"].unique().tolist(), max_points=max_points)
+    assert sum(len(trace.x) for trace in fig.data) <= max_points
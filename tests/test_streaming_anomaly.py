@@ -0,0 +1,57 @@
+# tests/test_streaming_anomaly.py
+# Detector incremental de anomalias (StreamingAnomalyDetector, src/analytics.py): os pontos são
+# deduplicados pelo instante completo (data e hora), inclusive depois de salvar e recarregar o estado.
+import sqlite3
+
+import pandas as pd
+
+from src.analytics import STREAM_STATE_TABLE, StreamingAnomalyDetector
+
+def warm_up(detector, city="Berlim", n=24):
+    """Histórico diário suficiente para o detector começar a pontuar."""
+    for i, day in enumerate(pd.date_range("2020-01-01", periods=n, freq="D")):
+        detector.update(city, day, 1000.0 + (i % 5) * 10)
+
+def test_two_points_on_the_same_day_are_both_scored():
+    detector = StreamingAnomalyDetector(min_periods=12)
+    warm_up(detector)
+
+    morning = detector.update("Berlim", pd.Timestamp("2020-02-01 08:00"), 1010.0)
+    evening = detector.update("Berlim", pd.Timestamp("2020-02-01 20:00"), 2000.0)
+    assert morning is not None and morning[1] is None
+    assert evening is not None and evening[1] == "Alto"
+    assert detector.state["Berlim"][0] == 26
+
+    # O mesmo instante (ou um anterior) continua sendo ignorado
+    assert detector.update("Berlim", pd.Timestamp("2020-02-01 20:00"), 1000.0) is None
+    assert detector.update("Berlim", pd.Timestamp("2020-02-01 12:00"), 1000.0) is None
+    assert detector.state["Berlim"][0] == 26
+
+def test_saved_state_keeps_the_time_of_day(tmp_path):
+    db = str(tmp_path / "estado.db")
+    detector = StreamingAnomalyDetector(min_periods=12)
+    warm_up(detector)
+    detector.update("Berlim", pd.Timestamp("2020-02-01 08:00"), 1010.0)
+    detector.save_state(db)
+
+    restored = StreamingAnomalyDetector(min_periods=12)
+    assert restored.load_state(db) == 1
+    assert restored.state["Berlim"] == detector.state["Berlim"]
+    assert restored.update("Berlim", pd.Timestamp("2020-02-01 08:00"), 1010.0) is None
+    assert restored.update("Berlim", pd.Timestamp("2020-02-01 09:00"), 1010.0) is not None
+
+def test_date_only_state_from_older_versions_is_loaded_as_midnight(tmp_path):
+    db = str(tmp_path / "estado.db")
+    detector = StreamingAnomalyDetector(min_periods=12)
+    warm_up(detector)
+    detector.save_state(db)
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute(f"UPDATE {STREAM_STATE_TABLE} SET Ultima_Data = '2020-01-24'")
+    conn.close()
+
+    restored = StreamingAnomalyDetector(min_periods=12)
+    restored.load_state(db)
+    # Reprocessar o último dia do lote antigo não altera o estado; um ponto mais tarde no mesmo dia entra
+    assert restored.update("Berlim", "2020-01-24", 1000.0) is None
+    assert restored.update("Berlim", "2020-01-24 18:00", 1000.0) is not None
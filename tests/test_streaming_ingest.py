@@ -0,0 +1,61 @@
+# tests/test_streaming_ingest.py
+# A carga do Passo 2 (clean_and_load_data) consome o NDJSON em streaming e grava lotes de tamanho fixo:
+# o pico de memória (alocações do Python, medidas com tracemalloc) deve ficar limitado, qualquer que seja
+# o tamanho da entrada, e todas as linhas escritas no arquivo precisam chegar ao banco.
+import json
+import os
+import sqlite3
+import tracemalloc
+
+N_CITIES = 400
+N_MONTHS = 500 # 200 mil linhas, ~27 MB de NDJSON
+PEAK_LIMIT_BYTES = 8 * 1024 ** 2 # com BATCH_SIZE = 5000, o pico medido fica em torno de 4 MB
+
+def write_ndjson(path):
+    """Grava a entrada sintética e devolve o número de linhas escritas."""
+    n_rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for c in range(N_CITIES):
+            for m in range(N_MONTHS):
+                f.write(json.dumps({
+                    "cidade": f"Cidade {c:04d}",
+                    "ano": 1980 + m // 12,
+                    "mes": m % 12 + 1,
+                    "consumo_mwh": 1000.0 + c + m * 0.5,
+                    "temp_c": 15.0 + (m % 12),
+                    "pop_milhoes": 1.5,
+                    "fonte_consumo": "Simulado",
+                }) + "\n")
+                n_rows += 1
+    return n_rows
+
+def test_clean_and_load_data_peak_memory_is_bounded(tmp_path, load_script, monkeypatch):
+    ingest = load_script("02_clean_transform_all.py")
+    raw = tmp_path / "dados.jsonl"
+    db = tmp_path / "processed" / "energia.db"
+    n_written = write_ndjson(raw)
+    # A entrada precisa ser bem maior que o limite, senão o teste não distingue streaming de leitura integral
+    assert os.path.getsize(raw) > 3 * PEAK_LIMIT_BYTES
+
+    monkeypatch.setattr(ingest, "input_file", str(raw))
+    monkeypatch.setattr(ingest, "legacy_input_file", str(tmp_path / "inexistente.json"))
+    monkeypatch.setattr(ingest, "output_db", str(db))
+
+    tracemalloc.start()
+    try:
+        ingest.clean_and_load_data()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < PEAK_LIMIT_BYTES, f"pico de {peak / 1024 ** 2:.1f} MB"
+
+    # clean_and_load_data só imprime os erros: o resultado é conferido no banco
+    conn = sqlite3.connect(str(db))
+    try:
+        count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        assert count("energia_cidades") == n_written
+        assert count("energia_mensal") == N_CITIES * N_MONTHS
+        assert count("coleta_watermarks") == 2 * N_CITIES
+    finally:
+        conn.close()